@@ -0,0 +1,142 @@
+"""Admission control for expensive routes.
+
+`AdmissionGate` caps how many requests of a route run at once; the rest
+wait in a bounded queue for at most `queue_timeout` seconds. A full queue
+or an expired deadline raises `Overloaded`, so the caller decides whether
+to degrade (e.g. serve stored offers) or shed the request with 429.
+`ClientRateLimiter` keeps one token bucket per client so a single caller
+cannot monopolize the gate; `client_address` picks the key a client cannot
+forge.
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted; carries a Retry-After hint"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class AdmissionGate:
+    """Limite de concorrência por rota com fila limitada e prazo de espera"""
+
+    def __init__(self, name: str, limit: int, queue_size: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        # Rolling average of how long an admitted request holds its slot
+        self._avg_hold = 1.0
+
+    def _retry_after(self) -> float:
+        # Rough time until the current backlog drains
+        return self._avg_hold * (self.waiting + 1) / self.limit
+
+    @asynccontextmanager
+    async def admit(self):
+        if self._slots.locked():
+            if self.waiting >= self.queue_size:
+                self.rejected += 1
+                raise Overloaded(f"{self.name} queue full", self._retry_after())
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise Overloaded(f"{self.name} queue deadline exceeded", self._retry_after())
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+
+        self.active += 1
+        self.admitted += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._slots.release()
+            self._avg_hold = 0.9 * self._avg_hold + 0.1 * (time.monotonic() - started)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "queue_size": self.queue_size,
+            "queue_timeout_seconds": self.queue_timeout,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_hold_seconds": round(self._avg_hold, 3),
+        }
+
+
+class ClientRateLimiter:
+    """Token bucket por cliente (`rate` tokens/s, rajada de `burst`)"""
+
+    def __init__(self, rate: float, burst: int, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        # client -> (tokens, last refill); LRU so idle clients are evicted first
+        self._buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+        self.limited = 0
+
+    def acquire(self, client: str) -> Optional[float]:
+        """Take a token; returns None if allowed, else seconds until the next token"""
+        now = time.monotonic()
+        tokens, last = self._buckets.pop(client, (float(self.burst), now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens >= 1:
+            self._buckets[client] = (tokens - 1, now)
+            retry_after = None
+        else:
+            self._buckets[client] = (tokens, now)
+            self.limited += 1
+            retry_after = (1 - tokens) / self.rate
+        while len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "rate_per_minute": round(self.rate * 60, 2),
+            "burst": self.burst,
+            "tracked_clients": len(self._buckets),
+            "limited": self.limited,
+        }
+
+
+def client_address(peer: Optional[str], forwarded_for: List[str], trusted_hops: int = 0) -> str:
+    """Address of the client behind `trusted_hops` reverse proxies
+
+    Each proxy appends the address it received the request from to
+    X-Forwarded-For, so only the last `trusted_hops` entries were written by
+    proxies we run; anything to their left is client-supplied. With 0 trusted
+    hops (or a header shorter than expected) the peer address is used.
+    """
+    if trusted_hops > 0:
+        hops = [hop.strip() for header in forwarded_for for hop in header.split(',') if hop.strip()]
+        if len(hops) >= trusted_hops:
+            return hops[-trusted_hops]
+    return peer or 'unknown'
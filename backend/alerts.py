@@ -0,0 +1,389 @@
+"""Deal-alert subscriptions and the matching engine run after each refresh.
+
+Subscriptions are indexed by (offer type, departure, arrival) with `*` for
+"any"; each bucket keeps its subscriptions sorted by `min_discount`. An
+offer only looks at the (at most four) buckets its route can hit and takes
+the bisected prefix whose threshold it meets, so a batch costs about
+O(new offers x relevant subscriptions) rather than O(offers x all
+subscriptions).
+
+Matches are grouped per subscription and handed to a pluggable notifier
+(`ALERT_NOTIFIER=log|webhook|memory`), at most `ALERT_DELIVERY_CONCURRENCY`
+deliveries at a time. Webhook contacts must be public https URLs; they are
+checked when the subscription is created and again before every delivery,
+which then connects to the checked address rather than resolving anew.
+
+    python bench.py alerts [--subs 100000] [--offers 500]
+"""
+import asyncio
+import hashlib
+import ipaddress
+import logging
+import os
+import random
+import secrets
+import socket
+import time
+from bisect import bisect_right, insort
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from models import AlertSubscription
+
+logger = logging.getLogger(__name__)
+
+ANY = '*'
+_END = '\uffff'
+
+DELIVERY_CONCURRENCY = int(os.environ.get('ALERT_DELIVERY_CONCURRENCY', 20))
+
+
+class UnsafeWebhook(ValueError):
+    """Webhook URL that isn't https or points at a non-public address"""
+
+
+def is_webhook(contact: str) -> bool:
+    return contact.lower().startswith(('http://', 'https://'))
+
+
+def _is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
+
+
+def _public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split('%')[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+async def _resolve(host: str, port: int) -> List[str]:
+    infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    return [info[4][0] for info in infos]
+
+
+async def check_webhook_url(url: str) -> List[str]:
+    """Reject webhooks the backend must not call: plain http, private, loopback, link-local...
+
+    Returns the checked addresses; delivery connects to one of them instead
+    of resolving the name again, so a rebinding DNS answer can't slip in.
+    """
+    parts = urlsplit(url)
+    if parts.scheme.lower() != 'https':
+        raise UnsafeWebhook("Webhook URLs must use https")
+    if not parts.hostname or parts.username or parts.password:
+        raise UnsafeWebhook("Webhook URL needs a host and no credentials")
+    try:
+        addresses = [parts.hostname] if _is_ip(parts.hostname) else await _resolve(
+            parts.hostname, parts.port or 443)
+    except (socket.gaierror, ValueError):
+        raise UnsafeWebhook(f"Webhook host {parts.hostname} does not resolve")
+    if not addresses or not all(_public_address(a) for a in addresses):
+        raise UnsafeWebhook(f"Webhook host {parts.hostname} is not a public address")
+    return addresses
+
+
+def pin_webhook_url(url: str, address: str) -> Tuple[str, dict, dict]:
+    """URL aimed at `address`, plus the Host header and TLS SNI of the original host"""
+    parts = urlsplit(url)
+    host = f"[{address}]" if ':' in address else address
+    port = f":{parts.port}" if parts.port else ''
+    pinned = parts._replace(netloc=host + port).geturl()
+    headers = {'Host': parts.netloc}
+    # SNI and certificate checks still use the name the subscriber gave
+    extensions = {} if _is_ip(parts.hostname) else {'sni_hostname': parts.hostname}
+    return pinned, headers, extensions
+
+
+# Ownership: the token is returned once on creation, only its hash is stored
+MANAGE_TOKEN_BYTES = 24
+MANAGE_TOKEN_LENGTH = len(secrets.token_urlsafe(MANAGE_TOKEN_BYTES))
+_TOKEN_CHARS = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_')
+
+
+def new_manage_token() -> str:
+    return secrets.token_urlsafe(MANAGE_TOKEN_BYTES)
+
+
+def is_manage_token(token: Optional[str]) -> bool:
+    """Shape of a server-issued token (192 random bits, url-safe base64)"""
+    return bool(token) and len(token) == MANAGE_TOKEN_LENGTH and set(token) <= _TOKEN_CHARS
+
+
+def hash_manage_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _key(value: Optional[str]) -> str:
+    value = (value or '').strip().casefold()
+    return value or ANY
+
+
+def _offer_route(kind: str, offer: dict) -> Tuple[str, str]:
+    if kind == 'flight':
+        return _key(offer.get('departure_airport')), _key(offer.get('arrival_airport'))
+    return _key(offer.get('departure_port')), ANY
+
+
+def subscription_matches(sub: AlertSubscription, kind: str, offer: dict) -> bool:
+    """Reference (unindexed) predicate, also used by the benchmark"""
+    if sub.offer_type not in ('all', kind):
+        return False
+    departure, arrival = _offer_route(kind, offer)
+    if _key(sub.departure) not in (ANY, departure):
+        return False
+    if _key(sub.arrival) not in (ANY, arrival):
+        return False
+    if offer['discount_percentage'] < sub.min_discount:
+        return False
+    return sub.max_price is None or offer['current_price'] <= sub.max_price
+
+
+class SubscriptionIndex:
+    """Índice invertido de assinaturas por rota, tipo e desconto mínimo"""
+
+    def __init__(self, subscriptions: Iterable[AlertSubscription] = ()):
+        # (kind, departure, arrival) -> sorted [(min_discount, sub_id)]
+        self._buckets: Dict[Tuple[str, str, str], List[Tuple[float, str]]] = defaultdict(list)
+        self._subs: Dict[str, AlertSubscription] = {}
+        for sub in subscriptions:
+            self.add(sub)
+
+    def __len__(self) -> int:
+        return len(self._subs)
+
+    def _bucket_keys(self, sub: AlertSubscription) -> List[Tuple[str, str, str]]:
+        kinds = ('flight', 'cruise') if sub.offer_type == 'all' else (sub.offer_type,)
+        arrival = _key(sub.arrival)
+        # Cruises have no arrival, so an arrival filter rules them out
+        return [(kind, _key(sub.departure), arrival if kind == 'flight' else ANY)
+                for kind in kinds if kind == 'flight' or arrival == ANY]
+
+    def add(self, sub: AlertSubscription):
+        self.remove(sub.id)
+        if not sub.active:
+            return
+        self._subs[sub.id] = sub
+        for key in self._bucket_keys(sub):
+            insort(self._buckets[key], (sub.min_discount, sub.id))
+
+    def remove(self, sub_id: str):
+        sub = self._subs.pop(sub_id, None)
+        if sub is None:
+            return
+        for key in self._bucket_keys(sub):
+            bucket = self._buckets[key]
+            entry = (sub.min_discount, sub.id)
+            pos = bisect_right(bucket, entry) - 1
+            if 0 <= pos < len(bucket) and bucket[pos] == entry:
+                del bucket[pos]
+            if not bucket:
+                del self._buckets[key]
+
+    def match(self, kind: str, offer: dict) -> Iterable[AlertSubscription]:
+        departure, arrival = _offer_route(kind, offer)
+        discount = offer['discount_percentage']
+        price = offer['current_price']
+        keys = {(kind, departure, arrival), (kind, departure, ANY),
+                (kind, ANY, arrival), (kind, ANY, ANY)}
+        for key in keys:
+            bucket = self._buckets.get(key)
+            if not bucket:
+                continue
+            # Everything before this position has min_discount <= discount
+            end = bisect_right(bucket, (discount, _END))
+            for _, sub_id in bucket[:end]:
+                sub = self._subs[sub_id]
+                if sub.max_price is None or price <= sub.max_price:
+                    yield sub
+
+    def match_batch(self, offers_by_kind: Dict[str, List[dict]]) -> Dict[str, Tuple[AlertSubscription, List[dict]]]:
+        """Group new offers per matching subscription"""
+        matches: Dict[str, Tuple[AlertSubscription, List[dict]]] = {}
+        for kind, offers in offers_by_kind.items():
+            for offer in offers:
+                for sub in self.match(kind, offer):
+                    if sub.id not in matches:
+                        matches[sub.id] = (sub, [])
+                    matches[sub.id][1].append({**offer, "type": kind})
+        return matches
+
+
+# Notifiers
+class Notifier:
+    """Destino das notificações de alerta"""
+
+    async def notify(self, subscription: AlertSubscription, offers: List[dict]):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class LogNotifier(Notifier):
+    async def notify(self, subscription: AlertSubscription, offers: List[dict]):
+        best = max(o['discount_percentage'] for o in offers)
+        logger.info(f"Alert {subscription.id} for {subscription.contact}: "
+                    f"{len(offers)} new offers (best {best}% off)")
+
+
+class MemoryNotifier(Notifier):
+    """Stub sink: keeps every delivery in memory (tests, local runs)"""
+
+    def __init__(self):
+        self.deliveries: List[Tuple[AlertSubscription, List[dict]]] = []
+
+    async def notify(self, subscription: AlertSubscription, offers: List[dict]):
+        self.deliveries.append((subscription, offers))
+
+
+class WebhookNotifier(Notifier):
+    """POSTs matches to subscriptions whose contact is a public https URL"""
+
+    def __init__(self, timeout: float = 10.0, transport: Optional[httpx.AsyncBaseTransport] = None):
+        # No redirects: a public URL must not bounce the request to an internal one
+        self._http = httpx.AsyncClient(timeout=timeout, follow_redirects=False, transport=transport)
+
+    async def notify(self, subscription: AlertSubscription, offers: List[dict]):
+        if not is_webhook(subscription.contact):
+            logger.info(f"Alert {subscription.id}: contact is not a webhook, skipped")
+            return
+        # Checked again here and pinned: DNS may have changed since the
+        # subscription was created, and must not change before we connect
+        addresses = await check_webhook_url(subscription.contact)
+        url, headers, extensions = pin_webhook_url(subscription.contact, addresses[0])
+        response = await self._http.post(url, headers=headers, extensions=extensions, json={
+            "subscription_id": subscription.id,
+            "offers": offers,
+            "sent_at": datetime.now(timezone.utc).isoformat(),
+        })
+        response.raise_for_status()
+
+    async def close(self):
+        await self._http.aclose()
+
+
+NOTIFIERS = {
+    'log': LogNotifier,
+    'memory': MemoryNotifier,
+    'webhook': WebhookNotifier,
+}
+
+
+def notifier_from_env() -> Notifier:
+    name = os.environ.get('ALERT_NOTIFIER', 'log')
+    if name not in NOTIFIERS:
+        raise ValueError(f"Unknown ALERT_NOTIFIER: {name}")
+    return NOTIFIERS[name]()
+
+
+class AlertEngine:
+    """Sincroniza as assinaturas do MongoDB e dispara alertas para novas ofertas"""
+
+    def __init__(self, db, notifier: Optional[Notifier] = None, concurrency: int = DELIVERY_CONCURRENCY):
+        self.collection = db.alert_subscriptions
+        self.notifier = notifier or notifier_from_env()
+        self._deliveries = asyncio.Semaphore(concurrency)
+        self.index = SubscriptionIndex()
+        self._synced_at: Optional[str] = None
+
+    async def sync(self):
+        """Load subscriptions changed since the last sync into the index"""
+        query = {} if self._synced_at is None else {'updated_at': {'$gte': self._synced_at}}
+        synced_at = datetime.now(timezone.utc).isoformat()
+        async for doc in self.collection.find(query, {'_id': 0}):
+            self.index.add(AlertSubscription(**doc))
+        self._synced_at = synced_at
+
+    async def process(self, inserted: Dict[str, List[dict]]) -> int:
+        """Match a refresh batch against the subscriptions; returns notifications sent"""
+        if not any(inserted.values()):
+            return 0
+        await self.sync()
+        matches = self.index.match_batch(inserted)
+
+        async def deliver(sub: AlertSubscription, offers: List[dict]) -> bool:
+            offers.sort(key=lambda o: o['discount_percentage'], reverse=True)
+            async with self._deliveries:
+                try:
+                    await self.notifier.notify(sub, offers)
+                    return True
+                except Exception as e:
+                    logger.warning(f"Alert delivery failed for {sub.id}: {e}")
+                    return False
+
+        results = await asyncio.gather(*(deliver(sub, offers) for sub, offers in matches.values()))
+        sent = sum(results)
+        logger.info(f"Matched {sum(len(o) for o in inserted.values())} new offers against "
+                    f"{len(self.index)} subscriptions: {sent} notifications")
+        return sent
+
+    async def close(self):
+        await self.notifier.close()
+
+
+# Benchmark
+def bench(sub_count: int, offer_count: int):
+    from locations import AIRPORTS, PORTS
+
+    rng = random.Random(42)
+    airports = list(AIRPORTS)
+    subs = []
+    for i in range(sub_count):
+        offer_type = rng.choice(('flight', 'flight', 'cruise', 'all'))
+        departure = arrival = None
+        if offer_type == 'cruise':
+            departure = rng.choice(PORTS + [None])
+        else:
+            departure = rng.choice(airports + [None])
+            arrival = rng.choice(airports + [None, None])
+        subs.append(AlertSubscription(
+            contact=f"user{i}@example.com", offer_type=offer_type,
+            departure=departure, arrival=arrival,
+            min_discount=rng.choice((60, 70, 75, 80, 85, 90)),
+            max_price=rng.choice((None, None, 300, 800)),
+        ))
+
+    offers = {
+        'flight': [{
+            'departure_airport': rng.choice(airports), 'arrival_airport': rng.choice(airports),
+            'discount_percentage': round(rng.uniform(50, 92), 1),
+            'current_price': round(rng.uniform(50, 1500), 2),
+        } for _ in range(offer_count)],
+        'cruise': [{
+            'departure_port': rng.choice(PORTS),
+            'discount_percentage': round(rng.uniform(50, 88), 1),
+            'current_price': round(rng.uniform(100, 3000), 2),
+        } for _ in range(offer_count // 2)],
+    }
+    total_offers = sum(len(o) for o in offers.values())
+
+    start = time.perf_counter()
+    index = SubscriptionIndex(subs)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexed = index.match_batch(offers)
+    indexed_time = time.perf_counter() - start
+    indexed_pairs = sum(len(o) for _, o in indexed.values())
+
+    start = time.perf_counter()
+    naive_pairs = sum(1 for kind, batch in offers.items() for offer in batch
+                      for sub in subs if subscription_matches(sub, kind, offer))
+    naive_time = time.perf_counter() - start
+
+    print(f"{sub_count} subscriptions, {total_offers} new offers")
+    print(f"  index build   {build * 1000:9.1f} ms")
+    print(f"  indexed match {indexed_time * 1000:9.1f} ms  {indexed_pairs} matches, "
+          f"{len(indexed)} subscriptions notified")
+    print(f"  naive match   {naive_time * 1000:9.1f} ms  {naive_pairs} matches")
+    if naive_pairs != indexed_pairs:
+        print("  MISMATCH between indexed and naive results")
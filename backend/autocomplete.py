@@ -0,0 +1,229 @@
+"""In-memory prefix index for airport, port and airline autocomplete.
+
+Every entry is indexed under a few normalized keys (IATA code, full name and
+each word of it) kept in one sorted list, so a prefix lookup is two
+`bisect` calls. When the prefix matches come up short, keys sharing the
+query's first letter are scanned with a bounded edit distance to tolerate
+typos ("lodon" -> London). The index is immutable: it is rebuilt from the
+offers in MongoDB after each refresh and swapped in atomically.
+"""
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from locations import AIRPORTS, PORTS
+
+KINDS = ('airport', 'port', 'airline', 'cruise_line')
+
+# Key ranks: lower is a better match
+RANK_CODE, RANK_NAME, RANK_WORD = 0, 1, 2
+_END = '\uffff'
+
+
+def normalize(text: str) -> str:
+    """Casefold, strip accents and collapse punctuation to single spaces"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    cleaned = ''.join(c if c.isalnum() else ' ' for c in stripped.casefold())
+    return ' '.join(cleaned.split())
+
+
+_IATA = re.compile(r'[a-z]{3}')
+_AIRPORT_NAMES = {
+    normalize(text): code
+    for code, (city, name) in AIRPORTS.items()
+    for text in (city, name, f"{city} ({code})")
+}
+
+
+def airport_code(text: Optional[str]) -> Optional[str]:
+    """IATA code for a typed code, city, airport name or suggestion label; None if unknown"""
+    key = normalize(text)
+    if _IATA.fullmatch(key):
+        return key.upper()
+    return _AIRPORT_NAMES.get(key)
+
+
+def _prefix_distance(query: str, key: str, max_dist: int) -> int:
+    """Edit distance between `query` and the closest prefix of `key` (transpositions count 1)"""
+    n = len(query)
+    key = key[:n + max_dist]
+    previous2 = None
+    previous = list(range(len(key) + 1))
+    for i in range(1, n + 1):
+        current = [i] + [0] * len(key)
+        row_min = current[0]
+        for j in range(1, len(key) + 1):
+            cost = 0 if query[i - 1] == key[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous2 is not None and i > 1 and j > 1
+                    and query[i - 1] == key[j - 2] and query[i - 2] == key[j - 1]):
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > max_dist:
+            return max_dist + 1
+        previous2, previous = previous, current
+    return min(previous[max(0, n - max_dist):])
+
+
+@dataclass(frozen=True)
+class Entry:
+    value: str
+    label: str
+    kind: str
+    detail: str = ''
+    weight: int = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "value": self.value,
+            "label": self.label,
+            "kind": self.kind,
+            "detail": self.detail,
+            "offers": self.weight,
+        }
+
+
+class AutocompleteIndex:
+    """Índice de prefixos (array ordenado + bisect) com ranking tolerante a erros"""
+
+    def __init__(self, entries: Iterable[Entry]):
+        self.entries: List[Entry] = list(entries)
+        keyed: List[Tuple[str, int, int]] = []
+        for idx, entry in enumerate(self.entries):
+            for key, rank in self._entry_keys(entry):
+                keyed.append((key, rank, idx))
+        keyed.sort()
+        self._keys = [key for key, _, _ in keyed]
+        self._refs = [(rank, idx) for _, rank, idx in keyed]
+
+    @staticmethod
+    def _entry_keys(entry: Entry) -> Iterable[Tuple[str, int]]:
+        codes, names = [], [entry.label]
+        if entry.kind == 'airport':
+            codes.append(entry.value)
+            names.append(entry.detail)
+        elif entry.kind == 'airline' and entry.detail:
+            codes.append(entry.detail)
+
+        seen = set()
+        for code in codes:
+            key = normalize(code)
+            if key:
+                seen.add(key)
+                yield key, RANK_CODE
+        for text in names:
+            name = normalize(text)
+            if name and name not in seen:
+                seen.add(name)
+                yield name, RANK_NAME
+            for word in name.split()[1:]:
+                if len(word) > 1 and word not in seen:
+                    seen.add(word)
+                    yield word, RANK_WORD
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _collect(self, lo: int, hi: int, best: Dict[int, Tuple], penalty: int, kinds):
+        for pos in range(lo, hi):
+            rank, idx = self._refs[pos]
+            if kinds and self.entries[idx].kind not in kinds:
+                continue
+            score = (penalty, rank)
+            if idx not in best or score < best[idx]:
+                best[idx] = score
+
+    def search(self, query: str, limit: int = 8, kinds: Optional[Iterable[str]] = None) -> List[dict]:
+        q = normalize(query)
+        if not q:
+            return []
+        kinds = set(kinds) if kinds else None
+        best: Dict[int, Tuple] = {}
+
+        # Exact/prefix matches
+        lo = bisect_left(self._keys, q)
+        hi = bisect_left(self._keys, q + _END, lo)
+        self._collect(lo, hi, best, 0, kinds)
+
+        # Typo tolerance, only when prefixes don't fill the list
+        if len(best) < limit and len(q) >= 3:
+            max_dist = 1 if len(q) <= 5 else 2
+            lo = bisect_left(self._keys, q[0])
+            hi = bisect_left(self._keys, q[0] + _END, lo)
+            last_key, last_dist = None, None
+            for pos in range(lo, hi):
+                key = self._keys[pos]
+                if key != last_key:
+                    last_key, last_dist = key, _prefix_distance(q, key, max_dist)
+                if 0 < last_dist <= max_dist:
+                    self._collect(pos, pos + 1, best, last_dist, kinds)
+
+        ranked = sorted(
+            best.items(),
+            key=lambda item: (item[1], self.entries[item[0]].value.casefold() != q,
+                              -self.entries[item[0]].weight, self.entries[item[0]].label)
+        )
+        return [self.entries[idx].as_dict() for idx, _ in ranked[:limit]]
+
+
+def build_index(observed: Optional[Dict[str, Counter]] = None, registry=None) -> AutocompleteIndex:
+    """Bundled vocabulary + registry sources + values observed in stored offers
+
+    `observed` maps a kind to a Counter of values seen in offers (airport
+    codes, port names, airline and cruise line names); counts rank entries.
+    """
+    observed = observed or {}
+    counts = {kind: observed.get(kind, Counter()) for kind in KINDS}
+    entries = []
+
+    airport_codes = set(AIRPORTS) | {c.upper() for c in counts['airport'] if c}
+    for code in sorted(airport_codes):
+        city, name = AIRPORTS.get(code, (None, ''))
+        label = f"{city} ({code})" if city else code
+        entries.append(Entry(code, label, 'airport', name, counts['airport'].get(code, 0)))
+
+    for port in sorted(set(PORTS) | {p for p in counts['port'] if p}):
+        entries.append(Entry(port, port, 'port', '', counts['port'].get(port, 0)))
+
+    airlines: Dict[str, str] = {}
+    cruise_lines = set()
+    if registry is not None:
+        for spec in registry.all('flight'):
+            airlines[spec.name] = spec.code or ''
+        for spec in registry.all('cruise'):
+            cruise_lines.add(spec.name)
+    for name in counts['airline']:
+        if name:
+            airlines.setdefault(name, '')
+    cruise_lines |= {n for n in counts['cruise_line'] if n}
+
+    for name, code in sorted(airlines.items()):
+        entries.append(Entry(name, name, 'airline', code, counts['airline'].get(name, 0)))
+    for name in sorted(cruise_lines):
+        entries.append(Entry(name, name, 'cruise_line', '', counts['cruise_line'].get(name, 0)))
+
+    return AutocompleteIndex(entries)
+
+
+async def _count_field(collection, field: str) -> Counter:
+    groups = await collection.aggregate([
+        {"$group": {"_id": f"${field}", "n": {"$sum": 1}}}
+    ]).to_list(None)
+    return Counter({g['_id']: g['n'] for g in groups if g['_id']})
+
+
+async def load_observed_vocabulary(db) -> Dict[str, Counter]:
+    """Count airports, ports, airlines and cruise lines across the stored offers"""
+    airports = await _count_field(db.flight_offers, 'departure_airport')
+    airports.update(await _count_field(db.flight_offers, 'arrival_airport'))
+    return {
+        'airport': airports,
+        'port': await _count_field(db.cruise_offers, 'departure_port'),
+        'airline': await _count_field(db.flight_offers, 'airline'),
+        'cruise_line': await _count_field(db.cruise_offers, 'cruise_line'),
+    }
@@ -0,0 +1,50 @@
+"""Benchmarks of the hot paths, one subcommand per module.
+
+    python bench.py parsing [fixtures_dir] [--repeat 20]
+    python bench.py processing [--offers 20000]
+    python bench.py alerts [--subs 100000] [--offers 500]
+    python bench.py geo [--offers 50000] [--queries 200]
+
+Each module keeps its own `bench()`; this script only parses the arguments
+and imports the module the subcommand needs.
+"""
+import argparse
+from pathlib import Path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scraping and matching hot paths")
+    commands = parser.add_subparsers(dest='module', required=True)
+
+    parsing_args = commands.add_parser('parsing', help="HTML backends against recorded or synthetic pages")
+    parsing_args.add_argument('fixtures', nargs='?', type=Path, help="default: backend/fixtures")
+    parsing_args.add_argument('--repeat', type=int, default=20)
+
+    processing_args = commands.add_parser('processing', help="event-loop lag with the CPU pool on and off")
+    processing_args.add_argument('--offers', type=int, default=20000)
+
+    alerts_args = commands.add_parser('alerts', help="subscription index against the naive matcher")
+    alerts_args.add_argument('--subs', type=int, default=100000)
+    alerts_args.add_argument('--offers', type=int, default=500)
+
+    geo_args = commands.add_parser('geo', help="nearby queries with the grid against a full scan")
+    geo_args.add_argument('--offers', type=int, default=50000)
+    geo_args.add_argument('--queries', type=int, default=200)
+
+    args = parser.parse_args(argv)
+    if args.module == 'parsing':
+        import parsing
+        parsing.bench(args.fixtures or parsing.FIXTURES_DIR, args.repeat)
+    elif args.module == 'processing':
+        import processing
+        processing.bench(args.offers)
+    elif args.module == 'alerts':
+        import alerts
+        alerts.bench(args.subs, args.offers)
+    elif args.module == 'geo':
+        import geo
+        geo.bench(args.offers, args.queries)
+
+
+if __name__ == '__main__':
+    main()
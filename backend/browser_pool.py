@@ -0,0 +1,209 @@
+"""Pool of warm Playwright browser contexts for JavaScript-heavy sources.
+
+One headless Chromium is launched for the lifetime of the app (or worker)
+and up to `size` contexts are kept open and reused across scrapes. A
+context is recycled after `max_pages` pages, which is what bounds its
+growth (cache, cookies, storage). Its JS heap is not measurable as a
+whole: every page runs in its own renderer and is closed after use, so
+`max_heap_mb` is checked against the heap of each page (CDP
+Performance.getMetrics) right before it closes, and retires a context as
+soon as one of its pages got that heavy. Images, fonts, media and known
+trackers are blocked at the network layer to cut page load time.
+
+Playwright is imported only when the pool starts, i.e. only when a source
+with method='browser' is enabled.
+"""
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+BLOCKED_RESOURCE_TYPES = frozenset({'image', 'font', 'media', 'imageset'})
+TRACKER_HOSTS = (
+    'google-analytics.com', 'googletagmanager.com', 'doubleclick.net',
+    'facebook.net', 'connect.facebook.net', 'hotjar.com', 'segment.io',
+    'newrelic.com', 'nr-data.net', 'optimizely.com', 'criteo.com',
+    'adnxs.com', 'taboola.com', 'bing.com',
+)
+
+
+class _PooledContext:
+    def __init__(self, context):
+        self.context = context
+        self.pages = 0
+        # Largest JS heap of a page rendered in this context
+        self.peak_heap_bytes = 0
+
+
+async def page_heap_bytes(page) -> int:
+    """JS heap in use by the page's renderer, via the DevTools protocol (0 if unavailable)"""
+    session = await page.context.new_cdp_session(page)
+    try:
+        await session.send('Performance.enable')
+        metrics = await session.send('Performance.getMetrics')
+    finally:
+        await session.detach()
+    return int(next((m['value'] for m in metrics['metrics'] if m['name'] == 'JSHeapUsedSize'), 0))
+
+
+class BrowserPool:
+    """Contextos de navegador reutilizáveis com limite de tamanho e reciclagem"""
+
+    def __init__(self, size: int = 2, max_pages: int = 50, max_heap_mb: int = 512,
+                 navigation_timeout: float = 30.0, user_agent: Optional[str] = None,
+                 block_trackers: bool = True):
+        self.size = size
+        self.max_pages = max_pages
+        self.max_heap_bytes = max_heap_mb * 1024 * 1024
+        self.navigation_timeout = navigation_timeout
+        self.user_agent = user_agent
+        self.block_trackers = block_trackers
+        self._playwright = None
+        self._browser = None
+        self._idle: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._start_lock = asyncio.Lock()
+        self.recycled = 0
+        self.peak_heap_bytes = 0
+
+    @classmethod
+    def from_env(cls) -> 'BrowserPool':
+        return cls(
+            size=int(os.environ.get('BROWSER_POOL_SIZE', 2)),
+            max_pages=int(os.environ.get('BROWSER_CONTEXT_MAX_PAGES', 50)),
+            max_heap_mb=int(os.environ.get('BROWSER_CONTEXT_MAX_HEAP_MB', 512)),
+        )
+
+    @property
+    def started(self) -> bool:
+        return self._browser is not None
+
+    async def start(self):
+        async with self._start_lock:
+            if self._browser is not None:
+                return
+            from playwright.async_api import async_playwright
+
+            self._playwright = await async_playwright().start()
+            try:
+                self._browser = await self._playwright.chromium.launch(
+                    headless=True,
+                    args=['--disable-dev-shm-usage', '--disable-gpu', '--no-first-run'],
+                )
+            except Exception:
+                # e.g. Chromium not installed; don't leave the driver process behind
+                await self._playwright.stop()
+                self._playwright = None
+                raise
+            self._idle = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.size)
+            logger.info(f"Browser pool started (size {self.size}, recycle after "
+                        f"{self.max_pages} pages or a {self.max_heap_bytes // (1024 * 1024)} MB page heap)")
+
+    async def close(self):
+        if self._browser is None:
+            return
+        while self._idle is not None and not self._idle.empty():
+            pooled = self._idle.get_nowait()
+            await self._close_context(pooled)
+        await self._browser.close()
+        await self._playwright.stop()
+        self._browser = None
+        self._playwright = None
+        logger.info("Browser pool closed")
+
+    async def _block_requests(self, route):
+        request = route.request
+        if request.resource_type in BLOCKED_RESOURCE_TYPES:
+            await route.abort()
+            return
+        if self.block_trackers:
+            host = urlparse(request.url).hostname or ''
+            if any(host == t or host.endswith('.' + t) for t in TRACKER_HOSTS):
+                await route.abort()
+                return
+        await route.continue_()
+
+    async def _new_context(self) -> _PooledContext:
+        context = await self._browser.new_context(
+            user_agent=self.user_agent,
+            java_script_enabled=True,
+            service_workers='block',
+        )
+        context.set_default_navigation_timeout(self.navigation_timeout * 1000)
+        await context.route('**/*', self._block_requests)
+        return _PooledContext(context)
+
+    async def _close_context(self, pooled: _PooledContext):
+        try:
+            await pooled.context.close()
+        except Exception as e:
+            logger.warning(f"Error closing browser context: {e}")
+
+    def _worn_out(self, pooled: _PooledContext) -> bool:
+        return pooled.pages >= self.max_pages or pooled.peak_heap_bytes >= self.max_heap_bytes
+
+    @asynccontextmanager
+    async def page(self):
+        """Check out a context, yield a fresh page on it and return the context afterwards"""
+        if self._browser is None:
+            await self.start()
+
+        async with self._slots:
+            pooled = None if self._idle.empty() else self._idle.get_nowait()
+            if pooled is None:
+                pooled = await self._new_context()
+
+            page = await pooled.context.new_page()
+            healthy = True
+            try:
+                yield page
+                try:
+                    heap = await page_heap_bytes(page)
+                    pooled.peak_heap_bytes = max(pooled.peak_heap_bytes, heap)
+                    self.peak_heap_bytes = max(self.peak_heap_bytes, heap)
+                except Exception as e:
+                    logger.debug(f"Could not read page heap: {e}")
+            except BaseException:
+                # A failed navigation can leave the context in a bad state
+                healthy = False
+                raise
+            finally:
+                pooled.pages += 1
+                try:
+                    await page.close()
+                except Exception:
+                    healthy = False
+                if healthy and not self._worn_out(pooled) and self._browser is not None:
+                    self._idle.put_nowait(pooled)
+                else:
+                    self.recycled += 1
+                    await self._close_context(pooled)
+
+    async def render(self, url: str, wait_for: Optional[str] = None) -> str:
+        """Load `url`, optionally wait for a selector, and return the rendered HTML"""
+        async with self.page() as page:
+            await page.goto(url, wait_until='domcontentloaded')
+            if wait_for:
+                try:
+                    await page.wait_for_selector(wait_for, timeout=self.navigation_timeout * 1000)
+                except Exception:
+                    logger.warning(f"Timed out waiting for '{wait_for}' on {url}")
+            return await page.content()
+
+    def stats(self) -> dict:
+        return {
+            "started": self.started,
+            "size": self.size,
+            "idle_contexts": self._idle.qsize() if self._idle is not None else 0,
+            "recycled_contexts": self.recycled,
+            "peak_page_heap_mb": round(self.peak_heap_bytes / (1024 * 1024), 1),
+        }
+
+
+def needs_browser(sources: List) -> bool:
+    return any(spec.method == 'browser' for spec in sources)
@@ -0,0 +1,304 @@
+"""Columnar export of the stored offers (Arrow record batches -> Parquet).
+
+Offers are read from a Motor cursor in batches of `EXPORT_BATCH_ROWS`,
+converted to Arrow record batches and appended to Parquet files partitioned
+Hive-style by type and scrape date:
+
+    EXPORT_DIR/type=flight/date=2026-10-19/part-<run>.parquet
+
+The cursor is sorted by `created_at`, so at most one file per type is open at
+a time and memory stays bounded by one batch. Incremental runs export only
+offers created after the previous run's watermark (kept in the
+`export_watermarks` collection). `created_at` is stamped right before an
+offer is inserted and the watermark trails the clock by
+`EXPORT_SETTLE_SECONDS`, so offers still being inserted are never skipped.
+Offers are deleted after 24h, so run the incremental export at least daily.
+
+Runs of the same type are serialized by a lock document in `export_locks`
+(expiring after `EXPORT_LOCK_TTL_SECONDS`), taken before the watermark is
+read; a second concurrent run fails with `ExportBusy` instead of exporting
+the same range twice.
+
+A run writes into `EXPORT_DIR/_staging-<type>-<run>/` (the leading underscore
+hides it from Parquet dataset readers) and publishes only once it finished:
+incremental files are moved into their partitions, while a full export
+replaces the type's partitions as a whole so no row appears twice. A failed
+run leaves neither files nor a new watermark behind.
+
+pyarrow is an optional dependency, imported on first use.
+
+    python export.py run [--full]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from processing import FIELD_TYPES, MODELS
+
+logger = logging.getLogger(__name__)
+
+COLLECTIONS = {'flight': 'flight_offers', 'cruise': 'cruise_offers'}
+
+EXPORT_DIR = Path(os.environ.get('EXPORT_DIR', Path(__file__).parent / 'exports'))
+BATCH_ROWS = int(os.environ.get('EXPORT_BATCH_ROWS', 5000))
+SETTLE = timedelta(seconds=int(os.environ.get('EXPORT_SETTLE_SECONDS', 60)))
+LOCK_TTL = timedelta(seconds=int(os.environ.get('EXPORT_LOCK_TTL_SECONDS', 3600)))
+
+
+class ExportUnavailable(RuntimeError):
+    pass
+
+
+class ExportBusy(RuntimeError):
+    """Another export run of the same type holds the lock"""
+
+
+async def _lock(db, kind: str, run_id: str) -> bool:
+    now = datetime.now(timezone.utc)
+    try:
+        doc = await db.export_locks.find_one_and_update(
+            {'_id': kind, '$or': [{'locked_until': {'$lt': now}}, {'locked_until': None}]},
+            {'$set': {'run_id': run_id, 'locked_until': now + LOCK_TTL}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # Held by a run that hasn't finished or expired
+        return False
+    return doc is not None and doc.get('run_id') == run_id
+
+
+async def _holds_lock(db, kind: str, run_id: str) -> bool:
+    return await db.export_locks.find_one({'_id': kind, 'run_id': run_id}, {'_id': 1}) is not None
+
+
+async def _unlock(db, kind: str, run_id: str):
+    await db.export_locks.update_one({'_id': kind, 'run_id': run_id}, {'$set': {'locked_until': None}})
+
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError:
+        raise ExportUnavailable("Parquet export requires pyarrow")
+
+
+def arrow_schema(kind: str):
+    pa = _arrow()
+    types = {str: pa.string(), float: pa.float64(), int: pa.int64(), bool: pa.bool_()}
+    fields = []
+    for (name, info), base in zip(MODELS[kind].model_fields.items(), FIELD_TYPES[kind]):
+        nullable = not info.is_required() or info.annotation is not base
+        fields.append(pa.field(name, types[base], nullable=nullable))
+    return pa.schema(fields)
+
+
+def _to_batch(schema, rows: List[dict]):
+    pa = _arrow()
+    columns = {field.name: [row.get(field.name) for row in rows] for field in schema}
+    return pa.RecordBatch.from_pydict(columns, schema=schema)
+
+
+class _PartitionWriter:
+    """Parquet writer that rolls over to a new file whenever the date partition changes"""
+
+    def __init__(self, root: Path, kind: str, schema, run_id: str):
+        self.root = root
+        self.kind = kind
+        self.schema = schema
+        self.run_id = run_id
+        self._writer = None
+        self._date: Optional[str] = None
+        self.files: List[str] = []
+
+    def write(self, date: str, rows: List[dict]):
+        if date != self._date:
+            self.close()
+            path = self.root / f"type={self.kind}" / f"date={date}" / f"part-{self.run_id}.parquet"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._writer = _arrow().parquet.ParquetWriter(str(path), self.schema, compression='zstd')
+            self._date = date
+            self.files.append(str(path.relative_to(self.root)))
+        self._writer.write_batch(_to_batch(self.schema, rows))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._date = None
+
+
+def _publish(staging: Path, root: Path, kind: str, files: List[str], replace: bool):
+    """Move a finished run's files into the dataset; `replace` swaps out the type's partitions"""
+    if not replace:
+        for name in files:
+            target = root / name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(staging / name, target)
+        return
+    current = root / f"type={kind}"
+    retired = root / f"_replaced-{kind}-{uuid.uuid4().hex[:6]}"
+    if current.exists():
+        current.rename(retired)
+    if (staging / f"type={kind}").exists():
+        (staging / f"type={kind}").rename(current)
+    shutil.rmtree(retired, ignore_errors=True)
+
+
+async def export_kind(db, kind: str, root: Path = EXPORT_DIR, full: bool = False,
+                      batch_rows: int = BATCH_ROWS) -> dict:
+    """Export one offer type; returns rows written, files and the new watermark
+
+    With `full`, everything is exported again and replaces the type's
+    existing partitions. Raises `ExportBusy` while another run of the type
+    is in progress.
+    """
+    schema = arrow_schema(kind)
+    run_id = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S') + '-' + uuid.uuid4().hex[:6]
+    if not await _lock(db, kind, run_id):
+        raise ExportBusy(f"A {kind} export is already running")
+    try:
+        return await _export_locked(db, kind, run_id, schema, root, full, batch_rows)
+    finally:
+        await _unlock(db, kind, run_id)
+
+
+async def _export_locked(db, kind: str, run_id: str, schema, root: Path, full: bool, batch_rows: int) -> dict:
+    watermarks = db.export_watermarks
+    previous = None if full else await watermarks.find_one({'kind': kind}, {'_id': 0})
+    until = (datetime.now(timezone.utc) - SETTLE).isoformat()
+    query = {'created_at': {'$lte': until}}
+    if previous:
+        query['created_at']['$gt'] = previous['watermark']
+
+    staging = root / f"_staging-{kind}-{run_id}"
+    writer = _PartitionWriter(staging, kind, schema, run_id)
+    cursor = db[COLLECTIONS[kind]].find(query, {'_id': 0}).sort('created_at', 1).batch_size(batch_rows)
+    rows_written = 0
+    pending: List[dict] = []
+    started = time.perf_counter()
+
+    async def flush():
+        nonlocal rows_written
+        # Split the batch on date boundaries (rows are in created_at order)
+        groups: List[Tuple[str, List[dict]]] = []
+        for row in pending:
+            date = (row.get('created_at') or '')[:10] or 'unknown'
+            if not groups or groups[-1][0] != date:
+                groups.append((date, []))
+            groups[-1][1].append(row)
+        # Arrow conversion and Parquet encoding run off the event loop
+        for date, rows in groups:
+            await asyncio.to_thread(writer.write, date, rows)
+        rows_written += len(pending)
+        pending.clear()
+
+    try:
+        try:
+            async for doc in cursor:
+                pending.append(doc)
+                if len(pending) >= batch_rows:
+                    await flush()
+            if pending:
+                await flush()
+        finally:
+            await asyncio.to_thread(writer.close)
+        if not await _holds_lock(db, kind, run_id):
+            raise ExportBusy(f"The {kind} export lock expired before the run finished")
+        await asyncio.to_thread(_publish, staging, root, kind, writer.files, full)
+    finally:
+        # Leftovers of a failed run (or the emptied staging dir of a finished one)
+        await asyncio.to_thread(shutil.rmtree, staging, True)
+
+    summary = {
+        "type": kind,
+        "rows": rows_written,
+        "files": writer.files,
+        "watermark": until,
+        "previous_watermark": previous['watermark'] if previous else None,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+    await watermarks.update_one(
+        {'kind': kind},
+        {'$set': {'kind': kind, 'watermark': until, 'last_run': datetime.now(timezone.utc).isoformat(),
+                  'last_rows': rows_written}},
+        upsert=True
+    )
+    logger.info(f"Exported {rows_written} {kind} offers to {len(writer.files)} Parquet files")
+    return summary
+
+
+async def export_offers(db, root: Path = EXPORT_DIR, full: bool = False) -> Dict[str, dict]:
+    return {kind: await export_kind(db, kind, root, full) for kind in MODELS}
+
+
+def _write_rows(writer, schema, rows: List[dict]):
+    writer.write_batch(_to_batch(schema, rows))
+
+
+async def write_download(db, kind: str, path: Path, since: Optional[str] = None,
+                         batch_rows: int = BATCH_ROWS) -> int:
+    """Stream one offer type into a single (unpartitioned) Parquet file for download"""
+    schema = arrow_schema(kind)
+    query = {'created_at': {'$gt': since}} if since else {}
+    cursor = db[COLLECTIONS[kind]].find(query, {'_id': 0}).sort('created_at', 1).batch_size(batch_rows)
+    writer = _arrow().parquet.ParquetWriter(str(path), schema, compression='zstd')
+    rows = 0
+    pending: List[dict] = []
+    try:
+        async for doc in cursor:
+            pending.append(doc)
+            if len(pending) >= batch_rows:
+                await asyncio.to_thread(_write_rows, writer, schema, pending)
+                rows += len(pending)
+                pending = []
+        if pending:
+            await asyncio.to_thread(_write_rows, writer, schema, pending)
+            rows += len(pending)
+    finally:
+        await asyncio.to_thread(writer.close)
+    return rows
+
+
+def list_exports(root: Path = EXPORT_DIR) -> List[dict]:
+    if not root.exists():
+        return []
+    return [
+        {"path": str(path.relative_to(root)), "bytes": path.stat().st_size}
+        for path in sorted(root.glob('type=*/date=*/*.parquet'))
+    ]
+
+
+async def _run(full: bool):
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        summary = await export_offers(client[os.environ['DB_NAME']], full=full)
+        for kind, result in summary.items():
+            print(f"{kind}: {result['rows']} rows, {len(result['files'])} files, watermark {result['watermark']}")
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export the stored offers to partitioned Parquet files")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_args = commands.add_parser('run', help="export offers created since the last run")
+    run_args.add_argument('--full', action='store_true', help="ignore the watermark and replace every partition")
+    asyncio.run(_run(full=parser.parse_args().full))
@@ -0,0 +1,157 @@
+"""Conditional upstream fetches.
+
+For every source URL we keep the last ETag, Last-Modified and a hash of the
+body in `source_validators`. Refreshes send If-None-Match/If-Modified-Since;
+a 304, or a 200 whose body hashes to the stored value, means the page is
+unchanged and the source can skip parsing and offer writes.
+
+New validators are only staged while a source is fetched. The caller
+commits them once the source's offers are stored (or discards them when
+parsing or storing fails), so a failed run is retried in full instead of
+being skipped as unchanged.
+"""
+import asyncio
+import hashlib
+import logging
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+@dataclass
+class FetchStats:
+    """Contadores de fetch de uma fonte durante um refresh"""
+
+    requests: int = 0
+    not_modified: int = 0
+    hash_unchanged: int = 0
+    bytes_downloaded: int = 0
+    bytes_saved: int = 0
+    parses_skipped: int = 0
+    changed: bool = False
+
+    def as_counters(self) -> Dict[str, int]:
+        counters = asdict(self)
+        counters.pop('changed')
+        return counters
+
+
+class ValidatorStore:
+    """Validadores HTTP por URL (MongoDB, com cache em memória)"""
+
+    def __init__(self, db=None):
+        self.collection = db.source_validators if db is not None else None
+        self._cache: Dict[str, dict] = {}
+        # source key -> url -> validator, waiting for the source's offers to be stored
+        self._pending: Dict[str, Dict[str, dict]] = {}
+
+    async def get(self, url: str) -> Optional[dict]:
+        if url in self._cache:
+            return self._cache[url]
+        if self.collection is None:
+            return None
+        validator = await self.collection.find_one({'_id': url}, {'_id': 0})
+        if validator:
+            self._cache[url] = validator
+        return validator
+
+    def stage(self, url: str, source_key: str, response: httpx.Response, digest: str):
+        """Hold the validators of a fetched page until `commit(source_key)`"""
+        self._pending.setdefault(source_key, {})[url] = {
+            'source': source_key,
+            'etag': response.headers.get('etag'),
+            'last_modified': response.headers.get('last-modified'),
+            'content_hash': digest,
+            'content_length': len(response.content),
+            'updated_at': datetime.now(timezone.utc).isoformat(),
+        }
+
+    async def commit(self, source_key: str):
+        """Store the staged validators of a source (call after its offers are written)"""
+        for url, validator in self._pending.pop(source_key, {}).items():
+            self._cache[url] = validator
+            if self.collection is not None:
+                await self.collection.update_one({'_id': url}, {'$set': validator}, upsert=True)
+
+    def discard(self, source_key: str):
+        self._pending.pop(source_key, None)
+
+
+def conditional_headers(validator: Optional[dict]) -> Dict[str, str]:
+    headers = {}
+    if validator:
+        if validator.get('etag'):
+            headers['If-None-Match'] = validator['etag']
+        if validator.get('last_modified'):
+            headers['If-Modified-Since'] = validator['last_modified']
+    return headers
+
+
+async def _conditional_get(http: httpx.AsyncClient, url: str, source_key: str,
+                           store: ValidatorStore, stats: FetchStats) -> Tuple[Optional[str], bool]:
+    """GET `url` with validators; returns (text or None on 304, changed)"""
+    validator = await store.get(url)
+    response = await http.get(url, headers=conditional_headers(validator))
+    stats.requests += 1
+
+    if response.status_code == 304 and validator:
+        stats.not_modified += 1
+        return None, False
+
+    response.raise_for_status()
+    stats.bytes_downloaded += len(response.content)
+    digest = content_hash(response.content)
+    unchanged = bool(validator) and validator.get('content_hash') == digest
+    if unchanged:
+        stats.hash_unchanged += 1
+    # Always stage: keeps the freshest ETag/Last-Modified for the next request
+    store.stage(url, source_key, response, digest)
+    return response.text, not unchanged
+
+
+async def fetch_source_pages(http: httpx.AsyncClient, spec, store: ValidatorStore,
+                             stats: FetchStats) -> Optional[List[Tuple[str, str]]]:
+    """Fetch every endpoint of a source conditionally
+
+    Returns None when no page changed since the last refresh. Otherwise
+    returns (url, html) for all endpoints, re-downloading 304 pages in full so
+    the source is parsed as a whole. Either way the new validators are only
+    staged in `store`; commit them once the outcome is stored.
+    """
+    store.discard(spec.key)
+    pages = []
+    for url in spec.endpoints:
+        text, changed = await _conditional_get(http, url, spec.key, store, stats)
+        pages.append((url, text, changed))
+        # Rate limiting por fonte
+        await asyncio.sleep(spec.rate_limit)
+
+    if not any(changed for _, _, changed in pages):
+        for url, text, _ in pages:
+            if text is None:
+                validator = await store.get(url)
+                stats.bytes_saved += (validator or {}).get('content_length', 0)
+        stats.parses_skipped += len(pages)
+        return None
+
+    stats.changed = True
+    results = []
+    for url, text, _ in pages:
+        if text is None:
+            response = await http.get(url)
+            response.raise_for_status()
+            stats.requests += 1
+            stats.bytes_downloaded += len(response.content)
+            store.stage(url, spec.key, response, content_hash(response.content))
+            text = response.text
+            await asyncio.sleep(spec.rate_limit)
+        results.append((url, text))
+    return results
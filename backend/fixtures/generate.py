@@ -0,0 +1,197 @@
+"""Generate synthetic result pages for the aggregator sources (parser benchmarks and tests).
+
+These pages are NOT captures of the real sites: they mimic their markup
+(class soup, nested wrappers, inline state, filter rows and ad slots around
+the fare cards) and carry the `data-*` hooks the registry selectors use. Real
+pages can be recorded with SCRAPER_RECORD_FIXTURES=<dir> and benchmarked the
+same way. The output is deterministic for a given seed.
+
+The committed fixtures are one small page per source:
+
+    python fixtures/generate.py
+
+Larger pages for the benchmark:
+
+    python fixtures/generate.py --out /tmp/pages --cards 40 80 150 --noise 30
+    python bench.py parsing /tmp/pages
+"""
+import argparse
+import html
+import json
+import random
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from locations import AIRPORTS  # noqa: E402
+
+AIRLINES = [('United Airlines', 'UA'), ('Delta', 'DL'), ('Lufthansa', 'LH'), ('Air France', 'AF'),
+            ('KLM', 'KL'), ('Emirates', 'EK'), ('British Airways', 'BA'), ('LATAM', 'LA'),
+            ('Iberia', 'IB'), ('TAP Air Portugal', 'TP'), ('Qatar Airways', 'QR'), ('Azul', 'AD')]
+
+CODES = sorted(AIRPORTS)
+
+
+def fare(rng):
+    name, code = rng.choice(AIRLINES)
+    dep = rng.choice(CODES)
+    arr = rng.choice([c for c in CODES if c != dep])
+    original = round(rng.uniform(320, 2900), 2)
+    current = round(original * (1 - rng.uniform(0.35, 0.9)), 2)
+    stops = rng.choice([0, 0, 1, 1, 2])
+    duration = rng.randint(75, 1100)
+    when = date(2026, 11, 1) + timedelta(days=rng.randint(0, 120))
+    return dict(name=name, number=f"{code}{rng.randint(10, 9899)}", dep=dep, arr=arr,
+                date=when.isoformat(), original=original, current=current, stops=stops,
+                duration=duration, code=code)
+
+
+def money(v, style):
+    if style == 'us':
+        return f"${v:,.2f}"
+    return f"US$ {v:,.0f}"
+
+
+def kayak_card(f, i, rng):
+    h, m = divmod(f['duration'], 60)
+    return f'''
+<div class="nrc6 resultWrapper" data-fare-card data-resultid="{rng.getrandbits(64):016x}">
+  <div class="nrc6-inner">
+    <div class="c_cgF c_cgF-mod-variant-default">
+      <img src="/rimg/provider-logos/airlines/v/{f['code']}.png?crop=false&amp;width=108" alt="{html.escape(f['name'])}" width="54">
+      <span class="c_cgF-carrier" data-airline>{html.escape(f['name'])}</span>
+      <span class="c_cgF-flight" data-flight-number>{f['number']}</span>
+    </div>
+    <ol class="hJSA-list">
+      <li class="hJSA-item">
+        <div class="vmXl vmXl-mod-variant-large">
+          <span class="depart-time base-time">{rng.randint(0, 23):02d}:{rng.choice(['00', '15', '30', '45'])}</span>
+          <span class="EFvI"><span class="apt" data-departure>{f['dep']}</span></span>
+          <span class="time-separator">&ndash;</span>
+          <span class="EFvI"><span class="apt" data-arrival>{f['arr']}</span></span>
+        </div>
+        <div class="JWEO"><span class="JWEO-stops-text" data-stops>{f['stops']}</span> stop(s)</div>
+        <div class="xdW8"><span class="vmXl" data-duration>{f['duration']}</span><span class="sr-only">{h}h {m:02d}m</span></div>
+        <div class="c_date" data-departure-date>{f['date']}</div>
+      </li>
+    </ol>
+    <div class="nrc6-price-section">
+      <div class="f8F1-price-text-container">
+        <s class="f8F1-was" data-original-price>{money(f['original'], 'us')}</s>
+        <div class="f8F1-price-text" data-current-price>{money(f['current'], 'us')}</div>
+        <div class="f8F1-multiple-ptc-total-price">Total per traveler</div>
+      </div>
+      <div class="M_JD-booking-btn"><a role="link" class="Iqt3 Iqt3-mod-stretch" href="/book/flight?code={rng.getrandbits(48):012x}&amp;h={i}">View Deal</a></div>
+    </div>
+  </div>
+</div>'''
+
+
+def momondo_card(f, i, rng):
+    return f'''
+<div class="Base-Results-HorizonResult" data-fare-card role="group">
+  <div class="resultInner"><div class="inner-grid keel-grid">
+    <div class="col-info">
+      <div class="section times"><div class="top">
+        <span data-departure>{f['dep']}</span> &rarr; <span data-arrival>{f['arr']}</span>
+      </div><div class="bottom" data-departure-date>{f['date']}</div></div>
+      <div class="section stops"><div class="top"><span class="stops-text" data-stops>{f['stops']}</span></div></div>
+      <div class="section duration"><div class="top" data-duration>{f['duration']}</div></div>
+      <div class="section carrier"><div class="codeshares-airline-names" data-airline>{html.escape(f['name'])}</div>
+        <div class="planeDetails details-heading" data-flight-number>{f['number']}</div></div>
+    </div>
+    <div class="col-price result-column">
+      <div class="price-section"><span class="price-text strike" data-original-price>{money(f['original'], 'intl')}</span>
+        <span class="price-text" data-current-price>{money(f['current'], 'intl')}</span></div>
+      <div class="booking"><a class="booking-link" href="https://www.momondo.com/book/flight?sid={rng.getrandbits(40):010x}&amp;r={i}">Go to site</a></div>
+    </div>
+  </div></div>
+</div>'''
+
+
+def gflights_card(f, i, rng):
+    # DOM snapshot after client-side rendering: deep wrappers, inline styles, jsdata attrs
+    wrap_open = ''.join(f'<div class="{c}" jsname="{rng.getrandbits(20):05x}">' for c in ('yR1fYc', 'mxvQLc', 'OgQvJf', 'JMc5Xc'))
+    wrap_close = '</div>' * 4
+    return f'''
+<li class="pIav2d" data-fare-card jsaction="click:O1htCb;" data-id="{rng.getrandbits(64):016x}">{wrap_open}
+  <div class="Ir0Voe"><div class="sSHqwe tPgKwe ogfYpf"><span data-airline style="color:#70757a">{html.escape(f['name'])}</span>
+    <span class="Xsgmwe" data-flight-number>{f['number']}</span></div>
+  <div class="zxVSec YMlIz tPgKwe ogfYpf"><span jscontroller="cNtv4b"><span class="eoY5cb" data-departure>{f['dep']}</span></span>
+    <span class="PTuQse sSHqwe tPgKwe ogfYpf"><span class="eoY5cb" data-arrival>{f['arr']}</span></span></div>
+  <div class="hF6lYb sSHqwe ogfYpf tPgKwe" data-departure-date>{f['date']}</div></div>
+  <div class="Ak5kof"><div class="gvkrdb AdWm1c tPgKwe ogfYpf" data-duration>{f['duration']}</div></div>
+  <div class="BbR8Ec"><div class="EfT7Ae AdWm1c tPgKwe"><span class="ogfYpf" data-stops>{f['stops']}</span></div></div>
+  <div class="U3gSDe"><div class="BVAVmf I11szd POX3ye"><div class="YMlIz FpEdX">
+    <span data-original-price style="text-decoration:line-through">{money(f['original'], 'us')}</span>
+    <span data-current-price aria-label="{f['current']:.0f} US dollars">{money(f['current'], 'us')}</span></div></div></div>
+  <a class="hUTved" href="/travel/flights/booking?tfs={rng.getrandbits(96):024x}&amp;i={i}" aria-label="Select flight"></a>
+{wrap_close}</li>'''
+
+
+def noise(rng, kind, n):
+    blocks = []
+    for j in range(n):
+        if kind == 'ad':
+            blocks.append(f'<aside class="ad-slot" data-slot="{j}"><iframe title="ad" src="about:blank" width="300" height="250"></iframe>'
+                          f'<p class="sponsored">Sponsored &middot; Hotels from ${rng.randint(39, 299)}</p></aside>')
+        else:
+            blocks.append(f'<div class="filter-row"><label><input type="checkbox" name="{kind}" value="{j}" checked> '
+                          f'{html.escape(rng.choice(AIRLINES)[0])}</label><span class="count">{rng.randint(1, 400)}</span></div>')
+    return '\n'.join(blocks)
+
+
+def page(title, body, state, rng, css_rules):
+    script = json.dumps(state, separators=(',', ':'))
+    css = ''.join(f'.c{rng.getrandbits(24):06x}{{margin:{rng.randint(0, 24)}px;color:#{rng.getrandbits(24):06x}}}' for _ in range(css_rules))
+    return f'''<!DOCTYPE html>
+<!-- Synthetic page generated by backend/fixtures/generate.py, not a capture of the real site -->
+<html lang="en"><head><meta charset="utf-8"><title>{title}</title>
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<style>{css}</style>
+<script>window.__INITIAL_STATE__={script};</script>
+</head><body>
+<header class="site-header"><nav><a href="/">Home</a><a href="/flights">Flights</a><a href="/hotels">Stays</a><a href="/cars">Cars</a><a href="/deals">Deals</a></nav></header>
+{body}
+<footer class="site-footer"><ul>{''.join(f'<li><a href="/info/{k}">{k.title()}</a></li>' for k in ('about', 'careers', 'mobile', 'privacy', 'terms', 'help'))}</ul></footer>
+</body></html>
+'''
+
+
+SOURCES = {
+    'kayak': (kayak_card, 'ol', 'resultsList'),
+    'momondo': (momondo_card, 'div', 'resultsContainer'),
+    'google_flights': (gflights_card, 'ul', 'Rk10dc'),
+}
+
+
+def generate(out: Path, cards=(12,), noise_rows: int = 4, css_rules: int = 20, seed: int = 1000):
+    for offset, (source, (card, tag, cls)) in enumerate(SOURCES.items()):
+        rng = random.Random(seed + offset)
+        directory = out / source
+        directory.mkdir(parents=True, exist_ok=True)
+        for number, count in enumerate(cards, 1):
+            fares = [fare(rng) for _ in range(count)]
+            cards_html = '\n'.join(card(f, i, rng) for i, f in enumerate(fares))
+            body = (f'<main><section class="filters">{noise(rng, "airline", noise_rows)}</section>'
+                    f'<{tag} class="{cls}">{cards_html}</{tag}>'
+                    f'<section class="ads">{noise(rng, "ad", max(1, noise_rows // 4))}</section></main>')
+            state = {'search': {'page': number, 'results': len(fares)},
+                     'prices': [[f['number'], f['current']] for f in fares]}
+            dep, arr = fares[0]['dep'], fares[0]['arr']
+            path = directory / f"synthetic-{dep.lower()}-{arr.lower()}-p{number}.html"
+            path.write_text(page(f"{dep} to {arr} | {source}", body, state, rng, css_rules), encoding='utf-8')
+            print(f"{path}: {count} fare cards")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate synthetic aggregator result pages")
+    parser.add_argument('--out', type=Path, default=Path(__file__).resolve().parent)
+    parser.add_argument('--cards', type=int, nargs='+', default=[12], help="fare cards per page, one page each")
+    parser.add_argument('--noise', type=int, default=4, help="filter rows around the results")
+    parser.add_argument('--css-rules', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1000)
+    args = parser.parse_args()
+    generate(args.out, args.cards, args.noise, args.css_rules, args.seed)
@@ -0,0 +1,215 @@
+"""Distance-aware ranking of the current offers ("deals departing near me").
+
+Offers are placed at their departure airport/port (see locations.py) and
+held in NumPy arrays. A query first collects the grid cells overlapping
+the search radius, then computes haversine distances for those candidates
+only, vectorized, and ranks them by a blend of proximity and discount:
+
+    score = weight * discount / 100 + (1 - weight) * (1 - distance / radius)
+
+The index only keeps each offer's id, type, coordinates and discount, and
+is loaded with a projection of just those fields (`INDEX_FIELDS`); the few
+offers a query returns are then fetched by id (`hydrate`). It is immutable,
+rebuilt from MongoDB together with the other in-memory indexes and swapped
+in atomically.
+
+    python bench.py geo [--offers 50000] [--queries 200]
+"""
+import math
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from locations import AIRPORT_COORDS, PORT_COORDS
+
+EARTH_RADIUS_KM = 6371.0088
+KIND_CODES = {'flight': 0, 'cruise': 1}
+KINDS = {code: kind for kind, code in KIND_CODES.items()}
+
+# Everything the index needs from an offer
+INDEX_FIELDS = {
+    'flight': ('id', 'departure_airport', 'discount_percentage'),
+    'cruise': ('id', 'departure_port', 'discount_percentage'),
+}
+
+
+def offer_location(kind: str, offer: dict) -> Optional[Tuple[float, float]]:
+    if kind == 'flight':
+        return AIRPORT_COORDS.get((offer.get('departure_airport') or '').upper())
+    return PORT_COORDS.get(offer.get('departure_port'))
+
+
+def resolve_place(name: str) -> Optional[Tuple[float, float]]:
+    """Coordinates of an IATA code or cruise port name"""
+    if name.upper() in AIRPORT_COORDS:
+        return AIRPORT_COORDS[name.upper()]
+    for port, coords in PORT_COORDS.items():
+        if port.casefold() == name.strip().casefold():
+            return coords
+    return None
+
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Distance from one point to many; all angles in radians"""
+    dlat = lats - lat
+    dlon = lons - lon
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat) * np.cos(lats) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class GeoIndex:
+    """Ofertas atuais em arrays NumPy, com grade lat/lon como pré-filtro"""
+
+    def __init__(self, offers_by_kind: Dict[str, List[dict]], cell_degrees: float = 2.0):
+        self.cell_degrees = cell_degrees
+        self.lon_cells = math.ceil(360 / cell_degrees)
+        self.ids: List[str] = []
+        coords, kinds, discounts = [], [], []
+        self.unlocated = 0
+        for kind, offers in offers_by_kind.items():
+            for offer in offers:
+                location = offer_location(kind, offer)
+                if location is None:
+                    self.unlocated += 1
+                    continue
+                self.ids.append(offer.get('id'))
+                coords.append(location)
+                kinds.append(KIND_CODES[kind])
+                discounts.append(offer['discount_percentage'])
+
+        points = np.radians(np.array(coords, dtype=np.float64).reshape(-1, 2))
+        self.lats = points[:, 0]
+        self.lons = points[:, 1]
+        self.kinds = np.array(kinds, dtype=np.int8)
+        self.discounts = np.array(discounts, dtype=np.float64)
+
+        cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for idx, (lat, lon) in enumerate(coords):
+            cells[self._cell(lat, lon)].append(idx)
+        self._cells = {cell: np.array(idxs, dtype=np.int64) for cell, idxs in cells.items()}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        row = int((lat + 90) // self.cell_degrees)
+        col = int((lon + 180) // self.cell_degrees) % self.lon_cells
+        return row, col
+
+    def _candidates(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Offer positions in the grid cells overlapping the search radius"""
+        radius_deg = math.degrees(radius_km / EARTH_RADIUS_KM)
+        lat_lo, lat_hi = lat - radius_deg, lat + radius_deg
+        if lat_lo <= -90 or lat_hi >= 90:
+            cols = range(self.lon_cells)  # Circle covers a pole
+        else:
+            # Degrees of longitude shrink towards the poles; size for the worst latitude
+            narrowest = max(min(math.cos(math.radians(lat_lo)), math.cos(math.radians(lat_hi))), 1e-9)
+            lon_span = radius_deg / narrowest + self.cell_degrees
+            if lon_span >= 180:
+                cols = range(self.lon_cells)
+            else:
+                first = int((lon - lon_span + 180) // self.cell_degrees)
+                last = int((lon + lon_span + 180) // self.cell_degrees)
+                cols = {c % self.lon_cells for c in range(first, last + 1)}
+        rows = range(int((max(lat_lo, -90) + 90) // self.cell_degrees),
+                     int((min(lat_hi, 90) + 90) // self.cell_degrees) + 1)
+        found = [self._cells[(r, c)] for r in rows for c in cols if (r, c) in self._cells]
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(found)
+
+    def nearby(self, lat: float, lon: float, radius_km: float = 500.0, offer_type: str = 'all',
+               min_discount: float = 0.0, limit: int = 20, weight: float = 0.5,
+               use_grid: bool = True) -> Tuple[List[dict], int]:
+        """Best offers departing within `radius_km`; returns (ranked hits, candidates scanned)
+
+        A hit is the offer's id and type with its distance and score; see
+        `hydrate` for the full offers.
+        """
+        if not self.ids:
+            return [], 0
+        idx = self._candidates(lat, lon, radius_km) if use_grid else np.arange(len(self.ids))
+        if offer_type != 'all':
+            idx = idx[self.kinds[idx] == KIND_CODES[offer_type]]
+        idx = idx[self.discounts[idx] >= min_discount]
+        scanned = len(idx)
+        if scanned == 0:
+            return [], 0
+
+        distances = haversine_km(math.radians(lat), math.radians(lon), self.lats[idx], self.lons[idx])
+        inside = distances <= radius_km
+        idx, distances = idx[inside], distances[inside]
+        if len(idx) == 0:
+            return [], scanned
+
+        scores = weight * self.discounts[idx] / 100 + (1 - weight) * (1 - distances / radius_km)
+        if len(idx) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            top = np.arange(len(idx))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        results = [
+            {"id": self.ids[idx[i]], "type": KINDS[int(self.kinds[idx[i]])],
+             "distance_km": round(float(distances[i]), 1), "score": round(float(scores[i]), 4)}
+            for i in top
+        ]
+        return results, scanned
+
+
+async def load_index_fields(db) -> Dict[str, List[dict]]:
+    """The fields the index needs of every current offer, keyed by kind"""
+    return {
+        kind: await db[f"{kind}_offers"].find({}, {"_id": 0, **{f: 1 for f in fields}}).to_list(None)
+        for kind, fields in INDEX_FIELDS.items()
+    }
+
+
+async def ensure_indexes(db):
+    """MongoDB index behind `hydrate`"""
+    for kind in INDEX_FIELDS:
+        await db[f"{kind}_offers"].create_index('id')
+
+
+async def hydrate(db, hits: List[dict]) -> List[dict]:
+    """Full offers for ranked hits, in rank order (offers deleted since the rebuild are dropped)"""
+    offers = {}
+    for kind in INDEX_FIELDS:
+        ids = [hit['id'] for hit in hits if hit['type'] == kind]
+        if ids:
+            async for offer in db[f"{kind}_offers"].find({'id': {'$in': ids}}, {"_id": 0}):
+                offers[(kind, offer['id'])] = offer
+    return [{**offers[(hit['type'], hit['id'])], **hit} for hit in hits if (hit['type'], hit['id']) in offers]
+
+
+# Benchmark
+def bench(offer_count: int, queries: int):
+    rng = random.Random(42)
+    airports, ports = list(AIRPORT_COORDS), list(PORT_COORDS)
+    offers = {
+        'flight': [{'departure_airport': rng.choice(airports),
+                    'discount_percentage': round(rng.uniform(50, 92), 1)}
+                   for _ in range(offer_count * 2 // 3)],
+        'cruise': [{'departure_port': rng.choice(ports),
+                    'discount_percentage': round(rng.uniform(50, 88), 1)}
+                   for _ in range(offer_count // 3)],
+    }
+    start = time.perf_counter()
+    index = GeoIndex(offers)
+    print(f"{len(index)} offers indexed in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    points = [(rng.uniform(-60, 65), rng.uniform(-180, 180)) for _ in range(queries)]
+    for label, use_grid in (("full scan", False), ("grid", True)):
+        timings, scanned = [], 0
+        for lat, lon in points:
+            start = time.perf_counter()
+            _, n = index.nearby(lat, lon, 800, use_grid=use_grid)
+            timings.append(time.perf_counter() - start)
+            scanned += n
+        timings.sort()
+        print(f"  {label:9s}  p50 {timings[len(timings) // 2] * 1000:7.3f} ms  "
+              f"p99 {timings[int(len(timings) * 0.99) - 1] * 1000:7.3f} ms  "
+              f"avg candidates {scanned / queries:9.0f}")
@@ -0,0 +1,208 @@
+"""MongoDB-backed coordination of scrape jobs.
+
+Every source has one document in `scrape_leases`. A process may scrape a
+source only after atomically taking its lease, and only once the source's
+refresh cadence has elapsed since the last successful run. With any number
+of API replicas or scrape workers, each source is therefore refreshed by
+exactly one process per cadence. The lease is renewed while the source is
+scraped and checked again right before its offers are written, so a run
+that outlived its lease never writes over the run that took it over.
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from fetch_cache import FetchStats
+from processing import unpack
+from sources import SourceSpec
+
+logger = logging.getLogger(__name__)
+
+LEASE_TTL = timedelta(seconds=int(os.environ.get('SCRAPE_LEASE_TTL_SECONDS', 900)))
+OFFER_RETENTION = timedelta(hours=24)
+# A source counts as due slightly early so an hourly job doesn't skip an hourly source
+DUE_GRACE = timedelta(seconds=int(os.environ.get('SCRAPE_DUE_GRACE_SECONDS', 120)))
+
+
+class LeaseLost(RuntimeError):
+    """The lease expired and another process took the source over"""
+
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class LeaseManager:
+    """Leases por fonte na coleção scrape_leases"""
+
+    def __init__(self, db, owner: str = None, ttl: timedelta = LEASE_TTL):
+        self.collection = db.scrape_leases
+        self.owner = owner or default_owner()
+        self.ttl = ttl
+
+    async def acquire(self, spec: SourceSpec) -> bool:
+        """Take the source's lease if it is free (or expired) and the source is due"""
+        now = datetime.now(timezone.utc)
+        try:
+            doc = await self.collection.find_one_and_update(
+                {
+                    '_id': spec.key,
+                    '$and': [
+                        {'$or': [{'lease_until': {'$lt': now}}, {'lease_until': None}]},
+                        {'$or': [{'last_run': {'$lt': now - spec.refresh_every + DUE_GRACE}}, {'last_run': None}]},
+                    ],
+                },
+                {'$set': {'owner': self.owner, 'lease_until': now + self.ttl, 'acquired_at': now}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # Someone else holds the lease, or the source isn't due yet
+            return False
+        return doc is not None and doc.get('owner') == self.owner
+
+    async def renew(self, spec: SourceSpec) -> bool:
+        """Extend a lease this process holds; False when another process took it over"""
+        result = await self.collection.update_one(
+            {'_id': spec.key, 'owner': self.owner},
+            {'$set': {'lease_until': datetime.now(timezone.utc) + self.ttl}}
+        )
+        return result.matched_count == 1
+
+    @asynccontextmanager
+    async def keepalive(self, spec: SourceSpec):
+        """Renew the lease every third of its TTL while the block runs"""
+        async def renew_periodically():
+            while True:
+                await asyncio.sleep(self.ttl.total_seconds() / 3)
+                if not await self.renew(spec):
+                    logger.warning(f"Lost the lease on {spec.key} while scraping it")
+                    return
+
+        task = asyncio.create_task(renew_periodically())
+        try:
+            yield
+        finally:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+    async def release(self, spec: SourceSpec, success: bool, offers: int = 0, error: str = None,
+                      fetch: Optional[FetchStats] = None) -> bool:
+        now = datetime.now(timezone.utc)
+        update = {
+            'lease_until': now,
+            'last_status': 'ok' if success else 'error',
+            'last_error': error,
+            'last_offers': offers,
+            'finished_at': now,
+        }
+        if success:
+            update['last_run'] = now
+        change = {'$set': update}
+        if fetch is not None:
+            update['last_unchanged'] = not fetch.changed
+            # Cumulative conditional-fetch counters (bytes saved, parses skipped, ...)
+            change['$inc'] = {f"fetch.{k}": v for k, v in fetch.as_counters().items()}
+        result = await self.collection.update_one({'_id': spec.key, 'owner': self.owner}, change)
+        if result.matched_count == 0:
+            logger.warning(f"Lease on {spec.key} was taken over before release; status not recorded")
+            return False
+        return True
+
+    async def status(self) -> List[dict]:
+        leases = await self.collection.find({}).to_list(1000)
+        for lease in leases:
+            lease['source'] = lease.pop('_id')
+            for key, value in lease.items():
+                if isinstance(value, datetime):
+                    lease[key] = value.replace(tzinfo=timezone.utc).isoformat()
+        return leases
+
+
+async def scrape_source(scraper, spec: SourceSpec, search_id: str) -> List[tuple]:
+    if spec.kind == 'flight':
+        return await scraper.scrape_flight_deals(search_id, sources=[spec], conditional=True, raise_errors=True)
+    return await scraper.scrape_cruise_deals(search_id, sources=[spec], conditional=True, raise_errors=True)
+
+
+async def refresh_due_sources(db, leases: LeaseManager, scrapers: Dict[str, object]) -> Dict[str, List[dict]]:
+    """Scrape and store every enabled source whose lease this process can take
+
+    `scrapers` maps offer kind ('flight', 'cruise') to its scraper. Returns
+    the inserted offers by kind.
+
+    When a source's pages changed, its new offers replace the ones from
+    earlier runs; when they didn't, the stored offers (all from the last
+    changed run) are revalidated. The page validators are committed only
+    after that, so a run that fails is retried in full next time.
+    """
+    search_id = str(uuid.uuid4())
+    inserted = {kind: [] for kind in scrapers}
+
+    for kind, scraper in scrapers.items():
+        collection = db[f"{kind}_offers"]
+        for spec in scraper.sources:
+            if not await leases.acquire(spec):
+                continue
+            try:
+                async with leases.keepalive(spec):
+                    offers = unpack(kind, await scrape_source(scraper, spec, search_id))
+                    fetch = scraper.fetch_stats.pop(spec.key, None)
+                    if not await leases.renew(spec):
+                        raise LeaseLost(f"lease on {spec.key} expired during the scrape")
+                    source_offers = {'source_api': f"scraped_{spec.key}"}
+                    if fetch is not None and not fetch.changed:
+                        # Pages unchanged: keep the stored offers alive instead of re-inserting them
+                        await collection.update_many(
+                            source_offers,
+                            {'$set': {'validation_timestamp': datetime.now(timezone.utc).isoformat()}}
+                        )
+                        await scraper.validators.commit(spec.key)
+                        await leases.release(spec, True, 0, fetch=fetch)
+                        continue
+                    if offers:
+                        # Stamped at insert (not at validation) so the export watermark can't pass
+                        # offers of a long scrape; insert_many adds _id, keep the dicts JSON-friendly
+                        stored_at = datetime.now(timezone.utc).isoformat()
+                        await collection.insert_many([{**o, 'created_at': stored_at} for o in offers])
+                        inserted[kind].extend(offers)
+                    if spec.method != 'simulated':
+                        # The pages changed: offers only listed on older versions are gone
+                        await collection.delete_many({**source_offers, 'search_id': {'$ne': search_id}})
+                    await scraper.validators.commit(spec.key)
+                await leases.release(spec, True, len(offers), fetch=fetch)
+                logger.info(f"Refreshed {spec.key}: {len(offers)} {kind} offers")
+            except LeaseLost as e:
+                # The new owner records the source's status; don't write anything
+                scraper.validators.discard(spec.key)
+                logger.warning(f"Skipped storing {spec.key}: {e}")
+            except Exception as e:
+                scraper.validators.discard(spec.key)
+                logger.error(f"Error refreshing {spec.key}: {e}")
+                await leases.release(spec, False, error=str(e))
+
+    return inserted
+
+
+async def cleanup_old_offers(db):
+    """Delete offers not (re)validated within the retention window
+
+    Offers of sources whose pages didn't change get their validation_timestamp
+    bumped on each refresh, so they survive without being re-inserted. Run it
+    on every pass: sources that are all unchanged insert nothing, yet older
+    offers still expire.
+    """
+    cutoff = (datetime.now(timezone.utc) - OFFER_RETENTION).isoformat()
+    deleted_flights = await db.flight_offers.delete_many({"validation_timestamp": {"$lt": cutoff}})
+    deleted_cruises = await db.cruise_offers.delete_many({"validation_timestamp": {"$lt": cutoff}})
+    logger.info(f"Cleaned up {deleted_flights.deleted_count} old flight offers and "
+                f"{deleted_cruises.deleted_count} old cruise offers")
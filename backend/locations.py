@@ -0,0 +1,75 @@
+"""Airport and cruise-port vocabulary shared by the scrapers and search helpers"""
+
+# IATA code -> (city, airport name)
+AIRPORTS = {
+    'JFK': ('New York', 'John F. Kennedy International'),
+    'LAX': ('Los Angeles', 'Los Angeles International'),
+    'LHR': ('London', 'Heathrow'),
+    'CDG': ('Paris', 'Charles de Gaulle'),
+    'DXB': ('Dubai', 'Dubai International'),
+    'NRT': ('Tokyo', 'Narita International'),
+    'SYD': ('Sydney', 'Kingsford Smith'),
+    'GRU': ('São Paulo', 'Guarulhos International'),
+    'MAD': ('Madrid', 'Adolfo Suárez Madrid-Barajas'),
+    'BCN': ('Barcelona', 'El Prat'),
+    'FRA': ('Frankfurt', 'Frankfurt am Main'),
+    'AMS': ('Amsterdam', 'Schiphol'),
+    'SIN': ('Singapore', 'Changi'),
+    'HKG': ('Hong Kong', 'Hong Kong International'),
+    'ICN': ('Seoul', 'Incheon International'),
+    'PEK': ('Beijing', 'Capital International'),
+    'ORD': ("Chicago", "O'Hare International"),
+    'ATL': ('Atlanta', 'Hartsfield-Jackson'),
+    'DFW': ('Dallas', 'Dallas/Fort Worth International'),
+    'MIA': ('Miami', 'Miami International'),
+}
+
+# Portos de embarque de cruzeiros
+PORTS = [
+    "Miami", "Fort Lauderdale", "Port Canaveral", "Barcelona", "Venice",
+    "Southampton", "Singapore", "Sydney", "Los Angeles", "Seattle",
+    "Rome", "Copenhagen", "Vancouver", "New York", "Galveston"
+]
+
+# Coordinates (latitude, longitude) for distance ranking
+AIRPORT_COORDS = {
+    'JFK': (40.6413, -73.7781),
+    'LAX': (33.9416, -118.4085),
+    'LHR': (51.4700, -0.4543),
+    'CDG': (49.0097, 2.5479),
+    'DXB': (25.2532, 55.3657),
+    'NRT': (35.7720, 140.3929),
+    'SYD': (-33.9399, 151.1753),
+    'GRU': (-23.4356, -46.4731),
+    'MAD': (40.4983, -3.5676),
+    'BCN': (41.2974, 2.0833),
+    'FRA': (50.0379, 8.5622),
+    'AMS': (52.3105, 4.7683),
+    'SIN': (1.3644, 103.9915),
+    'HKG': (22.3080, 113.9185),
+    'ICN': (37.4602, 126.4407),
+    'PEK': (40.0799, 116.6031),
+    'ORD': (41.9742, -87.9073),
+    'ATL': (33.6407, -84.4277),
+    'DFW': (32.8998, -97.0403),
+    'MIA': (25.7959, -80.2870),
+}
+
+# Cruise terminals serving each port name
+PORT_COORDS = {
+    "Miami": (25.7781, -80.1794),
+    "Fort Lauderdale": (26.0917, -80.1222),  # Port Everglades
+    "Port Canaveral": (28.4101, -80.6188),
+    "Barcelona": (41.3712, 2.1780),
+    "Venice": (45.4375, 12.3190),
+    "Southampton": (50.8998, -1.4044),
+    "Singapore": (1.2640, 103.8640),
+    "Sydney": (-33.8587, 151.2100),
+    "Los Angeles": (33.7395, -118.2770),  # San Pedro
+    "Seattle": (47.6290, -122.3840),
+    "Rome": (42.0930, 11.7900),  # Civitavecchia
+    "Copenhagen": (55.7150, 12.6050),
+    "Vancouver": (49.2888, -123.1111),
+    "New York": (40.7685, -73.9980),
+    "Galveston": (29.3100, -94.7930),
+}
@@ -0,0 +1,124 @@
+"""Event-loop lag sampler and slow-callback watchdog.
+
+An asyncio task wakes every `interval` seconds and records how late it was
+woken (the loop lag). A daemon thread watches the heartbeat that task
+leaves behind: when it goes stale for longer than `threshold`, something is
+blocking the loop, so the thread captures the loop thread's current stack
+and records it. Both sides are a few microseconds of work per tick, which
+keeps the watchdog cheap enough to leave on in production.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class LoopWatchdog:
+    """Amostrador de lag do event loop com detecção de callbacks lentos"""
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.1,
+                 window: int = 3000, max_events: int = 50, stack_depth: int = 15):
+        self.interval = interval
+        self.threshold = threshold
+        self.stack_depth = stack_depth
+        self.lag_samples: Deque[float] = deque(maxlen=window)
+        self.slow_events: Deque[dict] = deque(maxlen=max_events)
+        self.slow_callbacks = 0
+        self.max_lag = 0.0
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._sample())
+        self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._thread.start()
+        logger.info(f"Loop watchdog started (interval {self.interval * 1000:.0f} ms, "
+                    f"threshold {self.threshold * 1000:.0f} ms)")
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    async def _sample(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.lag_samples.append(lag)
+            if lag > self.max_lag:
+                self.max_lag = lag
+            self._heartbeat = time.monotonic()
+
+    def _watch(self):
+        # Only one report per stall: re-armed once the heartbeat moves again
+        reported_beat = None
+        while not self._stop.wait(self.threshold / 2):
+            beat = self._heartbeat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.threshold or beat == reported_beat:
+                continue
+            reported_beat = beat
+            self._record_stall(stalled)
+
+    def _record_stall(self, stalled: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = traceback.format_stack(frame, limit=self.stack_depth) if frame else []
+        self.slow_callbacks += 1
+        self.slow_events.append({
+            "detected_at": datetime.now(timezone.utc).isoformat(),
+            "blocked_ms": round(stalled * 1000, 1),
+            "stack": [line.rstrip() for line in stack],
+        })
+        logger.warning(
+            f"Event loop blocked for more than {stalled * 1000:.0f} ms; loop thread stack:\n"
+            + ''.join(stack)
+        )
+
+    def stats(self, events: int = 10) -> dict:
+        samples = sorted(self.lag_samples)
+        return {
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "samples": len(samples),
+            "lag_ms": {
+                "p50": round(_percentile(samples, 50) * 1000, 2),
+                "p90": round(_percentile(samples, 90) * 1000, 2),
+                "p99": round(_percentile(samples, 99) * 1000, 2),
+                "max_window": round((samples[-1] if samples else 0.0) * 1000, 2),
+                "max_since_start": round(self.max_lag * 1000, 2),
+            },
+            "slow_callbacks": self.slow_callbacks,
+            "recent_slow_callbacks": list(self.slow_events)[-events:] if events > 0 else [],
+        }
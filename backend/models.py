@@ -0,0 +1,90 @@
+"""Pydantic models shared by the API, the scrapers and the processing pool"""
+from pydantic import BaseModel, Field, ConfigDict, field_validator
+from typing import Optional
+import uuid
+from datetime import datetime, timezone
+
+from autocomplete import airport_code
+
+
+# Models
+class FlightOffer(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    source_api: str
+    search_id: str
+    departure_airport: str
+    arrival_airport: str
+    departure_date: str
+    return_date: Optional[str] = None
+    airline: str
+    flight_number: str
+    original_price: float
+    current_price: float
+    discount_percentage: float
+    stops: int
+    duration_minutes: int
+    booking_link: str
+    is_authentic: bool
+    validation_timestamp: str
+    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+class CruiseOffer(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    source_api: str
+    search_id: str
+    cruise_line: str
+    ship_name: str
+    departure_port: str
+    departure_date: str
+    duration_nights: int
+    original_price: float
+    current_price: float
+    discount_percentage: float
+    cabin_type: str
+    booking_link: str
+    is_authentic: bool
+    validation_timestamp: str
+    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+class SearchRequest(BaseModel):
+    departure: Optional[str] = None
+    arrival: Optional[str] = None
+    departure_date: Optional[str] = None
+    return_date: Optional[str] = None
+    passengers: int = 1
+    min_discount: float = 50.0
+    offer_type: str = "all"  # all, flight, cruise
+
+    @field_validator("departure", "arrival")
+    @classmethod
+    def resolve_airport(cls, value: Optional[str]) -> Optional[str]:
+        # Scrapers take the value as-is, so only a 3-letter IATA code gets through
+        if value is None or not value.strip():
+            return None
+        code = airport_code(value)
+        if code is None:
+            raise ValueError(f"unknown airport {value!r}, expected an IATA code or a known city")
+        return code
+
+class AlertSubscriptionCreate(BaseModel):
+    contact: str  # e-mail address or webhook URL
+    offer_type: str = "all"  # all, flight, cruise
+    departure: Optional[str] = None  # airport code or cruise port
+    arrival: Optional[str] = None  # airport code (flights only)
+    min_discount: float = Field(80.0, ge=0, le=100)
+    max_price: Optional[float] = Field(None, gt=0)
+
+class AlertSubscription(AlertSubscriptionCreate):
+    model_config = ConfigDict(extra="ignore")
+    
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    active: bool = True
+    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    updated_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+class AlertSubscriptionCreated(AlertSubscription):
+    manage_token: str  # shown once; required to list or delete the subscription
@@ -0,0 +1,14 @@
+"""HTML parsers referenced by the source registry.
+
+This module is imported lazily by `SourceRegistry.parser_for`, only once an
+enabled source needs it. Parsers must stay module-level functions so they
+can be shipped to the parse process pool.
+"""
+from typing import Dict, List
+
+from parsing import extract_records
+
+
+def parse_fare_cards(html: str, spec) -> List[Dict[str, str]]:
+    """Extract one raw dict per fare card using the source's CSS selectors"""
+    return extract_records(html, spec.selectors, spec.extra.get('html_backend'))
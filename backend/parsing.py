@@ -0,0 +1,237 @@
+"""HTML parsing layer for scraped fare pages.
+
+Backends are tried in order of speed: selectolax (lexbor), lxml with
+precompiled XPath selectors and BeautifulSoup as the fallback. All of them
+are imported lazily. A page the chosen backend fails on is parsed again
+with BeautifulSoup, the most lenient of the three. Large pages are parsed in the shared CPU pool (see
+processing.py) so the event loop keeps serving requests while a refresh runs.
+
+Benchmark against recorded pages (see SCRAPER_RECORD_FIXTURES) or the
+synthetic ones in fixtures/ (see fixtures/generate.py):
+
+    python bench.py parsing [fixtures_dir] [--repeat N]
+"""
+import asyncio
+import logging
+import os
+import re
+import time
+from dataclasses import replace
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import processing
+
+logger = logging.getLogger(__name__)
+
+BACKEND_ORDER = ('selectolax', 'lxml', 'bs4')
+FIXTURES_DIR = Path(__file__).parent / 'fixtures'
+
+# Pages at or above this size are parsed off the event loop
+OFFLOAD_MIN_BYTES = int(os.environ.get('PARSE_OFFLOAD_MIN_BYTES', 256 * 1024))
+
+Selectors = Tuple[Tuple[str, str], ...]
+
+
+def _clean(text: Optional[str]) -> str:
+    return ' '.join((text or '').split())
+
+
+def _backend_available(name: str) -> bool:
+    try:
+        if name == 'selectolax':
+            import selectolax.lexbor  # noqa: F401
+        elif name == 'lxml':
+            import lxml.html  # noqa: F401
+            import cssselect  # noqa: F401
+        elif name == 'bs4':
+            import bs4  # noqa: F401
+        else:
+            return False
+    except ImportError:
+        return False
+    return True
+
+
+@lru_cache(maxsize=None)
+def available_backends() -> Tuple[str, ...]:
+    return tuple(name for name in BACKEND_ORDER if _backend_available(name))
+
+
+def default_backend() -> str:
+    """Backend from HTML_PARSER, else the fastest installed one"""
+    backends = available_backends()
+    if not backends:
+        raise RuntimeError("No HTML parser installed (selectolax, lxml or beautifulsoup4)")
+    wanted = os.environ.get('HTML_PARSER')
+    if wanted:
+        if wanted not in backends:
+            raise RuntimeError(f"HTML_PARSER={wanted} is not installed")
+        return wanted
+    return backends[0]
+
+
+# Precompiled extractors (cached per selector set and backend)
+@lru_cache(maxsize=128)
+def _compile(selectors: Selectors, backend: str) -> Callable[[str], List[Dict[str, str]]]:
+    fields = dict(selectors)
+    card_selector = fields.pop('card')
+
+    if backend == 'selectolax':
+        from selectolax.lexbor import LexborHTMLParser
+
+        def extract(html: str) -> List[Dict[str, str]]:
+            results = []
+            for card in LexborHTMLParser(html).css(card_selector):
+                raw = {}
+                for name, selector in fields.items():
+                    node = card.css_first(selector)
+                    if node is None:
+                        continue
+                    if name == 'link':
+                        raw[name] = node.attributes.get('href') or ''
+                    else:
+                        raw[name] = _clean(node.text(separator=' '))
+                if raw:
+                    results.append(raw)
+            return results
+
+        return extract
+
+    if backend == 'lxml':
+        import lxml.html
+        from cssselect import GenericTranslator
+        from lxml import etree
+
+        translator = GenericTranslator()
+        card_xpath = etree.XPath(translator.css_to_xpath(card_selector))
+        field_xpaths = {
+            name: etree.XPath(translator.css_to_xpath(selector, prefix='descendant::'))
+            for name, selector in fields.items()
+        }
+
+        def extract(html: str) -> List[Dict[str, str]]:
+            results = []
+            if not html.strip():
+                return results
+            root = lxml.html.fromstring(html)
+            for card in card_xpath(root):
+                raw = {}
+                for name, xpath in field_xpaths.items():
+                    nodes = xpath(card)
+                    if not nodes:
+                        continue
+                    if name == 'link':
+                        raw[name] = nodes[0].get('href') or ''
+                    else:
+                        raw[name] = _clean(nodes[0].text_content())
+                if raw:
+                    results.append(raw)
+            return results
+
+        return extract
+
+    if backend == 'bs4':
+        from bs4 import BeautifulSoup
+
+        parser_name = 'lxml' if _backend_available('lxml') else 'html.parser'
+
+        def extract(html: str) -> List[Dict[str, str]]:
+            results = []
+            for card in BeautifulSoup(html, parser_name).select(card_selector):
+                raw = {}
+                for name, selector in fields.items():
+                    node = card.select_one(selector)
+                    if node is None:
+                        continue
+                    if name == 'link':
+                        raw[name] = node.get('href', '')
+                    else:
+                        raw[name] = _clean(node.get_text(' '))
+                if raw:
+                    results.append(raw)
+            return results
+
+        return extract
+
+    raise ValueError(f"Unknown HTML backend: {backend}")
+
+
+def extract_records(html: str, selectors: Dict[str, str],
+                    backend: Optional[str] = None) -> List[Dict[str, str]]:
+    """Return one raw dict per `card` match, with each field's text (or href for `link`)"""
+    extractor = _compile(tuple(selectors.items()), backend or default_backend())
+    return extractor(html)
+
+
+async def _run_parser(parser: Callable, html: str, spec) -> List[dict]:
+    if len(html) < OFFLOAD_MIN_BYTES or processing.POOL_WORKERS <= 0:
+        return parser(html, spec)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(processing.get_pool(), parser, html, spec)
+
+
+async def parse_page(parser: Callable, html: str, spec) -> List[dict]:
+    """Run a source parser, in the CPU pool when the page is large
+
+    If it fails with a faster backend, the page is parsed again with bs4
+    (passed to the parser as the spec's `html_backend`).
+    """
+    try:
+        return await _run_parser(parser, html, spec)
+    except Exception as e:
+        backend = spec.extra.get('html_backend') or os.environ.get('HTML_PARSER') or \
+            next(iter(available_backends()), None)
+        if backend == 'bs4' or 'bs4' not in available_backends():
+            raise
+        logger.warning(f"{spec.key}: {backend} failed on a page ({e}), retrying with bs4")
+        return await _run_parser(parser, html, replace(spec, extra={**spec.extra, 'html_backend': 'bs4'}))
+
+
+def record_fixture(source_key: str, url: str, html: str):
+    """Save a fetched page for benchmarks when SCRAPER_RECORD_FIXTURES is set"""
+    target = os.environ.get('SCRAPER_RECORD_FIXTURES')
+    if not target:
+        return
+    directory = Path(target) / source_key
+    directory.mkdir(parents=True, exist_ok=True)
+    name = re.sub(r'[^A-Za-z0-9]+', '_', url).strip('_')[:120] or 'page'
+    (directory / f"{name}.html").write_text(html, encoding='utf-8')
+
+
+def bench(fixtures_dir: Path, repeat: int = 20):
+    """Time every installed backend against the recorded pages of each source"""
+    from sources import build_default_registry
+
+    if not fixtures_dir.is_dir():
+        print(f"No fixtures in {fixtures_dir}; record some with SCRAPER_RECORD_FIXTURES=<dir>")
+        return
+
+    registry = build_default_registry()
+    backends = available_backends()
+    print(f"Backends: {', '.join(backends)}  repeat={repeat}")
+
+    for source_dir in sorted(p for p in fixtures_dir.iterdir() if p.is_dir()):
+        try:
+            spec = registry.get(source_dir.name)
+        except KeyError:
+            print(f"{source_dir.name}: not a registered source, skipped")
+            continue
+        if not spec.selectors:
+            print(f"{spec.key}: no selectors, skipped")
+            continue
+
+        pages = [p.read_text(encoding='utf-8') for p in sorted(source_dir.glob('*.html'))]
+        total_bytes = sum(len(p) for p in pages)
+        print(f"\n{spec.key}: {len(pages)} pages, {total_bytes / 1024:.0f} KiB")
+
+        for backend in backends:
+            extractor = _compile(tuple(spec.selectors.items()), backend)
+            records = sum(len(extractor(page)) for page in pages)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for page in pages:
+                    extractor(page)
+            elapsed = (time.perf_counter() - start) / (repeat * max(len(pages), 1))
+            print(f"  {backend:<11} {elapsed * 1000:8.2f} ms/page  {records} records")
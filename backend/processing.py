@@ -0,0 +1,251 @@
+"""CPU-bound offer processing stages.
+
+Normalizing parser records, validating offers through the Pydantic models
+and filtering/sorting search results all run in a `ProcessPoolExecutor` once
+a batch is large enough, so a heavy refresh doesn't stall `/api/offers` or
+`/api/health`. Batches cross the process boundary as tuples of plain values
+in model field order (see `pack`/`unpack`), never as model instances.
+
+Measure event-loop lag with the pool on and off:
+
+    python bench.py processing [--offers N]
+"""
+import asyncio
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urljoin
+
+from pydantic import ValidationError
+
+from models import FlightOffer, CruiseOffer
+
+logger = logging.getLogger(__name__)
+
+MODELS = {'flight': FlightOffer, 'cruise': CruiseOffer}
+FIELDS: Dict[str, Tuple[str, ...]] = {kind: tuple(model.model_fields) for kind, model in MODELS.items()}
+DISCOUNT_INDEX = {kind: fields.index('discount_percentage') for kind, fields in FIELDS.items()}
+
+
+def _base_type(annotation) -> type:
+    """Optional[X] -> X"""
+    args = [a for a in getattr(annotation, '__args__', ()) if a is not type(None)]
+    return args[0] if args else annotation
+
+
+FIELD_TYPES: Dict[str, Tuple[type, ...]] = {
+    kind: tuple(_base_type(info.annotation) for info in model.model_fields.values())
+    for kind, model in MODELS.items()
+}
+
+# CPU_POOL_WORKERS=0 keeps every stage on the event loop
+POOL_WORKERS = int(os.environ.get('CPU_POOL_WORKERS', min(4, os.cpu_count() or 1)))
+# Smaller batches aren't worth the pickling round trip
+MIN_BATCH = int(os.environ.get('CPU_POOL_MIN_BATCH', 200))
+
+Row = tuple
+
+
+def pack(kind: str, records: Sequence[dict]) -> List[Row]:
+    """Dicts -> compact rows in model field order (missing fields become None)"""
+    fields = FIELDS[kind]
+    return [tuple(record.get(f) for f in fields) for record in records]
+
+
+def unpack(kind: str, rows: Sequence[Row]) -> List[dict]:
+    fields = FIELDS[kind]
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def _to_float(value) -> float:
+    """Parse a scraped price/number such as '$1,234.50'"""
+    cleaned = re.sub(r'[^0-9.]', '', str(value or ''))
+    try:
+        return float(cleaned) if cleaned else 0.0
+    except ValueError:
+        return 0.0
+
+
+def _to_int(value) -> int:
+    match = re.search(r'\d+', str(value or ''))
+    return int(match.group()) if match else 0
+
+
+def _validate(kind: str, record: dict) -> Optional[Row]:
+    model = MODELS[kind]
+    try:
+        offer = model(**{k: v for k, v in record.items() if v is not None})
+    except ValidationError as e:
+        logger.warning(f"Dropping invalid {kind} offer: {e.error_count()} errors")
+        return None
+    return tuple(getattr(offer, f) for f in FIELDS[kind])
+
+
+# Stages (module-level so they can run in the pool)
+def validate_rows(kind: str, rows: Sequence[Row]) -> List[Row]:
+    """Validate packed rows through the Pydantic model, dropping invalid ones"""
+    fields = FIELDS[kind]
+    validated = (_validate(kind, dict(zip(fields, row))) for row in rows)
+    return [row for row in validated if row is not None]
+
+
+def normalize_records(kind: str, source: Tuple[str, str, str], search_id: str,
+                      records: Sequence[dict]) -> List[Row]:
+    """Turn parser records of one source into validated offer rows
+
+    `source` is (key, name, base_url).
+    """
+    key, name, base_url = source
+    now = datetime.now(timezone.utc).isoformat()
+    rows = []
+
+    for raw in records:
+        original_price = _to_float(raw.get('original_price'))
+        current_price = _to_float(raw.get('current_price'))
+        if not original_price or not current_price or current_price >= original_price:
+            continue
+
+        record = {
+            'source_api': f"scraped_{key}",
+            'search_id': search_id,
+            'departure_date': raw.get('departure_date', ''),
+            'original_price': round(original_price, 2),
+            'current_price': round(current_price, 2),
+            'discount_percentage': round((1 - current_price / original_price) * 100, 1),
+            'booking_link': urljoin(base_url, raw.get('link', '')),
+            'is_authentic': True,
+            'validation_timestamp': now,
+        }
+        if kind == 'flight':
+            record.update(
+                departure_airport=raw.get('departure', '').upper(),
+                arrival_airport=raw.get('arrival', '').upper(),
+                airline=raw.get('airline') or name,
+                flight_number=raw.get('flight_number', ''),
+                stops=_to_int(raw.get('stops')),
+                duration_minutes=_to_int(raw.get('duration')),
+            )
+        else:
+            record.update(
+                cruise_line=raw.get('cruise_line') or name,
+                ship_name=raw.get('ship_name', 'Cruise Ship'),
+                departure_port=raw.get('departure_port', ''),
+                duration_nights=_to_int(raw.get('duration_nights')),
+                cabin_type=raw.get('cabin_type', 'Interior'),
+            )
+
+        row = _validate(kind, record)
+        if row is not None:
+            rows.append(row)
+
+    return rows
+
+
+def filter_sort(kind: str, rows: Sequence[Row], min_discount: float) -> List[Row]:
+    """Keep rows at or above `min_discount`, best discount first"""
+    index = DISCOUNT_INDEX[kind]
+    kept = [row for row in rows if row[index] >= min_discount]
+    kept.sort(key=lambda row: row[index], reverse=True)
+    return kept
+
+
+# Pool
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=max(POOL_WORKERS, 1))
+        logger.info(f"Started CPU pool with {max(POOL_WORKERS, 1)} workers")
+    return _pool
+
+
+def shutdown_pool():
+    """Drop queued work and wait for the workers to exit (called at process exit)"""
+    global _pool
+    if _pool is not None:
+        # Returning before the workers are gone leaves the executor's wakeup
+        # pipe to be closed by the interpreter while its manager thread still
+        # uses it (OSError: Bad file descriptor at exit)
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+async def run_stage(func: Callable, *args, size: int):
+    """Run a stage in the pool when the batch has at least MIN_BATCH items"""
+    if POOL_WORKERS <= 0 or size < MIN_BATCH:
+        return func(*args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_pool(), func, *args)
+
+
+# Lag benchmark
+async def _sample_lag(interval: float, samples: List[float], stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+async def _bench_once(rows: List[Row], use_pool: bool) -> Tuple[float, List[float]]:
+    global POOL_WORKERS
+    saved = POOL_WORKERS
+    POOL_WORKERS = saved if use_pool else 0
+    samples: List[float] = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(_sample_lag(0.005, samples, stop))
+    await asyncio.sleep(0.01)
+    try:
+        start = time.perf_counter()
+        chunk = max(MIN_BATCH, 1000)
+        for i in range(0, len(rows), chunk):
+            batch = rows[i:i + chunk]
+            await run_stage(validate_rows, 'flight', batch, size=len(batch))
+            # Give other tasks a turn between batches, as a real refresh would
+            await asyncio.sleep(0)
+        elapsed = time.perf_counter() - start
+    finally:
+        stop.set()
+        await sampler
+        POOL_WORKERS = saved
+    return elapsed, samples
+
+
+def _synthetic_rows(count: int) -> List[Row]:
+    now = datetime.now(timezone.utc).isoformat()
+    records = [{
+        'source_api': 'scraped_bench', 'search_id': 'bench', 'departure_airport': 'JFK',
+        'arrival_airport': 'LAX', 'departure_date': now, 'airline': 'Bench Air',
+        'flight_number': f"BA{i % 900 + 100}", 'original_price': 1000.0 + i % 500,
+        'current_price': 250.0, 'discount_percentage': 75.0, 'stops': i % 3,
+        'duration_minutes': 300, 'booking_link': f"https://example.com/{i}",
+        'is_authentic': True, 'validation_timestamp': now,
+    } for i in range(count)]
+    return pack('flight', records)
+
+
+def bench(count: int):
+    rows = _synthetic_rows(count)
+    print(f"Validating {count} flight offers, pool workers={POOL_WORKERS}")
+
+    async def main():
+        # Warm the pool so worker start-up isn't counted
+        await asyncio.get_running_loop().run_in_executor(get_pool(), validate_rows, 'flight', rows[:1])
+        for label, use_pool in (("inline", False), ("pool", True)):
+            elapsed, samples = await _bench_once(rows, use_pool)
+            samples.sort()
+            p99 = samples[int(len(samples) * 0.99) - 1] if samples else 0.0
+            worst = samples[-1] if samples else 0.0
+            print(f"  {label:<7} total {elapsed * 1000:8.1f} ms  "
+                  f"loop lag p99 {p99 * 1000:7.1f} ms  max {worst * 1000:7.1f} ms")
+
+    try:
+        asyncio.run(main())
+    finally:
+        shutdown_pool()
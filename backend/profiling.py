@@ -0,0 +1,249 @@
+"""On-demand and sampled request profiling (pyinstrument).
+
+Three ways to get a profile, all gated by `ADMIN_TOKEN`:
+
+- On demand: send `X-Profile: html|speedscope` (or `?profile=...`) together
+  with `X-Admin-Token` and the response is replaced by the profile report of
+  that request (the original status goes in `X-Profiled-Status`).
+- Sampled: `PROFILE_SAMPLE_RATE` of ordinary /api requests are profiled at a
+  coarse interval and the `PROFILE_KEEP_SLOWEST` slowest are kept in memory
+  (GET /api/diagnostics/profiles).
+- One shot: POST /api/diagnostics/profiles/refresh profiles the next
+  scheduled `refresh_offers` run.
+
+pyinstrument is imported on the first profiled request (or profiling
+endpoint call), never at startup; without it profiling requests are answered
+normally (or with 501 for explicit ones) and the rest of the app is unaffected.
+"""
+import asyncio
+import heapq
+import hmac
+import itertools
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import List, Optional
+from urllib.parse import parse_qs
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'html': 'text/html; charset=utf-8',
+    'speedscope': 'application/json',
+}
+
+
+_NOT_LOADED = object()
+
+
+def _load_pyinstrument():
+    try:
+        import pyinstrument
+        return pyinstrument
+    except ImportError:
+        return None
+
+
+class ProfileRecord:
+    def __init__(self, kind: str, name: str, duration: float, session, status: Optional[int] = None):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.name = name
+        self.duration = duration
+        self.status = status
+        self.session = session
+        self.timestamp = datetime.now(timezone.utc).isoformat()
+
+    def as_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "name": self.name,
+            "status": self.status,
+            "duration_ms": round(self.duration * 1000, 1),
+            "timestamp": self.timestamp,
+        }
+
+
+class RequestProfiler:
+    """Perfis sob demanda, amostrados (N mais lentos) e do próximo refresh"""
+
+    def __init__(self, admin_token: Optional[str] = None, sample_rate: float = 0.01,
+                 keep_slowest: int = 20, interval: float = 0.001, sample_interval: float = 0.005):
+        self.admin_token = admin_token
+        self.sample_rate = sample_rate
+        self.keep_slowest = keep_slowest
+        self.interval = interval
+        self.sample_interval = sample_interval
+        # Min-heap on duration: the root is the fastest of the kept profiles
+        self._slowest: List[tuple] = []
+        self._seq = itertools.count()
+        self.last_refresh: Optional[ProfileRecord] = None
+        self._refresh_armed = False
+        self._pyinstrument = _NOT_LOADED
+        self.sampled = 0
+
+    @classmethod
+    def from_env(cls) -> 'RequestProfiler':
+        return cls(
+            admin_token=os.environ.get('ADMIN_TOKEN') or None,
+            sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0.01)),
+            keep_slowest=int(os.environ.get('PROFILE_KEEP_SLOWEST', 20)),
+            sample_interval=float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', 5)) / 1000,
+        )
+
+    @property
+    def available(self) -> bool:
+        # Checked only once profiling is actually wanted, which imports pyinstrument
+        if self._pyinstrument is _NOT_LOADED:
+            self._pyinstrument = _load_pyinstrument()
+        return self._pyinstrument is not None
+
+    def is_admin(self, token: Optional[str]) -> bool:
+        if not self.admin_token or not token:
+            return False
+        return hmac.compare_digest(token.encode(), self.admin_token.encode())
+
+    def new_profiler(self, interval: float):
+        return self._pyinstrument.Profiler(interval=interval, async_mode='enabled')
+
+    # Ring buffer of the slowest profiles
+    def keep(self, record: ProfileRecord):
+        item = (record.duration, next(self._seq), record)
+        if len(self._slowest) < self.keep_slowest:
+            heapq.heappush(self._slowest, item)
+        elif record.duration > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, item)
+
+    def profiles(self) -> List[dict]:
+        records = [record for _, _, record in sorted(self._slowest, reverse=True)]
+        if self.last_refresh is not None:
+            records.insert(0, self.last_refresh)
+        return [record.as_dict() for record in records]
+
+    def get(self, profile_id: str) -> Optional[ProfileRecord]:
+        if self.last_refresh is not None and self.last_refresh.id == profile_id:
+            return self.last_refresh
+        for _, _, record in self._slowest:
+            if record.id == profile_id:
+                return record
+        return None
+
+    def render(self, record: ProfileRecord, fmt: str) -> str:
+        from pyinstrument.renderers import HTMLRenderer, SpeedscopeRenderer
+
+        renderer = HTMLRenderer() if fmt == 'html' else SpeedscopeRenderer()
+        return renderer.render(record.session)
+
+    # One-shot profile of the next refresh_offers run
+    def arm_refresh(self):
+        self._refresh_armed = True
+
+    @property
+    def refresh_armed(self) -> bool:
+        return self._refresh_armed
+
+    @asynccontextmanager
+    async def refresh_profile(self, name: str = 'refresh_offers'):
+        if not self._refresh_armed or not self.available:
+            yield
+            return
+        self._refresh_armed = False
+        profiler = self.new_profiler(self.interval)
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            yield
+        finally:
+            session = profiler.stop()
+            self.last_refresh = ProfileRecord('refresh', name, time.perf_counter() - started, session)
+            logger.info(f"Profiled {name}: {self.last_refresh.duration:.2f}s (profile {self.last_refresh.id})")
+
+    def stats(self) -> dict:
+        return {
+            "available": self.available,
+            "enabled": self.admin_token is not None,
+            "sample_rate": self.sample_rate,
+            "sampled_requests": self.sampled,
+            "kept_profiles": len(self._slowest),
+            "refresh_armed": self._refresh_armed,
+        }
+
+
+class ProfilingMiddleware:
+    """ASGI middleware: on-demand reports for admin requests and background sampling"""
+
+    def __init__(self, app, profiler: RequestProfiler, prefix: str = '/api'):
+        self.app = app
+        self.profiler = profiler
+        self.prefix = prefix
+
+    def _requested_format(self, scope) -> Optional[str]:
+        headers = {k.decode('latin-1'): v.decode('latin-1') for k, v in scope['headers']
+                   if k in (b'x-profile', b'x-admin-token')}
+        fmt = headers.get('x-profile')
+        if fmt is None:
+            fmt = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('profile', [None])[0]
+        if fmt is None or not self.profiler.is_admin(headers.get('x-admin-token')):
+            return None
+        return fmt if fmt in FORMATS else 'html'
+
+    async def _send_body(self, send, status: int, content_type: str, body: bytes, extra_headers=()):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', content_type.encode()),
+                        (b'content-length', str(len(body)).encode()), *extra_headers],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not scope['path'].startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+
+        fmt = self._requested_format(scope)
+        sampled = fmt is None and self.profiler.admin_token is not None \
+            and random.random() < self.profiler.sample_rate and self.profiler.available
+        if fmt is None and not sampled:
+            await self.app(scope, receive, send)
+            return
+        if not self.profiler.available:
+            body = json.dumps({"detail": "Profiling requires pyinstrument"}).encode()
+            await self._send_body(send, 501, 'application/json', body)
+            return
+
+        response = {'status': None}
+
+        async def capture(message):
+            # On-demand profiles replace the response; keep only its status
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+            if sampled:
+                await send(message)
+
+        name = f"{scope['method']} {scope['path']}"
+        profiler = self.profiler.new_profiler(self.profiler.interval if fmt else self.profiler.sample_interval)
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            session = profiler.stop()
+            record = ProfileRecord('request', name, time.perf_counter() - started, session, response['status'])
+
+        if sampled:
+            self.profiler.sampled += 1
+            self.profiler.keep(record)
+            return
+
+        report = await asyncio.to_thread(self.profiler.render, record, fmt)
+        await self._send_body(send, 200, FORMATS[fmt], report.encode(), [
+            (b'x-profiled-status', str(record.status).encode()),
+            (b'x-profiled-duration-ms', str(round(record.duration * 1000, 1)).encode()),
+        ])
@@ -0,0 +1,340 @@
+"""Flight and cruise scrapers driven by the source registry"""
+import asyncio
+import logging
+import random
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from fake_useragent import UserAgent
+
+from browser_pool import BrowserPool
+from fetch_cache import FetchStats, ValidatorStore, fetch_source_pages
+from locations import AIRPORTS, PORTS
+from parsing import parse_page, record_fixture
+from processing import normalize_records, pack, run_stage, validate_rows
+from sources import SourceRegistry, SourceSpec
+
+logger = logging.getLogger(__name__)
+
+# User agent generator
+ua = UserAgent()
+
+
+class BaseScraper:
+    """Base comum: busca HTML das fontes registradas e aplica o parser de cada uma"""
+
+    kind = None
+
+    def __init__(self, registry: SourceRegistry, validators: Optional[ValidatorStore] = None,
+                 browser_pool: Optional[BrowserPool] = None):
+        self.registry = registry
+        self.validators = validators or ValidatorStore()
+        self.browser_pool = browser_pool
+        self.headers = {}
+        # Conditional-fetch counters of the last refresh, per source key
+        self.fetch_stats: Dict[str, FetchStats] = {}
+
+    @property
+    def sources(self) -> List[SourceSpec]:
+        return self.registry.enabled(self.kind)
+
+    async def _download_pages(self, spec: SourceSpec, conditional: bool) -> Optional[List[Tuple[str, str]]]:
+        """(url, html) for every endpoint; None when conditional and nothing changed"""
+        async with httpx.AsyncClient(headers=self.headers, timeout=20, follow_redirects=True) as http:
+            if conditional:
+                stats = self.fetch_stats[spec.key] = FetchStats()
+                pages = await fetch_source_pages(http, spec, self.validators, stats)
+                if pages is None:
+                    logger.info(f"{spec.name} unchanged since last refresh, "
+                                f"{stats.bytes_saved} bytes saved")
+                return pages
+
+            pages = []
+            for url in spec.endpoints:
+                response = await http.get(url)
+                response.raise_for_status()
+                pages.append((url, response.text))
+                # Rate limiting por fonte
+                await asyncio.sleep(spec.rate_limit)
+            return pages
+
+    async def _render_pages(self, spec: SourceSpec) -> List[Tuple[str, str]]:
+        """Render every endpoint in a pooled browser context"""
+        if self.browser_pool is None:
+            raise RuntimeError(f"Source '{spec.key}' needs a browser pool")
+        pages = []
+        for url in spec.endpoints:
+            pages.append((url, await self.browser_pool.render(url, wait_for=spec.selectors.get('card'))))
+            # Rate limiting por fonte
+            await asyncio.sleep(spec.rate_limit)
+        return pages
+
+    async def _fetch_and_parse(self, spec: SourceSpec, conditional: bool = False) -> Optional[List[dict]]:
+        """Download (or render) every endpoint of a source and return the parser's raw records
+
+        With `conditional`, returns None when no downloaded page changed since
+        the last refresh (nothing is parsed).
+        """
+        parser = self.registry.parser_for(spec)
+        if spec.method == 'browser':
+            pages = await self._render_pages(spec)
+        else:
+            pages = await self._download_pages(spec, conditional)
+            if pages is None:
+                return None
+
+        records = []
+        for url, html in pages:
+            record_fixture(spec.key, url, html)
+            records.extend(await parse_page(parser, html, spec))
+        return records
+
+    async def _process(self, search_id: str, simulated: List[dict],
+                       scraped: List[Tuple[SourceSpec, List[dict]]]) -> List[tuple]:
+        """Validate simulated offers and normalize parsed records, in the CPU pool for big batches"""
+        rows = []
+        if simulated:
+            rows.extend(await run_stage(
+                validate_rows, self.kind, pack(self.kind, simulated), size=len(simulated)
+            ))
+        for spec, records in scraped:
+            if records:
+                rows.extend(await run_stage(
+                    normalize_records, self.kind, (spec.key, spec.name, spec.base_url),
+                    search_id, records, size=len(records)
+                ))
+        return rows
+
+
+class FlightScraper(BaseScraper):
+    """Scraper para sites de companhias aéreas"""
+
+    kind = 'flight'
+
+    def __init__(self, registry: SourceRegistry, validators: Optional[ValidatorStore] = None,
+                 browser_pool: Optional[BrowserPool] = None):
+        super().__init__(registry, validators, browser_pool)
+        self.headers = {
+            'User-Agent': ua.random,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.5',
+            'Accept-Encoding': 'gzip, deflate, br',
+            'Connection': 'keep-alive',
+            'Upgrade-Insecure-Requests': '1'
+        }
+
+    @property
+    def airlines(self) -> List[dict]:
+        return [s.as_dict() for s in self.sources]
+
+    async def scrape_flight_deals(self, search_id: str, departure: str = None, arrival: str = None,
+                                  sources: Optional[List[SourceSpec]] = None,
+                                  conditional: bool = False, raise_errors: bool = False) -> List[tuple]:
+        """Scrape flight deals from multiple sources, as packed rows (see processing.pack)
+
+        Errors are logged and the failing source skipped, unless `raise_errors`
+        (per-source refresh jobs, which record the failure on the lease).
+        """
+        offers = []
+        scraped = []
+        
+        try:
+            # Simular scraping de sites reais
+            # Em produção, isso faria requests reais aos sites
+            logger.info(f"Scraping flight deals for {departure or 'ANY'} -> {arrival or 'ANY'}")
+            
+            for spec in (self.sources if sources is None else sources):
+                if spec.method != 'simulated':
+                    try:
+                        records = await self._fetch_and_parse(spec, conditional)
+                        if records is not None:
+                            scraped.append((spec, records))
+                    except Exception as e:
+                        if raise_errors:
+                            raise
+                        logger.warning(f"Error scraping {spec.name}: {e}")
+                    continue
+
+                # Simular múltiplas rotas por companhia
+                airline_info = spec.as_dict()
+                num_routes = random.randint(1, 3)
+                
+                for _ in range(num_routes):
+                    try:
+                        offer = await self._simulate_flight_scraping(
+                            search_id,
+                            airline_info,
+                            departure,
+                            arrival
+                        )
+                        if offer:
+                            offers.append(offer)
+                    except Exception as e:
+                        logger.warning(f"Error scraping {airline_info['name']}: {e}")
+                        continue
+                    
+                    # Rate limiting
+                    await asyncio.sleep(spec.rate_limit)
+            
+            offers = await self._process(search_id, offers, scraped)
+            logger.info(f"Scraped {len(offers)} flight offers")
+            return offers
+            
+        except Exception as e:
+            if raise_errors:
+                raise
+            logger.error(f"Flight scraping error: {e}")
+            return []
+    
+    async def _simulate_flight_scraping(self, search_id: str, airline_info: dict, 
+                                       departure: str = None, arrival: str = None) -> Optional[dict]:
+        """Simula scraping de um voo específico"""
+        
+        airports = list(AIRPORTS)
+        
+        dep = departure or random.choice(airports)
+        arr = arrival or random.choice([a for a in airports if a != dep])
+        
+        # Simular preços reais de mercado
+        base_price = random.uniform(300, 3000)
+        discount = random.uniform(50, 92)  # 50-92% de desconto
+        current_price = base_price * (1 - discount / 100)
+        
+        # Simular scraping de detalhes
+        stops = random.randint(0, 2)
+        duration = random.randint(180, 960)
+        
+        offer = dict(
+            source_api=f"scraped_{airline_info['name'].lower().replace(' ', '_')}",
+            search_id=search_id,
+            departure_airport=dep,
+            arrival_airport=arr,
+            departure_date=(datetime.now(timezone.utc) + timedelta(days=random.randint(7, 120))).isoformat(),
+            airline=airline_info['name'],
+            flight_number=f"{airline_info['code']}{random.randint(100, 999)}",
+            original_price=round(base_price, 2),
+            current_price=round(current_price, 2),
+            discount_percentage=round(discount, 1),
+            stops=stops,
+            duration_minutes=duration,
+            booking_link=f"{airline_info['url']}/book?flight={uuid.uuid4()}",
+            is_authentic=True,
+            validation_timestamp=datetime.now(timezone.utc).isoformat()
+        )
+        
+        return offer
+
+
+class CruiseScraper(BaseScraper):
+    """Scraper para sites de empresas de cruzeiros"""
+
+    kind = 'cruise'
+
+    def __init__(self, registry: SourceRegistry, validators: Optional[ValidatorStore] = None,
+                 browser_pool: Optional[BrowserPool] = None):
+        super().__init__(registry, validators, browser_pool)
+        self.headers = {
+            'User-Agent': ua.random,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.5',
+            'Connection': 'keep-alive',
+        }
+        
+        self.ships = {
+            'Royal Caribbean': ['Oasis of the Seas', 'Symphony', 'Harmony', 'Wonder of the Seas'],
+            'Carnival Cruise Line': ['Carnival Vista', 'Carnival Horizon', 'Mardi Gras'],
+            'Norwegian Cruise Line': ['Norwegian Encore', 'Norwegian Bliss', 'Norwegian Joy'],
+            'MSC Cruises': ['MSC Meraviglia', 'MSC Bellissima', 'MSC Grandiosa'],
+            'Princess Cruises': ['Sky Princess', 'Enchanted Princess', 'Discovery Princess'],
+        }
+        
+        self.ports = PORTS
+        
+        self.cabin_types = ["Interior", "Ocean View", "Balcony", "Suite", "Mini Suite"]
+
+    @property
+    def cruise_lines(self) -> List[dict]:
+        return [s.as_dict() for s in self.sources]
+    
+    async def scrape_cruise_deals(self, search_id: str,
+                                  sources: Optional[List[SourceSpec]] = None,
+                                  conditional: bool = False, raise_errors: bool = False) -> List[tuple]:
+        """Scrape cruise deals from multiple cruise lines, as packed rows (see processing.pack)
+
+        Error handling as in `FlightScraper.scrape_flight_deals`.
+        """
+        offers = []
+        scraped = []
+        
+        try:
+            logger.info("Scraping cruise deals from major cruise lines")
+            
+            for spec in (self.sources if sources is None else sources):
+                cruise_line = spec.as_dict()
+                try:
+                    if spec.method != 'simulated':
+                        records = await self._fetch_and_parse(spec, conditional)
+                        if records is not None:
+                            scraped.append((spec, records))
+                        continue
+
+                    # Simular múltiplos cruzeiros por linha
+                    num_cruises = random.randint(1, 2)
+                    
+                    for _ in range(num_cruises):
+                        offer = await self._simulate_cruise_scraping(search_id, cruise_line)
+                        if offer:
+                            offers.append(offer)
+                    
+                    # Rate limiting
+                    await asyncio.sleep(spec.rate_limit)
+                    
+                except Exception as e:
+                    if raise_errors:
+                        raise
+                    logger.warning(f"Error scraping {cruise_line['name']}: {e}")
+                    continue
+            
+            offers = await self._process(search_id, offers, scraped)
+            logger.info(f"Scraped {len(offers)} cruise offers")
+            return offers
+            
+        except Exception as e:
+            if raise_errors:
+                raise
+            logger.error(f"Cruise scraping error: {e}")
+            return []
+    
+    async def _simulate_cruise_scraping(self, search_id: str, cruise_line: dict) -> Optional[dict]:
+        """Simula scraping de um cruzeiro específico"""
+        
+        # Simular preços reais de mercado
+        duration = random.choice([3, 5, 7, 10, 14])
+        base_price = random.uniform(800, 6000) * (duration / 7)  # Preço baseado na duração
+        discount = random.uniform(50, 88)
+        current_price = base_price * (1 - discount / 100)
+        
+        # Selecionar navio
+        ships = self.ships.get(cruise_line['name'], ['Cruise Ship'])
+        ship_name = random.choice(ships)
+        
+        offer = dict(
+            source_api=f"scraped_{cruise_line['name'].lower().replace(' ', '_')}",
+            search_id=search_id,
+            cruise_line=cruise_line['name'],
+            ship_name=ship_name,
+            departure_port=random.choice(self.ports),
+            departure_date=(datetime.now(timezone.utc) + timedelta(days=random.randint(14, 180))).isoformat(),
+            duration_nights=duration,
+            original_price=round(base_price, 2),
+            current_price=round(current_price, 2),
+            discount_percentage=round(discount, 1),
+            cabin_type=random.choice(self.cabin_types),
+            booking_link=f"{cruise_line['url']}/cruise/{uuid.uuid4()}",
+            is_authentic=True,
+            validation_timestamp=datetime.now(timezone.utc).isoformat()
+        )
+        
+        return offer
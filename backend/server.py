@@ -1,24 +1,42 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Query
+from fastapi import FastAPI, APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response
+from starlette.background import BackgroundTask
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Optional
 import uuid
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 from contextlib import asynccontextmanager
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-import httpx
-import random
 from openai import OpenAI
-from bs4 import BeautifulSoup
 import asyncio
-from fake_useragent import UserAgent
 import re
 import json
+import heapq
+import time
+import tempfile
+from collections import Counter
+
+from admission import AdmissionGate, ClientRateLimiter, Overloaded, client_address
+from alerts import (AlertEngine, UnsafeWebhook, check_webhook_url, hash_manage_token, is_manage_token, is_webhook,
+                    new_manage_token)
+from autocomplete import KINDS as AUTOCOMPLETE_KINDS, build_index, load_observed_vocabulary
+from browser_pool import BrowserPool, needs_browser
+from export import EXPORT_DIR, ExportBusy, ExportUnavailable, export_offers, list_exports, write_download
+from fetch_cache import ValidatorStore
+from geo import GeoIndex, ensure_indexes as ensure_geo_indexes, hydrate, load_index_fields, resolve_place
+from jobs import LeaseManager, cleanup_old_offers, refresh_due_sources
+from loop_watchdog import LoopWatchdog
+from models import SearchRequest, AlertSubscription, AlertSubscriptionCreate, AlertSubscriptionCreated
+from profiling import FORMATS as PROFILE_FORMATS, ProfilingMiddleware, RequestProfiler
+from processing import filter_sort, run_stage, shutdown_pool, unpack
+from scrapers import FlightScraper, CruiseScraper
+from snapshot import SNAPSHOT_PATH, HotSet, load_offer_set
+from sources import build_default_registry
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -37,8 +55,41 @@ openai_client = OpenAI(
 # Scheduler for hourly updates
 scheduler = AsyncIOScheduler()
 
-# User agent generator
-ua = UserAgent()
+# embedded: this process also scrapes on a schedule (single-instance deployments)
+# api: read-only API; scraping runs in worker.py processes
+SCRAPE_MODE = os.environ.get('SCRAPE_MODE', 'embedded')
+INDEX_REFRESH_MINUTES = int(os.environ.get('INDEX_REFRESH_MINUTES', 10))
+
+# Admission control: live searches scrape every source, so they get a small
+# concurrency budget; when it's exhausted searches fall back to stored offers
+# through the (much larger) read budget, and only then are shed with 429
+search_gate = AdmissionGate(
+    'search',
+    limit=int(os.environ.get('SEARCH_MAX_CONCURRENCY', 4)),
+    queue_size=int(os.environ.get('SEARCH_QUEUE_SIZE', 8)),
+    queue_timeout=float(os.environ.get('SEARCH_QUEUE_TIMEOUT_SECONDS', 3)),
+)
+read_gate = AdmissionGate(
+    'read',
+    limit=int(os.environ.get('READ_MAX_CONCURRENCY', 64)),
+    queue_size=int(os.environ.get('READ_QUEUE_SIZE', 256)),
+    queue_timeout=float(os.environ.get('READ_QUEUE_TIMEOUT_SECONDS', 2)),
+)
+search_rate_limiter = ClientRateLimiter(
+    rate=float(os.environ.get('SEARCH_RATE_PER_MINUTE', 20)) / 60,
+    burst=int(os.environ.get('SEARCH_RATE_BURST', 5)),
+)
+# Reverse proxies in front of the API that append to X-Forwarded-For (0: use the peer address)
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
+
+# On-demand/sampled profiling, admin-only (ADMIN_TOKEN)
+request_profiler = RequestProfiler.from_env()
+
+# Event-loop lag sampler / slow-callback detector
+loop_watchdog = LoopWatchdog(
+    interval=float(os.environ.get('LOOP_WATCHDOG_INTERVAL_MS', 100)) / 1000,
+    threshold=float(os.environ.get('LOOP_SLOW_THRESHOLD_MS', 100)) / 1000,
+)
 
 # Configure logging
 logging.basicConfig(
@@ -47,299 +98,37 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Models
-class FlightOffer(BaseModel):
-    model_config = ConfigDict(extra="ignore")
-    
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    source_api: str
-    search_id: str
-    departure_airport: str
-    arrival_airport: str
-    departure_date: str
-    return_date: Optional[str] = None
-    airline: str
-    flight_number: str
-    original_price: float
-    current_price: float
-    discount_percentage: float
-    stops: int
-    duration_minutes: int
-    booking_link: str
-    is_authentic: bool
-    validation_timestamp: str
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
-
-class CruiseOffer(BaseModel):
-    model_config = ConfigDict(extra="ignore")
-    
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    source_api: str
-    search_id: str
-    cruise_line: str
-    ship_name: str
-    departure_port: str
-    departure_date: str
-    duration_nights: int
-    original_price: float
-    current_price: float
-    discount_percentage: float
-    cabin_type: str
-    booking_link: str
-    is_authentic: bool
-    validation_timestamp: str
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
-
-class SearchRequest(BaseModel):
-    departure: Optional[str] = None
-    arrival: Optional[str] = None
-    departure_date: Optional[str] = None
-    return_date: Optional[str] = None
-    passengers: int = 1
-    min_discount: float = 50.0
-    offer_type: str = "all"  # all, flight, cruise
-
-
 # Web Scraping Functions
-class FlightScraper:
-    """Scraper para sites de companhias aéreas"""
-    
-    def __init__(self):
-        self.headers = {
-            'User-Agent': ua.random,
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1'
-        }
-        
-        # Sites de busca de voos (agregadores públicos)
-        self.flight_search_sites = [
-            {
-                'name': 'kayak',
-                'url': 'https://www.kayak.com/flights',
-                'method': 'html_scraping'
-            },
-            {
-                'name': 'google_flights',
-                'url': 'https://www.google.com/travel/flights',
-                'method': 'html_scraping'
-            },
-            {
-                'name': 'momondo',
-                'url': 'https://www.momondo.com/flight-search',
-                'method': 'html_scraping'
-            }
-        ]
-        
-        # Companhias aéreas principais
-        self.airlines = [
-            {'name': 'United Airlines', 'code': 'UA', 'url': 'https://www.united.com'},
-            {'name': 'American Airlines', 'code': 'AA', 'url': 'https://www.aa.com'},
-            {'name': 'Delta', 'code': 'DL', 'url': 'https://www.delta.com'},
-            {'name': 'British Airways', 'code': 'BA', 'url': 'https://www.britishairways.com'},
-            {'name': 'Emirates', 'code': 'EK', 'url': 'https://www.emirates.com'},
-            {'name': 'Lufthansa', 'code': 'LH', 'url': 'https://www.lufthansa.com'},
-            {'name': 'Air France', 'code': 'AF', 'url': 'https://www.airfrance.com'},
-            {'name': 'KLM', 'code': 'KL', 'url': 'https://www.klm.com'},
-            {'name': 'Singapore Airlines', 'code': 'SQ', 'url': 'https://www.singaporeair.com'},
-            {'name': 'Qatar Airways', 'code': 'QR', 'url': 'https://www.qatarairways.com'},
-        ]
-        
-    async def scrape_flight_deals(self, search_id: str, departure: str = None, arrival: str = None) -> List[FlightOffer]:
-        """Scrape flight deals from multiple sources"""
-        offers = []
-        
-        try:
-            # Simular scraping de sites reais
-            # Em produção, isso faria requests reais aos sites
-            logger.info(f"Scraping flight deals for {departure or 'ANY'} -> {arrival or 'ANY'}")
-            
-            # Para cada companhia aérea, simular extração de dados
-            for airline_info in self.airlines:
-                # Simular múltiplas rotas por companhia
-                num_routes = random.randint(1, 3)
-                
-                for _ in range(num_routes):
-                    try:
-                        offer = await self._simulate_flight_scraping(
-                            search_id,
-                            airline_info,
-                            departure,
-                            arrival
-                        )
-                        if offer:
-                            offers.append(offer)
-                    except Exception as e:
-                        logger.warning(f"Error scraping {airline_info['name']}: {e}")
-                        continue
-                    
-                    # Rate limiting
-                    await asyncio.sleep(0.1)
-            
-            logger.info(f"Scraped {len(offers)} flight offers")
-            return offers
-            
-        except Exception as e:
-            logger.error(f"Flight scraping error: {e}")
-            return []
-    
-    async def _simulate_flight_scraping(self, search_id: str, airline_info: dict, 
-                                       departure: str = None, arrival: str = None) -> Optional[FlightOffer]:
-        """Simula scraping de um voo específico"""
-        
-        airports = ["JFK", "LAX", "LHR", "CDG", "DXB", "NRT", "SYD", "GRU", "MAD", "BCN", 
-                   "FRA", "AMS", "SIN", "HKG", "ICN", "PEK", "ORD", "ATL", "DFW", "MIA"]
-        
-        dep = departure or random.choice(airports)
-        arr = arrival or random.choice([a for a in airports if a != dep])
-        
-        # Simular preços reais de mercado
-        base_price = random.uniform(300, 3000)
-        discount = random.uniform(50, 92)  # 50-92% de desconto
-        current_price = base_price * (1 - discount / 100)
-        
-        # Simular scraping de detalhes
-        stops = random.randint(0, 2)
-        duration = random.randint(180, 960)
-        
-        offer = FlightOffer(
-            source_api=f"scraped_{airline_info['name'].lower().replace(' ', '_')}",
-            search_id=search_id,
-            departure_airport=dep,
-            arrival_airport=arr,
-            departure_date=(datetime.now(timezone.utc) + timedelta(days=random.randint(7, 120))).isoformat(),
-            airline=airline_info['name'],
-            flight_number=f"{airline_info['code']}{random.randint(100, 999)}",
-            original_price=round(base_price, 2),
-            current_price=round(current_price, 2),
-            discount_percentage=round(discount, 1),
-            stops=stops,
-            duration_minutes=duration,
-            booking_link=f"{airline_info['url']}/book?flight={uuid.uuid4()}",
-            is_authentic=True,
-            validation_timestamp=datetime.now(timezone.utc).isoformat()
-        )
-        
-        return offer
+source_registry = build_default_registry()
 
+# Initialize scrapers
+# ETag/Last-Modified/content hash per source URL, for conditional refreshes
+source_validators = ValidatorStore(db)
+# Warm browser contexts for sources with method='browser' (owned by the lifespan)
+browser_pool = BrowserPool.from_env()
+flight_scraper = FlightScraper(source_registry, source_validators, browser_pool)
+cruise_scraper = CruiseScraper(source_registry, source_validators, browser_pool)
 
-class CruiseScraper:
-    """Scraper para sites de empresas de cruzeiros"""
-    
-    def __init__(self):
-        self.headers = {
-            'User-Agent': ua.random,
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Connection': 'keep-alive',
-        }
-        
-        # Principais linhas de cruzeiro
-        self.cruise_lines = [
-            {'name': 'Royal Caribbean', 'url': 'https://www.royalcaribbean.com'},
-            {'name': 'Carnival Cruise Line', 'url': 'https://www.carnival.com'},
-            {'name': 'Norwegian Cruise Line', 'url': 'https://www.ncl.com'},
-            {'name': 'MSC Cruises', 'url': 'https://www.msccruises.com'},
-            {'name': 'Princess Cruises', 'url': 'https://www.princess.com'},
-            {'name': 'Celebrity Cruises', 'url': 'https://www.celebritycruises.com'},
-            {'name': 'Holland America Line', 'url': 'https://www.hollandamerica.com'},
-            {'name': 'Disney Cruise Line', 'url': 'https://disneycruise.disney.go.com'},
-            {'name': 'Costa Cruises', 'url': 'https://www.costacruises.com'},
-            {'name': 'Cunard Line', 'url': 'https://www.cunard.com'},
-        ]
-        
-        self.ships = {
-            'Royal Caribbean': ['Oasis of the Seas', 'Symphony', 'Harmony', 'Wonder of the Seas'],
-            'Carnival Cruise Line': ['Carnival Vista', 'Carnival Horizon', 'Mardi Gras'],
-            'Norwegian Cruise Line': ['Norwegian Encore', 'Norwegian Bliss', 'Norwegian Joy'],
-            'MSC Cruises': ['MSC Meraviglia', 'MSC Bellissima', 'MSC Grandiosa'],
-            'Princess Cruises': ['Sky Princess', 'Enchanted Princess', 'Discovery Princess'],
-        }
-        
-        self.ports = [
-            "Miami", "Fort Lauderdale", "Port Canaveral", "Barcelona", "Venice", 
-            "Southampton", "Singapore", "Sydney", "Los Angeles", "Seattle",
-            "Rome", "Copenhagen", "Vancouver", "New York", "Galveston"
-        ]
-        
-        self.cabin_types = ["Interior", "Ocean View", "Balcony", "Suite", "Mini Suite"]
-    
-    async def scrape_cruise_deals(self, search_id: str) -> List[CruiseOffer]:
-        """Scrape cruise deals from multiple cruise lines"""
-        offers = []
-        
-        try:
-            logger.info("Scraping cruise deals from major cruise lines")
-            
-            # Para cada linha de cruzeiro, scrape deals
-            for cruise_line in self.cruise_lines:
-                try:
-                    # Simular múltiplos cruzeiros por linha
-                    num_cruises = random.randint(1, 2)
-                    
-                    for _ in range(num_cruises):
-                        offer = await self._simulate_cruise_scraping(search_id, cruise_line)
-                        if offer:
-                            offers.append(offer)
-                    
-                    # Rate limiting
-                    await asyncio.sleep(0.1)
-                    
-                except Exception as e:
-                    logger.warning(f"Error scraping {cruise_line['name']}: {e}")
-                    continue
-            
-            logger.info(f"Scraped {len(offers)} cruise offers")
-            return offers
-            
-        except Exception as e:
-            logger.error(f"Cruise scraping error: {e}")
-            return []
-    
-    async def _simulate_cruise_scraping(self, search_id: str, cruise_line: dict) -> Optional[CruiseOffer]:
-        """Simula scraping de um cruzeiro específico"""
-        
-        # Simular preços reais de mercado
-        duration = random.choice([3, 5, 7, 10, 14])
-        base_price = random.uniform(800, 6000) * (duration / 7)  # Preço baseado na duração
-        discount = random.uniform(50, 88)
-        current_price = base_price * (1 - discount / 100)
-        
-        # Selecionar navio
-        ships = self.ships.get(cruise_line['name'], ['Cruise Ship'])
-        ship_name = random.choice(ships)
-        
-        offer = CruiseOffer(
-            source_api=f"scraped_{cruise_line['name'].lower().replace(' ', '_')}",
-            search_id=search_id,
-            cruise_line=cruise_line['name'],
-            ship_name=ship_name,
-            departure_port=random.choice(self.ports),
-            departure_date=(datetime.now(timezone.utc) + timedelta(days=random.randint(14, 180))).isoformat(),
-            duration_nights=duration,
-            original_price=round(base_price, 2),
-            current_price=round(current_price, 2),
-            discount_percentage=round(discount, 1),
-            cabin_type=random.choice(self.cabin_types),
-            booking_link=f"{cruise_line['url']}/cruise/{uuid.uuid4()}",
-            is_authentic=True,
-            validation_timestamp=datetime.now(timezone.utc).isoformat()
-        )
-        
-        return offer
+# Autocomplete over airports, ports and airlines (rebuilt from stored offers)
+autocomplete_index = build_index(registry=source_registry)
+# Current offers by departure coordinates, for /api/offers/nearby
+geo_index = GeoIndex({})
+# Current offers and stats served from memory, persisted for warm restarts
+hot_set: Optional[HotSet] = None
 
+# Per-source leases shared with other API replicas and scrape workers
+scrape_leases = LeaseManager(db)
 
-# Initialize scrapers
-flight_scraper = FlightScraper()
-cruise_scraper = CruiseScraper()
+# Deal alerts matched against each batch of newly inserted offers
+alert_engine = AlertEngine(db)
 
 
 async def validate_offer_authenticity(offer_data: dict) -> bool:
     """Use AI to validate offer authenticity"""
     try:
-        response = openai_client.chat.completions.create(
+        # The OpenAI client is synchronous; keep it off the event loop
+        response = await asyncio.to_thread(
+            openai_client.chat.completions.create,
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are a travel deal validator. Analyze if the offer looks legitimate based on price, discount, and details. Respond only with 'valid' or 'suspicious'."},
@@ -356,54 +145,120 @@ async def validate_offer_authenticity(offer_data: dict) -> bool:
 
 # Scheduled task for hourly updates
 async def refresh_offers():
-    """Refresh offers every hour by scraping websites"""
+    """Refresh every due source this process can lease, then clean up old offers"""
     logger.info("Starting scheduled web scraping refresh")
     try:
-        search_id = str(uuid.uuid4())
-        
-        # Scrape flight deals
-        flights = await flight_scraper.scrape_flight_deals(search_id)
-        
-        # Scrape cruise deals
-        cruises = await cruise_scraper.scrape_cruise_deals(search_id)
-        
-        # Store in database
-        if flights:
-            await db.flight_offers.insert_many([f.model_dump() for f in flights])
-            logger.info(f"Inserted {len(flights)} flight offers from web scraping")
-        
-        if cruises:
-            await db.cruise_offers.insert_many([c.model_dump() for c in cruises])
-            logger.info(f"Inserted {len(cruises)} cruise offers from web scraping")
-        
-        # Clean up old offers (older than 24 hours)
-        cutoff = (datetime.now(timezone.utc) - timedelta(hours=24)).isoformat()
-        deleted_flights = await db.flight_offers.delete_many({"created_at": {"$lt": cutoff}})
-        deleted_cruises = await db.cruise_offers.delete_many({"created_at": {"$lt": cutoff}})
-        
-        logger.info(f"Cleaned up {deleted_flights.deleted_count} old flight offers and {deleted_cruises.deleted_count} old cruise offers")
-        logger.info("Scheduled web scraping refresh completed")
+        # Profiled once when armed through POST /api/diagnostics/profiles/refresh
+        async with request_profiler.refresh_profile():
+            inserted = await refresh_due_sources(db, scrape_leases, {
+                'flight': flight_scraper,
+                'cruise': cruise_scraper,
+            })
+            logger.info(f"Inserted {len(inserted['flight'])} flight offers and "
+                        f"{len(inserted['cruise'])} cruise offers from web scraping")
+            
+            await alert_engine.process(inserted)
+            
+            # Clean up old offers (older than 24 hours)
+            await cleanup_old_offers(db)
+            logger.info("Scheduled web scraping refresh completed")
         
     except Exception as e:
         logger.error(f"Error in scheduled refresh: {e}")
+    
+    await rebuild_offer_indexes()
+
+
+async def rebuild_offer_indexes():
+    """Rebuild the in-memory lookup structures from the offers stored in MongoDB"""
+    global autocomplete_index, geo_index, hot_set
+    try:
+        observed = await load_observed_vocabulary(db)
+        autocomplete_index = build_index(observed, source_registry)
+        logger.info(f"Rebuilt autocomplete index with {len(autocomplete_index)} entries")
+        
+        geo_index = await asyncio.to_thread(GeoIndex, await load_index_fields(db))
+        logger.info(f"Rebuilt geo index with {len(geo_index)} offers "
+                    f"({geo_index.unlocated} without known coordinates)")
+        
+        offer_set = await load_offer_set(db)
+        hot_set = await asyncio.to_thread(HotSet.from_offers, offer_set, observed)
+        if SNAPSHOT_PATH:
+            await asyncio.to_thread(hot_set.save, SNAPSHOT_PATH)
+            logger.info(f"Saved snapshot of {len(hot_set)} offers to {SNAPSHOT_PATH}")
+    except Exception as e:
+        logger.error(f"Error rebuilding offer indexes: {e}")
+
+
+def restore_snapshot():
+    """Map the last saved hot set so offers can be served before MongoDB is queried"""
+    global hot_set
+    if not SNAPSHOT_PATH:
+        return
+    started = time.perf_counter()
+    snapshot = HotSet.load(SNAPSHOT_PATH)
+    if snapshot is None:
+        logger.info("No usable offer snapshot; serving from MongoDB until the first rebuild")
+        return
+    hot_set = snapshot
+    logger.info(f"Loaded snapshot of {len(hot_set)} offers ({hot_set.age_seconds / 60:.0f} min old) "
+                f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+async def reconcile_offers():
+    """Background startup: warm the indexes from the snapshot, then catch up with MongoDB"""
+    global autocomplete_index, geo_index
+    try:
+        await ensure_geo_indexes(db)
+    except Exception as e:
+        logger.error(f"Error creating offer indexes: {e}")
+    if hot_set is not None:
+        try:
+            observed = {kind: Counter(counts) for kind, counts in hot_set.vocabulary.items()}
+            autocomplete_index = build_index(observed, source_registry)
+            geo_index = await asyncio.to_thread(lambda: GeoIndex(hot_set.offer_set()))
+        except Exception as e:
+            logger.error(f"Error warming indexes from snapshot: {e}")
+    
+    # Initial scraping (sources scraped recently by another process are skipped)
+    if SCRAPE_MODE == 'embedded':
+        await refresh_offers()
+    else:
+        await rebuild_offer_indexes()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    logger.info("Starting Volo Web Scraping Service")
-    scheduler.add_job(refresh_offers, 'interval', hours=1, id='refresh_offers')
+    logger.info(f"Starting Volo Web Scraping Service (SCRAPE_MODE={SCRAPE_MODE})")
+    if os.environ.get('LOOP_WATCHDOG', '1') != '0':
+        loop_watchdog.start()
+    if needs_browser(source_registry.enabled()):
+        await browser_pool.start()
+    
+    if SCRAPE_MODE == 'embedded':
+        scheduler.add_job(refresh_offers, 'interval', hours=1, id='refresh_offers')
+        logger.info("Scheduler started - will scrape websites every hour")
+    # Picks up offers written by scrape workers / other replicas
+    scheduler.add_job(
+        rebuild_offer_indexes, 'interval', minutes=INDEX_REFRESH_MINUTES, id='rebuild_offer_indexes'
+    )
     scheduler.start()
-    logger.info("Scheduler started - will scrape websites every hour")
     
-    # Run initial scraping
-    await refresh_offers()
+    # Serve from the last snapshot right away; reconcile without blocking startup
+    restore_snapshot()
+    reconcile_task = asyncio.create_task(reconcile_offers())
     
     yield
     
     # Shutdown
     logger.info("Shutting down application")
+    reconcile_task.cancel()
     scheduler.shutdown()
+    await loop_watchdog.stop()
+    await browser_pool.close()
+    await alert_engine.close()
+    shutdown_pool()
     client.close()
 
 
@@ -428,9 +283,115 @@ async def health_check():
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
 
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not request_profiler.is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@api_router.get("/diagnostics/loop", dependencies=[Depends(require_admin)])
+async def loop_diagnostics(events: int = Query(10, ge=0, le=50)):
+    """Event-loop lag percentiles and recent slow callbacks"""
+    return {
+        **loop_watchdog.stats(events),
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
+@api_router.get("/diagnostics/admission", dependencies=[Depends(require_admin)])
+async def admission_diagnostics():
+    """Concurrency, queueing and shedding counters of the admission gates"""
+    return {
+        "search": search_gate.stats(),
+        "read": read_gate.stats(),
+        "search_rate_limit": search_rate_limiter.stats(),
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
+@api_router.get("/diagnostics/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """Slowest sampled request profiles and the last one-shot refresh profile"""
+    return {
+        **request_profiler.stats(),
+        "profiles": request_profiler.profiles(),
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
+@api_router.post("/diagnostics/profiles/refresh", dependencies=[Depends(require_admin)])
+async def profile_next_refresh():
+    """Profile the next scheduled refresh_offers run"""
+    if not request_profiler.available:
+        raise HTTPException(status_code=501, detail="Profiling requires pyinstrument")
+    if SCRAPE_MODE != 'embedded':
+        raise HTTPException(status_code=409, detail="Refreshes run in scrape workers (SCRAPE_MODE=api)")
+    request_profiler.arm_refresh()
+    job = scheduler.get_job('refresh_offers')
+    return {
+        "armed": True,
+        "next_run": job.next_run_time.isoformat() if job and job.next_run_time else None
+    }
+
+@api_router.get("/diagnostics/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str, format: str = Query("html", description="html or speedscope")):
+    """Render a stored profile as pyinstrument HTML or speedscope JSON"""
+    if format not in PROFILE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format: {format}")
+    record = request_profiler.get(profile_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    report = await asyncio.to_thread(request_profiler.render, record, format)
+    return Response(content=report, media_type=PROFILE_FORMATS[format])
+
+@api_router.get("/autocomplete")
+async def autocomplete(
+    q: str = Query(..., min_length=1, max_length=64),
+    kind: str = Query("all", description="Type: all, airport, port, airline, cruise_line"),
+    limit: int = Query(8, ge=1, le=20)
+):
+    """Suggest airports, ports and airlines for a partial (possibly misspelled) query"""
+    if kind != "all" and kind not in AUTOCOMPLETE_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown kind: {kind}")
+    started = time.perf_counter()
+    suggestions = autocomplete_index.search(q, limit, None if kind == "all" else [kind])
+    return {
+        "query": q,
+        "suggestions": suggestions,
+        "took_us": round((time.perf_counter() - started) * 1_000_000, 1)
+    }
+
+def client_id(http_request: Request) -> str:
+    """Rate-limit key: the address our own proxies saw (see TRUSTED_PROXY_HOPS)"""
+    return client_address(
+        http_request.client.host if http_request.client else None,
+        http_request.headers.getlist('x-forwarded-for'),
+        TRUSTED_PROXY_HOPS,
+    )
+
+def overloaded(e: Overloaded) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=f"Service overloaded ({e.reason}), retry later",
+        headers={"Retry-After": e.retry_after_header}
+    )
+
 @api_router.post("/search")
-async def search_offers(request: SearchRequest):
+async def search_offers(request: SearchRequest, http_request: Request):
     """Search for flight and cruise offers using web scraping"""
+    retry_after = search_rate_limiter.acquire(client_id(http_request))
+    if retry_after is not None:
+        raise overloaded(Overloaded("search rate limit", retry_after))
+    
+    try:
+        async with search_gate.admit():
+            return await live_search(request)
+    except Overloaded as e:
+        # Scrape budget exhausted: answer from what's already in MongoDB
+        logger.warning(f"Search served from stored offers: {e.reason}")
+        try:
+            async with read_gate.admit():
+                return await stored_search(request, e)
+        except Overloaded as hard:
+            raise overloaded(hard)
+
+async def live_search(request: SearchRequest) -> dict:
+    """Scrape every enabled source for the request (runs inside the search gate)"""
     try:
         search_id = str(uuid.uuid4())
         all_offers = []
@@ -444,18 +405,18 @@ async def search_offers(request: SearchRequest):
                 request.arrival
             )
             # Filter by minimum discount
-            flights = [f for f in flights if f.discount_percentage >= request.min_discount]
-            all_offers.extend([{**f.model_dump(), "type": "flight"} for f in flights])
+            flights = await run_stage(filter_sort, 'flight', flights, request.min_discount, size=len(flights))
+            all_offers.append([{**f, "type": "flight"} for f in unpack('flight', flights)])
         
         if request.offer_type in ["all", "cruise"]:
             logger.info("Scraping cruise deals")
             cruises = await cruise_scraper.scrape_cruise_deals(search_id)
             # Filter by minimum discount
-            cruises = [c for c in cruises if c.discount_percentage >= request.min_discount]
-            all_offers.extend([{**c.model_dump(), "type": "cruise"} for c in cruises])
+            cruises = await run_stage(filter_sort, 'cruise', cruises, request.min_discount, size=len(cruises))
+            all_offers.append([{**c, "type": "cruise"} for c in unpack('cruise', cruises)])
         
-        # Sort by discount percentage
-        all_offers.sort(key=lambda x: x['discount_percentage'], reverse=True)
+        # Each list is already sorted by discount percentage
+        all_offers = list(heapq.merge(*all_offers, key=lambda x: x['discount_percentage'], reverse=True))
         
         return {
             "search_id": search_id,
@@ -469,6 +430,52 @@ async def search_offers(request: SearchRequest):
         logger.error(f"Search error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def stored_search(request: SearchRequest, overload: Overloaded) -> dict:
+    """Degraded search over the offers already stored in MongoDB"""
+    try:
+        offers = await find_stored_offers(
+            request.offer_type, request.min_discount, 50, request.departure, request.arrival
+        )
+        return {
+            "search_id": str(uuid.uuid4()),
+            "total_results": len(offers),
+            "offers": offers,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "data_source": "stored_offers",
+            "degraded": True,
+            "retry_live_after_seconds": int(overload.retry_after_header)
+        }
+    except Exception as e:
+        logger.error(f"Stored search error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def find_stored_offers(offer_type: str, min_discount: float, limit: int,
+                             departure: Optional[str] = None, arrival: Optional[str] = None) -> List[dict]:
+    """Best stored offers by discount, optionally for a route"""
+    offers = []
+    
+    if offer_type in ["all", "flight"]:
+        query = {"discount_percentage": {"$gte": min_discount}}
+        if departure:
+            query["departure_airport"] = departure.upper()
+        if arrival:
+            query["arrival_airport"] = arrival.upper()
+        flights = await db.flight_offers.find(
+            query, {"_id": 0}
+        ).sort("discount_percentage", -1).limit(limit).to_list(limit)
+        offers.extend([{**f, "type": "flight"} for f in flights])
+    
+    if offer_type in ["all", "cruise"]:
+        cruises = await db.cruise_offers.find(
+            {"discount_percentage": {"$gte": min_discount}},
+            {"_id": 0}
+        ).sort("discount_percentage", -1).limit(limit).to_list(limit)
+        offers.extend([{**c, "type": "cruise"} for c in cruises])
+    
+    # Sort combined results
+    offers.sort(key=lambda x: x['discount_percentage'], reverse=True)
+    return offers[:limit]
+
 @api_router.get("/offers")
 async def get_offers(
     offer_type: str = Query("all", description="Type: all, flight, cruise"),
@@ -477,53 +484,88 @@ async def get_offers(
 ):
     """Get latest offers from database (scraped from websites)"""
     try:
-        offers = []
-        
-        if offer_type in ["all", "flight"]:
-            flights = await db.flight_offers.find(
-                {"discount_percentage": {"$gte": min_discount}},
-                {"_id": 0}
-            ).sort("discount_percentage", -1).limit(limit).to_list(limit)
-            offers.extend([{**f, "type": "flight"} for f in flights])
-        
-        if offer_type in ["all", "cruise"]:
-            cruises = await db.cruise_offers.find(
-                {"discount_percentage": {"$gte": min_discount}},
-                {"_id": 0}
-            ).sort("discount_percentage", -1).limit(limit).to_list(limit)
-            offers.extend([{**c, "type": "cruise"} for c in cruises])
-        
-        # Sort combined results
-        offers.sort(key=lambda x: x['discount_percentage'], reverse=True)
+        if hot_set is not None:
+            offers = hot_set.top_offers(offer_type, min_discount, limit)
+        else:
+            async with read_gate.admit():
+                offers = await find_stored_offers(offer_type, min_discount, limit)
         
         return {
             "total": len(offers),
-            "offers": offers[:limit],
+            "offers": offers,
             "data_source": "web_scraped_data"
         }
     
+    except Overloaded as e:
+        raise overloaded(e)
     except Exception as e:
         logger.error(f"Get offers error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/offers/nearby")
+async def get_nearby_offers(
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+    near: Optional[str] = Query(None, description="Airport code or cruise port instead of lat/lon"),
+    radius_km: float = Query(500.0, gt=0, le=5000),
+    offer_type: str = Query("all", description="Type: all, flight, cruise"),
+    min_discount: float = Query(50.0, ge=0, le=100),
+    weight: float = Query(0.5, ge=0, le=1, description="1 ranks by discount only, 0 by distance only"),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Best current offers departing near a point, ranked by distance and discount"""
+    if offer_type not in ("all", "flight", "cruise"):
+        raise HTTPException(status_code=400, detail=f"Unknown offer_type: {offer_type}")
+    if near:
+        coords = resolve_place(near)
+        if coords is None:
+            raise HTTPException(status_code=404, detail=f"Unknown airport or port: {near}")
+        lat, lon = coords
+    elif lat is None or lon is None:
+        raise HTTPException(status_code=400, detail="Pass lat and lon, or near")
+    
+    started = time.perf_counter()
+    hits, scanned = geo_index.nearby(lat, lon, radius_km, offer_type, min_discount, limit, weight)
+    took_us = round((time.perf_counter() - started) * 1_000_000, 1)
+    try:
+        offers = await hydrate(db, hits)
+    except Exception as e:
+        logger.error(f"Nearby offers error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "total": len(offers),
+        "offers": offers,
+        "origin": {"lat": lat, "lon": lon},
+        "radius_km": radius_km,
+        "candidates_scanned": scanned,
+        "took_us": took_us,
+        "data_source": "web_scraped_data"
+    }
+
 @api_router.get("/stats")
 async def get_stats():
     """Get statistics about available offers (from web scraping)"""
     try:
-        flight_count = await db.flight_offers.count_documents({})
-        cruise_count = await db.cruise_offers.count_documents({})
-        
-        # Get average discount
-        pipeline = [
-            {"$group": {
-                "_id": None,
-                "avg_discount": {"$avg": "$discount_percentage"},
-                "max_discount": {"$max": "$discount_percentage"}
-            }}
-        ]
-        
-        flight_stats = await db.flight_offers.aggregate(pipeline).to_list(1)
-        cruise_stats = await db.cruise_offers.aggregate(pipeline).to_list(1)
+        if hot_set is not None:
+            flight_count = hot_set.stats['flight']['count']
+            cruise_count = hot_set.stats['cruise']['count']
+            flight_stats = [hot_set.stats['flight']] if flight_count else []
+            cruise_stats = [hot_set.stats['cruise']] if cruise_count else []
+        else:
+            flight_count = await db.flight_offers.count_documents({})
+            cruise_count = await db.cruise_offers.count_documents({})
+            
+            # Get average discount
+            pipeline = [
+                {"$group": {
+                    "_id": None,
+                    "avg_discount": {"$avg": "$discount_percentage"},
+                    "max_discount": {"$max": "$discount_percentage"}
+                }}
+            ]
+            
+            flight_stats = await db.flight_offers.aggregate(pipeline).to_list(1)
+            cruise_stats = await db.cruise_offers.aggregate(pipeline).to_list(1)
         
         return {
             "total_offers": flight_count + cruise_count,
@@ -556,13 +598,167 @@ async def get_scraping_info():
             "cruise_lines": [c['name'] for c in cruise_scraper.cruise_lines],
             "total": len(cruise_scraper.cruise_lines)
         },
+        "sources": [
+            {
+                "key": spec.key,
+                "name": spec.name,
+                "type": spec.kind,
+                "method": spec.method,
+                "rate_limit_seconds": spec.rate_limit,
+                "refresh_every_minutes": int(spec.refresh_every.total_seconds() // 60),
+                "enabled": spec.enabled
+            }
+            for spec in source_registry.all()
+        ],
         "update_frequency": "Every hour",
         "scraping_method": "Direct website scraping with rate limiting"
     }
 
+@api_router.get("/scraping-status")
+async def get_scraping_status():
+    """Per-source lease state: who scraped what, when and with which result"""
+    try:
+        return {
+            "scrape_mode": SCRAPE_MODE,
+            "sources": await scrape_leases.status(),
+            "browser_pool": browser_pool.stats(),
+            "hot_set": {
+                "offers": len(hot_set),
+                "age_seconds": round(hot_set.age_seconds, 1),
+                "source": hot_set.source
+            } if hot_set is not None else None,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Scraping status error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.post("/alerts", response_model=AlertSubscriptionCreated)
+async def create_alert(request: AlertSubscriptionCreate, x_alert_token: Optional[str] = Header(None)):
+    """Subscribe to new offers on a route above a discount threshold
+
+    The response carries a `manage_token`; send it as X-Alert-Token to list or
+    delete the subscription (and when creating more, to manage them together).
+    Only tokens issued by this endpoint are accepted.
+    """
+    if request.offer_type not in ("all", "flight", "cruise"):
+        raise HTTPException(status_code=400, detail="offer_type must be all, flight or cruise")
+    if request.offer_type == "cruise" and request.arrival:
+        raise HTTPException(status_code=400, detail="Cruise alerts only filter by departure port")
+    if is_webhook(request.contact):
+        try:
+            await check_webhook_url(request.contact)
+        except UnsafeWebhook as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if x_alert_token is not None:
+        # Reusing a token requires one we issued: no caller-chosen (guessable) tokens
+        token_hash = alert_owner(x_alert_token)
+        if not await db.alert_subscriptions.find_one({"token_hash": token_hash}, {"_id": 1}):
+            raise HTTPException(status_code=401, detail="Unknown X-Alert-Token")
+    try:
+        token = x_alert_token or new_manage_token()
+        subscription = AlertSubscription(**request.model_dump())
+        await db.alert_subscriptions.insert_one({
+            **subscription.model_dump(), "token_hash": hash_manage_token(token)
+        })
+        return AlertSubscriptionCreated(**subscription.model_dump(), manage_token=token)
+    except Exception as e:
+        logger.error(f"Create alert error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def alert_owner(x_alert_token: Optional[str] = Header(None)) -> str:
+    if not x_alert_token:
+        raise HTTPException(status_code=401, detail="X-Alert-Token required")
+    if not is_manage_token(x_alert_token):
+        raise HTTPException(status_code=401, detail="Malformed X-Alert-Token")
+    return hash_manage_token(x_alert_token)
+
+@api_router.get("/alerts")
+async def list_alerts(token_hash: str = Depends(alert_owner)):
+    """List the active alert subscriptions created with the given token"""
+    try:
+        alerts = await db.alert_subscriptions.find(
+            {"token_hash": token_hash, "active": True}, {"_id": 0, "token_hash": 0}
+        ).to_list(100)
+        return {"total": len(alerts), "alerts": alerts}
+    except Exception as e:
+        logger.error(f"List alerts error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.delete("/alerts/{alert_id}")
+async def delete_alert(alert_id: str, token_hash: str = Depends(alert_owner)):
+    """Deactivate an alert (kept so the matching index sees the change on its next sync)"""
+    result = await db.alert_subscriptions.update_one(
+        {"id": alert_id, "token_hash": token_hash, "active": True},
+        {"$set": {"active": False, "updated_at": datetime.now(timezone.utc).isoformat()}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    return {"id": alert_id, "active": False}
+
+@api_router.post("/export/run", dependencies=[Depends(require_admin)])
+async def run_export(full: bool = Query(False, description="Ignore the watermark and export everything")):
+    """Export offers created since the last run to partitioned Parquet files"""
+    try:
+        return {
+            "exports": await export_offers(db, full=full),
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+    except ExportUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except ExportBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Export error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/export/files", dependencies=[Depends(require_admin)])
+async def get_export_files():
+    """Parquet files written by previous export runs"""
+    files = list_exports()
+    return {"total": len(files), "files": files}
+
+@api_router.get("/export/files/{file_path:path}", dependencies=[Depends(require_admin)])
+async def download_export_file(file_path: str):
+    """Download one partition file from a previous export run"""
+    root = EXPORT_DIR.resolve()
+    path = (root / file_path).resolve()
+    if root not in path.parents or path.suffix != '.parquet' or not path.is_file():
+        raise HTTPException(status_code=404, detail="Export file not found")
+    return FileResponse(path, media_type="application/vnd.apache.parquet", filename=path.name)
+
+@api_router.get("/export/download", dependencies=[Depends(require_admin)])
+async def download_export(
+    offer_type: str = Query(..., description="Type: flight, cruise"),
+    since: Optional[str] = Query(None, description="Only offers created after this ISO timestamp")
+):
+    """Stream the current offers of one type as a single Parquet file"""
+    if offer_type not in ("flight", "cruise"):
+        raise HTTPException(status_code=400, detail="offer_type must be flight or cruise")
+    fd, tmp_name = tempfile.mkstemp(suffix='.parquet')
+    os.close(fd)
+    try:
+        await write_download(db, offer_type, Path(tmp_name), since)
+    except ExportUnavailable as e:
+        os.unlink(tmp_name)
+        raise HTTPException(status_code=501, detail=str(e))
+    except Exception as e:
+        os.unlink(tmp_name)
+        logger.error(f"Export download error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+    return FileResponse(
+        tmp_name,
+        media_type="application/vnd.apache.parquet",
+        filename=f"{offer_type}_offers_{stamp}.parquet",
+        background=BackgroundTask(os.unlink, tmp_name)
+    )
+
 # Include router
 app.include_router(api_router)
 
+app.add_middleware(ProfilingMiddleware, profiler=request_profiler)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
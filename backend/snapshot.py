@@ -0,0 +1,296 @@
+"""Hot set of current offers, persisted as a memory-mappable snapshot.
+
+After every index rebuild the current offers are written, columnar and
+sorted by discount, to one file. A new process maps that file at startup
+and serves `/api/offers` and `/api/stats` from it straight away, while the
+MongoDB reconciliation runs in the background. Rows are materialized into
+dicts only when they are returned.
+
+File layout (little endian, every section 8-byte aligned):
+
+    header   magic 'VOLOSNAP', version u16, section count u16, schema hash u64,
+             created_at f64, body length u64, blake2b-128 of everything else
+             (the header fields before it, the table, padding and body)
+    table    per section: name (32 bytes, NUL padded), offset u64, length u64
+    body     sections: `meta` (JSON: counts, stats, vocabulary), then per
+             kind one array per numeric field (`<f8`, `<i8`, `u1`) and
+             `.off` (u32 offsets) + `.dat` (UTF-8) + optional `.nul` (u1)
+             per string field
+
+A snapshot is rejected when the magic, version, schema (model fields) or
+checksum don't match, when a section lies outside the file or doesn't fit
+the row counts, or when it is older than `SNAPSHOT_MAX_AGE_HOURS`.
+"""
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from processing import FIELDS, FIELD_TYPES
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'VOLOSNAP'
+VERSION = 2
+HEADER = struct.Struct('<8sHHQdQ16s')
+DIGEST_SIZE = 16
+SECTION = struct.Struct('<32sQQ')
+ALIGN = 8
+
+NUMERIC_DTYPES = {float: '<f8', int: '<i8', bool: 'u1'}
+
+SNAPSHOT_PATH = os.environ.get('OFFER_SNAPSHOT_PATH', str(Path(__file__).parent / 'snapshots' / 'offers.snap'))
+MAX_AGE_SECONDS = float(os.environ.get('SNAPSHOT_MAX_AGE_HOURS', 24)) * 3600
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def schema_hash() -> int:
+    """Changes whenever a model gains, loses, renames or retypes a field"""
+    description = repr([(kind, FIELDS[kind], [t.__name__ for t in FIELD_TYPES[kind]]) for kind in sorted(FIELDS)])
+    return int.from_bytes(hashlib.blake2b(description.encode(), digest_size=8).digest(), 'little')
+
+
+class _StringColumn:
+    def __init__(self, offsets: np.ndarray, data: memoryview, nulls: Optional[np.ndarray]):
+        self.offsets = offsets
+        self.data = data
+        self.nulls = nulls
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        if self.nulls is not None and self.nulls[i]:
+            return None
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+
+
+def _encode_kind(kind: str, offers: List[dict]) -> List[Tuple[str, bytes]]:
+    offers = sorted(offers, key=lambda o: o.get('discount_percentage') or 0, reverse=True)
+    sections = []
+    for field, ftype in zip(FIELDS[kind], FIELD_TYPES[kind]):
+        values = [offer.get(field) for offer in offers]
+        if ftype in NUMERIC_DTYPES:
+            # Stored offers were validated, so only float columns should ever see None
+            fill = float('nan') if ftype is float else 0
+            column = np.array([fill if v is None else v for v in values], dtype=NUMERIC_DTYPES[ftype])
+            sections.append((f"{kind}.{field}", column.tobytes()))
+            continue
+        encoded = [b'' if v is None else str(v).encode('utf-8') for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype='<u4')
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        sections.append((f"{kind}.{field}.off", offsets.tobytes()))
+        sections.append((f"{kind}.{field}.dat", b''.join(encoded)))
+        if any(v is None for v in values):
+            sections.append((f"{kind}.{field}.nul", np.array([v is None for v in values], dtype='u1').tobytes()))
+    return sections
+
+
+def encode(offers_by_kind: Dict[str, List[dict]], meta: dict, created_at: Optional[float] = None) -> bytes:
+    sections = [('meta', json.dumps(meta).encode('utf-8'))]
+    for kind in FIELDS:
+        sections.extend(_encode_kind(kind, offers_by_kind.get(kind, [])))
+
+    table_size = SECTION.size * len(sections)
+    body_start = HEADER.size + table_size
+    body_start += -body_start % ALIGN
+    table, body = [], bytearray()
+    for name, payload in sections:
+        body.extend(b'\0' * (-len(body) % ALIGN))
+        table.append(SECTION.pack(name.encode(), body_start + len(body), len(payload)))
+        body.extend(payload)
+
+    fields = (MAGIC, VERSION, len(sections), schema_hash(),
+              created_at if created_at is not None else time.time(), len(body))
+    rest = b''.join(table) + b'\0' * (body_start - HEADER.size - table_size) + bytes(body)
+    unsigned = HEADER.pack(*fields, b'\0' * DIGEST_SIZE)
+    return HEADER.pack(*fields, _checksum(unsigned, rest)) + rest
+
+
+def _checksum(header: bytes, rest) -> bytes:
+    """blake2b over the header fields (digest excluded) and everything after the header"""
+    digest = hashlib.blake2b(header[:HEADER.size - DIGEST_SIZE], digest_size=DIGEST_SIZE)
+    digest.update(rest)
+    return digest.digest()
+
+
+def _read_sections(view: memoryview, count: int, body_start: int) -> Dict[str, memoryview]:
+    sections: Dict[str, memoryview] = {}
+    for i in range(count):
+        raw_name, offset, length = SECTION.unpack_from(view, HEADER.size + i * SECTION.size)
+        try:
+            name = raw_name.rstrip(b'\0').decode('utf-8')
+        except UnicodeDecodeError:
+            raise SnapshotError(f"section {i} has an invalid name")
+        if offset < body_start or offset + length > len(view):
+            raise SnapshotError(f"section {name!r} lies outside the body")
+        sections[name] = view[offset:offset + length]
+    return sections
+
+
+def _section(sections: Dict[str, memoryview], name: str) -> memoryview:
+    if name not in sections:
+        raise SnapshotError(f"missing section {name!r}")
+    return sections[name]
+
+
+class HotSet:
+    """Ofertas atuais em colunas (ordenadas por desconto), servidas direto do snapshot"""
+
+    def __init__(self, buffer, source: str = 'memory', max_age: Optional[float] = None):
+        view = memoryview(buffer)
+        if len(view) < HEADER.size:
+            raise SnapshotError("truncated header")
+        magic, version, count, schema, created_at, body_len, digest = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise SnapshotError("not a snapshot file")
+        if version != VERSION:
+            raise SnapshotError(f"unsupported version {version}")
+        if schema != schema_hash():
+            raise SnapshotError("offer schema changed since the snapshot was written")
+        if max_age is not None and time.time() - created_at > max_age:
+            raise SnapshotError(f"stale snapshot ({(time.time() - created_at) / 3600:.1f}h old)")
+
+        body_start = len(view) - body_len
+        if body_len > len(view) or body_start < HEADER.size + SECTION.size * count:
+            raise SnapshotError("truncated body")
+        if _checksum(bytes(view[:HEADER.size]), view[HEADER.size:]) != digest:
+            raise SnapshotError("checksum mismatch")
+
+        self._buffer = buffer
+        self.source = source
+        self.created_at = created_at
+        sections = _read_sections(view, count, body_start)
+
+        try:
+            self.meta = json.loads(bytes(_section(sections, 'meta')))
+            self.counts: Dict[str, int] = {kind: int(self.meta['counts'][kind]) for kind in FIELDS}
+        except (ValueError, KeyError, TypeError) as e:
+            raise SnapshotError(f"unreadable meta section: {e}")
+        self._columns: Dict[str, Dict[str, object]] = {}
+        for kind in FIELDS:
+            rows = self.counts[kind]
+            columns = {}
+            for field, ftype in zip(FIELDS[kind], FIELD_TYPES[kind]):
+                if ftype in NUMERIC_DTYPES:
+                    data = _section(sections, f"{kind}.{field}")
+                    if len(data) != rows * np.dtype(NUMERIC_DTYPES[ftype]).itemsize:
+                        raise SnapshotError(f"column {kind}.{field} doesn't match the row count")
+                    columns[field] = np.frombuffer(data, dtype=NUMERIC_DTYPES[ftype])
+                    continue
+                offsets_data = _section(sections, f"{kind}.{field}.off")
+                data = _section(sections, f"{kind}.{field}.dat")
+                nulls = sections.get(f"{kind}.{field}.nul")
+                if len(offsets_data) != (rows + 1) * 4 or (nulls is not None and len(nulls) != rows):
+                    raise SnapshotError(f"column {kind}.{field} doesn't match the row count")
+                offsets = np.frombuffer(offsets_data, dtype='<u4')
+                if offsets[0] != 0 or offsets[-1] != len(data) or np.any(np.diff(offsets.astype(np.int64)) < 0):
+                    raise SnapshotError(f"column {kind}.{field} has invalid string offsets")
+                columns[field] = _StringColumn(
+                    offsets, data, np.frombuffer(nulls, dtype='u1') if nulls is not None else None,
+                )
+            self._columns[kind] = columns
+
+    @classmethod
+    def from_offers(cls, offers_by_kind: Dict[str, List[dict]], vocabulary: Optional[dict] = None) -> 'HotSet':
+        return cls(encode(offers_by_kind, build_meta(offers_by_kind, vocabulary)))
+
+    @classmethod
+    def load(cls, path: str = SNAPSHOT_PATH, max_age: Optional[float] = MAX_AGE_SECONDS) -> Optional['HotSet']:
+        """Map a snapshot file; returns None (and logs why) when it's missing or unusable"""
+        try:
+            with open(path, 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+        try:
+            return cls(buffer, source=path, max_age=max_age)
+        except Exception as e:
+            # Whatever is wrong with the file, startup falls back to MongoDB
+            logger.warning(f"Ignoring offer snapshot {path}: {e}")
+            return None
+
+    def save(self, path: str = SNAPSHOT_PATH):
+        """Write atomically so readers never map a half-written file"""
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_suffix(target.suffix + f'.{os.getpid()}.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(self._buffer)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, target)
+
+    def __len__(self) -> int:
+        return sum(self.counts.values())
+
+    @property
+    def age_seconds(self) -> float:
+        return time.time() - self.created_at
+
+    @property
+    def stats(self) -> dict:
+        return self.meta['stats']
+
+    @property
+    def vocabulary(self) -> dict:
+        return self.meta.get('vocabulary') or {}
+
+    def row(self, kind: str, i: int) -> dict:
+        offer = {}
+        for (field, column), ftype in zip(self._columns[kind].items(), FIELD_TYPES[kind]):
+            value = column[i]
+            if isinstance(value, np.generic):
+                value = ftype(value.item())
+            offer[field] = value
+        return offer
+
+    def rows(self, kind: str) -> List[dict]:
+        return [self.row(kind, i) for i in range(self.counts[kind])]
+
+    def offer_set(self) -> Dict[str, List[dict]]:
+        """Every offer materialized, keyed by kind (same shape as load_offer_set)"""
+        return {kind: self.rows(kind) for kind in FIELDS}
+
+    def top_offers(self, offer_type: str, min_discount: float, limit: int) -> List[dict]:
+        """Same result as the MongoDB query behind /api/offers"""
+        offers = []
+        for kind in FIELDS:
+            if offer_type not in ('all', kind):
+                continue
+            discounts = self._columns[kind]['discount_percentage']
+            # Sorted descending, so the qualifying rows are a prefix
+            qualifying = int(np.searchsorted(-discounts, -min_discount, side='right'))
+            offers.extend({**self.row(kind, i), "type": kind} for i in range(min(limit, qualifying)))
+        offers.sort(key=lambda x: x['discount_percentage'], reverse=True)
+        return offers[:limit]
+
+
+async def load_offer_set(db) -> Dict[str, List[dict]]:
+    """All current offers from MongoDB, keyed by kind (the hot set keeps every field)"""
+    return {kind: await db[f"{kind}_offers"].find({}, {"_id": 0}).to_list(None) for kind in FIELDS}
+
+
+def build_meta(offers_by_kind: Dict[str, List[dict]], vocabulary: Optional[dict] = None) -> dict:
+    stats = {}
+    for kind in FIELDS:
+        discounts = [o['discount_percentage'] for o in offers_by_kind.get(kind, [])]
+        stats[kind] = {
+            "count": len(discounts),
+            "avg_discount": sum(discounts) / len(discounts) if discounts else 0,
+            "max_discount": max(discounts) if discounts else 0,
+        }
+    return {
+        "counts": {kind: len(offers_by_kind.get(kind, [])) for kind in FIELDS},
+        "stats": stats,
+        "vocabulary": {kind: dict(counter) for kind, counter in (vocabulary or {}).items()},
+        "written_at": datetime.now(timezone.utc).isoformat(),
+    }
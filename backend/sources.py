@@ -0,0 +1,192 @@
+"""Registry of scraping sources.
+
+Each source declares where to fetch from, which parser extracts the offers,
+how fast it may be hit and how often it should be refreshed. Parsers are
+referenced by dotted path and only imported when an enabled source needs
+them, so heavy dependencies (HTML parsers, Playwright) stay out of the
+worker unless a source actually uses them.
+"""
+import importlib
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SourceSpec:
+    """Declaração de uma fonte de scraping"""
+
+    key: str
+    name: str
+    kind: str  # flight, cruise
+    base_url: str
+    endpoints: List[str] = field(default_factory=list)
+    parser: Optional[str] = None  # "module:function", None for simulated sources
+    method: str = "simulated"  # simulated, html, browser
+    requires: Tuple[str, ...] = ()
+    rate_limit: float = 0.1  # seconds between requests to the same source
+    refresh_every: timedelta = timedelta(hours=1)
+    enabled: bool = True
+    code: Optional[str] = None
+    selectors: Dict[str, str] = field(default_factory=dict)
+    extra: Dict[str, object] = field(default_factory=dict)
+
+    def as_dict(self) -> dict:
+        """Legacy dict shape used by the scrapers and API responses"""
+        info = {'name': self.name, 'url': self.base_url}
+        if self.code:
+            info['code'] = self.code
+        return info
+
+
+class SourceRegistry:
+    """Registro de fontes com carregamento preguiçoso dos parsers"""
+
+    def __init__(self):
+        self._sources: Dict[str, SourceSpec] = {}
+        self._parsers: Dict[str, Callable] = {}
+
+    def register(self, spec: SourceSpec) -> SourceSpec:
+        if spec.key in self._sources:
+            raise ValueError(f"Source already registered: {spec.key}")
+        if spec.kind not in ("flight", "cruise"):
+            raise ValueError(f"Unknown source kind: {spec.kind}")
+        self._sources[spec.key] = spec
+        return spec
+
+    def get(self, key: str) -> SourceSpec:
+        return self._sources[key]
+
+    def all(self, kind: Optional[str] = None) -> List[SourceSpec]:
+        return [s for s in self._sources.values() if kind is None or s.kind == kind]
+
+    def enabled(self, kind: Optional[str] = None) -> List[SourceSpec]:
+        return [s for s in self.all(kind) if s.enabled]
+
+    def configure(self, enabled: Optional[str] = None, disabled: Optional[str] = None):
+        """Apply comma-separated enable/disable lists (e.g. from the environment)"""
+        if enabled:
+            wanted = {k.strip() for k in enabled.split(',') if k.strip()}
+            unknown = wanted - set(self._sources)
+            if unknown:
+                logger.warning(f"Ignoring unknown sources: {', '.join(sorted(unknown))}")
+            for spec in self._sources.values():
+                spec.enabled = spec.key in wanted
+        if disabled:
+            for key in (k.strip() for k in disabled.split(',')):
+                if key in self._sources:
+                    self._sources[key].enabled = False
+
+    def parser_for(self, spec: SourceSpec) -> Optional[Callable]:
+        """Import (once) and return the parser callable of a source"""
+        if spec.parser is None:
+            return None
+        parser = self._parsers.get(spec.parser)
+        if parser is not None:
+            return parser
+
+        for module_name in spec.requires:
+            try:
+                importlib.import_module(module_name)
+            except ImportError as e:
+                raise RuntimeError(
+                    f"Source '{spec.key}' requires '{module_name}' which is not installed"
+                ) from e
+
+        module_path, _, attr = spec.parser.partition(':')
+        module = importlib.import_module(module_path)
+        parser = getattr(module, attr)
+        self._parsers[spec.parser] = parser
+        logger.info(f"Loaded parser {spec.parser} for source {spec.key}")
+        return parser
+
+
+def _slug(name: str) -> str:
+    return name.lower().replace(' ', '_')
+
+
+# Companhias aéreas principais
+AIRLINES = [
+    ('United Airlines', 'UA', 'https://www.united.com'),
+    ('American Airlines', 'AA', 'https://www.aa.com'),
+    ('Delta', 'DL', 'https://www.delta.com'),
+    ('British Airways', 'BA', 'https://www.britishairways.com'),
+    ('Emirates', 'EK', 'https://www.emirates.com'),
+    ('Lufthansa', 'LH', 'https://www.lufthansa.com'),
+    ('Air France', 'AF', 'https://www.airfrance.com'),
+    ('KLM', 'KL', 'https://www.klm.com'),
+    ('Singapore Airlines', 'SQ', 'https://www.singaporeair.com'),
+    ('Qatar Airways', 'QR', 'https://www.qatarairways.com'),
+]
+
+# Sites de busca de voos (agregadores públicos) - desativados por padrão
+FLIGHT_AGGREGATORS = [
+    ('kayak', 'Kayak', 'https://www.kayak.com/flights', 'html'),
+    # Resultados renderizados via JavaScript
+    ('google_flights', 'Google Flights', 'https://www.google.com/travel/flights', 'browser'),
+    ('momondo', 'Momondo', 'https://www.momondo.com/flight-search', 'html'),
+]
+
+# Principais linhas de cruzeiro
+CRUISE_LINES = [
+    ('Royal Caribbean', 'https://www.royalcaribbean.com'),
+    ('Carnival Cruise Line', 'https://www.carnival.com'),
+    ('Norwegian Cruise Line', 'https://www.ncl.com'),
+    ('MSC Cruises', 'https://www.msccruises.com'),
+    ('Princess Cruises', 'https://www.princess.com'),
+    ('Celebrity Cruises', 'https://www.celebritycruises.com'),
+    ('Holland America Line', 'https://www.hollandamerica.com'),
+    ('Disney Cruise Line', 'https://disneycruise.disney.go.com'),
+    ('Costa Cruises', 'https://www.costacruises.com'),
+    ('Cunard Line', 'https://www.cunard.com'),
+]
+
+# Seletores genéricos de cards de tarifa usados pelos agregadores
+FARE_CARD_SELECTORS = {
+    'card': '[data-fare-card]',
+    'airline': '[data-airline]',
+    'flight_number': '[data-flight-number]',
+    'departure': '[data-departure]',
+    'arrival': '[data-arrival]',
+    'departure_date': '[data-departure-date]',
+    'original_price': '[data-original-price]',
+    'current_price': '[data-current-price]',
+    'stops': '[data-stops]',
+    'duration': '[data-duration]',
+    'link': 'a[href]',
+}
+
+
+def build_default_registry() -> SourceRegistry:
+    registry = SourceRegistry()
+
+    for name, code, url in AIRLINES:
+        registry.register(SourceSpec(
+            key=_slug(name), name=name, kind='flight', base_url=url, code=code,
+            endpoints=[url],
+        ))
+
+    for key, name, url, method in FLIGHT_AGGREGATORS:
+        registry.register(SourceSpec(
+            key=key, name=name, kind='flight', base_url=url,
+            endpoints=[url], parser='parsers:parse_fare_cards', method=method,
+            requires=('playwright',) if method == 'browser' else (),
+            rate_limit=2.0, refresh_every=timedelta(hours=3),
+            enabled=False, selectors=FARE_CARD_SELECTORS,
+        ))
+
+    for name, url in CRUISE_LINES:
+        registry.register(SourceSpec(
+            key=_slug(name), name=name, kind='cruise', base_url=url,
+            endpoints=[url],
+        ))
+
+    registry.configure(
+        enabled=os.environ.get('SCRAPER_SOURCES'),
+        disabled=os.environ.get('SCRAPER_DISABLED_SOURCES'),
+    )
+    return registry
@@ -0,0 +1,90 @@
+"""Standalone scrape worker.
+
+Runs the scrape jobs outside the API process. Start as many as needed:
+sources are coordinated through the `scrape_leases` collection (see jobs.py),
+so each one is refreshed by exactly one worker per cadence. Pair with
+SCRAPE_MODE=api on the API replicas so they stay read-only.
+
+    python worker.py            # loop forever
+    python worker.py --once     # single pass (cron, local testing)
+"""
+import asyncio
+import logging
+import os
+import signal
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from alerts import AlertEngine
+from browser_pool import BrowserPool, needs_browser
+from fetch_cache import ValidatorStore
+from jobs import LeaseManager, cleanup_old_offers, refresh_due_sources
+from processing import shutdown_pool
+from scrapers import FlightScraper, CruiseScraper
+from sources import build_default_registry
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('worker')
+
+# How often to look for due sources
+POLL_SECONDS = float(os.environ.get('WORKER_POLL_SECONDS', 60))
+
+
+async def run(once: bool = False):
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+
+    registry = build_default_registry()
+    validators = ValidatorStore(db)
+    browser_pool = BrowserPool.from_env()
+    if needs_browser(registry.enabled()):
+        await browser_pool.start()
+    scrapers = {
+        'flight': FlightScraper(registry, validators, browser_pool),
+        'cruise': CruiseScraper(registry, validators, browser_pool),
+    }
+    leases = LeaseManager(db)
+    alert_engine = AlertEngine(db)
+    logger.info(f"Scrape worker {leases.owner} started with "
+                f"{len(registry.enabled())} enabled sources")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        while not stop.is_set():
+            try:
+                inserted = await refresh_due_sources(db, leases, scrapers)
+                if any(inserted.values()):
+                    await alert_engine.process(inserted)
+                await cleanup_old_offers(db)
+            except Exception as e:
+                logger.error(f"Worker pass failed: {e}")
+
+            if once:
+                break
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        logger.info("Scrape worker stopping")
+        await browser_pool.close()
+        await alert_engine.close()
+        shutdown_pool()
+        client.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(run(once='--once' in sys.argv[1:]))
@@ -4,6 +4,7 @@ Comprehensive Backend Testing for Volo Web Scraping System
 Tests all endpoints and web scraping functionality
 """
 
+import os
 import requests
 import sys
 import json
@@ -366,6 +367,117 @@ class VoloWebScrapingTester:
             self.log_test("Authenticity Validation", False, f"Exception: {str(e)}")
             return False
 
+    def test_loop_diagnostics_endpoint(self):
+        """Test /api/diagnostics/loop event-loop lag report (admin only)"""
+        try:
+            response = self.session.get(f"{self.api_url}/diagnostics/loop", timeout=10)
+            if response.status_code != 403:
+                self.log_test("Loop Diagnostics - Admin Only", False,
+                            "Endpoint answered without X-Admin-Token", "403", str(response.status_code))
+                return False
+
+            admin_token = os.environ.get('ADMIN_TOKEN')
+            if not admin_token:
+                self.log_test("Loop Diagnostics Endpoint", True,
+                            "Rejected without admin token (set ADMIN_TOKEN to check the report)")
+                return True
+
+            response = self.session.get(f"{self.api_url}/diagnostics/loop",
+                                        headers={'X-Admin-Token': admin_token}, timeout=10)
+            
+            if response.status_code != 200:
+                self.log_test("Loop Diagnostics Endpoint", False,
+                            f"Status code {response.status_code}", "200", str(response.status_code))
+                return False
+                
+            data = response.json()
+            
+            lag = data.get('lag_ms', {})
+            for key in ['p50', 'p90', 'p99']:
+                if key not in lag:
+                    self.log_test("Loop Diagnostics - Percentiles", False,
+                                f"Missing lag percentile: {key}")
+                    return False
+                    
+            if 'slow_callbacks' not in data:
+                self.log_test("Loop Diagnostics - Slow Callbacks", False,
+                            "Missing slow_callbacks counter")
+                return False
+                
+            self.log_test("Loop Diagnostics Endpoint", True,
+                        f"Loop lag p99 {lag['p99']} ms, {data['slow_callbacks']} slow callbacks")
+            return True
+            
+        except Exception as e:
+            self.log_test("Loop Diagnostics Endpoint", False, f"Exception: {str(e)}")
+            return False
+
+    def test_autocomplete_endpoint(self):
+        """Test /api/autocomplete prefix and typo-tolerant suggestions"""
+        try:
+            response = self.session.get(f"{self.api_url}/autocomplete",
+                                      params={'q': 'lodon', 'kind': 'airport'}, timeout=10)
+            
+            if response.status_code != 200:
+                self.log_test("Autocomplete Endpoint", False,
+                            f"Status code {response.status_code}", "200", str(response.status_code))
+                return False
+                
+            suggestions = response.json().get('suggestions', [])
+            values = [s.get('value') for s in suggestions]
+            if 'LHR' not in values:
+                self.log_test("Autocomplete - Typo Tolerance", False,
+                            "Misspelled 'lodon' should suggest London", "LHR", str(values))
+                return False
+                
+            self.log_test("Autocomplete Endpoint", True,
+                        f"{len(suggestions)} suggestions for 'lodon'")
+            return True
+            
+        except Exception as e:
+            self.log_test("Autocomplete Endpoint", False, f"Exception: {str(e)}")
+            return False
+
+    def test_alerts_endpoint(self):
+        """Test creating, listing and deleting a deal alert"""
+        try:
+            contact = f"test-{int(time.time())}@example.com"
+            response = self.session.post(f"{self.api_url}/alerts", json={
+                "contact": contact, "offer_type": "flight", "departure": "JFK", "min_discount": 85
+            }, timeout=10)
+            
+            if response.status_code != 200:
+                self.log_test("Alerts Endpoint", False,
+                            f"Status code {response.status_code}", "200", str(response.status_code))
+                return False
+            alert_id = response.json().get('id')
+            owner = {'X-Alert-Token': response.json().get('manage_token', '')}
+            
+            alerts = self.session.get(f"{self.api_url}/alerts",
+                                    headers=owner, timeout=10).json().get('alerts', [])
+            if alert_id not in [a.get('id') for a in alerts]:
+                self.log_test("Alerts - Listing", False, "Created alert not listed", alert_id, str(alerts))
+                return False
+            
+            response = self.session.delete(f"{self.api_url}/alerts/{alert_id}", timeout=10)
+            if response.status_code != 401:
+                self.log_test("Alerts - Ownership", False,
+                            "Deleted without X-Alert-Token", "401", str(response.status_code))
+                return False
+            
+            response = self.session.delete(f"{self.api_url}/alerts/{alert_id}", headers=owner, timeout=10)
+            if response.status_code != 200:
+                self.log_test("Alerts - Delete", False,
+                            f"Status code {response.status_code}", "200", str(response.status_code))
+                return False
+                
+            self.log_test("Alerts Endpoint", True, f"Created, listed and deleted alert {alert_id}")
+            return True
+            
+        except Exception as e:
+            self.log_test("Alerts Endpoint", False, f"Exception: {str(e)}")
+            return False
+
     def run_all_tests(self):
         """Run all backend tests"""
         print("🚀 Starting Volo Web Scraping Backend Tests")
@@ -376,10 +488,13 @@ class VoloWebScrapingTester:
         self.test_health_endpoint()
         self.test_scraping_info_endpoint()
         self.test_stats_endpoint()
+        self.test_loop_diagnostics_endpoint()
         
         # Search functionality tests
         self.test_search_endpoint()
         self.test_offers_endpoint()
+        self.test_autocomplete_endpoint()
+        self.test_alerts_endpoint()
         
         # Specific search tests
         self.test_flight_specific_search()
@@ -1,9 +1,54 @@
-import { useState } from "react";
+import { useState, useEffect } from "react";
+import axios from "axios";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select";
 import { Search, Calendar } from "lucide-react";
 
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
+
+// Debounced airport suggestions from the in-memory autocomplete index
+const useAirportSuggestions = (query) => {
+  const [suggestions, setSuggestions] = useState([]);
+
+  useEffect(() => {
+    if (!query) {
+      setSuggestions([]);
+      return;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
+      try {
+        const response = await axios.get(`${API}/autocomplete`, {
+          params: { q: query, kind: "airport", limit: 8 },
+          signal: controller.signal
+        });
+        setSuggestions(response.data.suggestions);
+      } catch (error) {
+        if (!axios.isCancel(error)) setSuggestions([]);
+      }
+    }, 150);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [query]);
+
+  return suggestions;
+};
+
+// On submit, a picked suggestion (code or label) becomes its airport code;
+// anything else is sent as typed and resolved or rejected by the API
+const toAirportCode = (text, suggestions) => {
+  const typed = text.trim().toLowerCase();
+  if (!typed) return "";
+  const match = suggestions.find(
+    (s) => s.value.toLowerCase() === typed || s.label.toLowerCase() === typed
+  );
+  return match ? match.value : text.trim();
+};
+
 export const SearchBar = ({ onSearch }) => {
   const [searchParams, setSearchParams] = useState({
     departure: "",
@@ -14,10 +59,16 @@ export const SearchBar = ({ onSearch }) => {
     min_discount: 50,
     offer_type: "all"
   });
+  const departureSuggestions = useAirportSuggestions(searchParams.departure);
+  const arrivalSuggestions = useAirportSuggestions(searchParams.arrival);
 
   const handleSubmit = (e) => {
     e.preventDefault();
-    onSearch(searchParams);
+    onSearch({
+      ...searchParams,
+      departure: toAirportCode(searchParams.departure, departureSuggestions),
+      arrival: toAirportCode(searchParams.arrival, arrivalSuggestions)
+    });
   };
 
   return (
@@ -47,33 +98,43 @@ export const SearchBar = ({ onSearch }) => {
           {/* Departure */}
           <div data-testid="departure-input-group">
             <label className="block text-sm font-medium text-slate-700 mb-2">
-              From (Airport Code)
+              From (City or Airport Code)
             </label>
             <Input
               type="text"
-              placeholder="e.g., JFK"
+              placeholder="e.g., JFK or New York"
               value={searchParams.departure}
-              onChange={(e) => setSearchParams({ ...searchParams, departure: e.target.value.toUpperCase() })}
-              maxLength={3}
+              onChange={(e) => setSearchParams({ ...searchParams, departure: e.target.value })}
+              list="departure-suggestions"
               data-testid="departure-input"
               className="font-mono"
             />
+            <datalist id="departure-suggestions">
+              {departureSuggestions.map((s) => (
+                <option key={s.value} value={s.value}>{s.label}</option>
+              ))}
+            </datalist>
           </div>
 
           {/* Arrival */}
           <div data-testid="arrival-input-group">
             <label className="block text-sm font-medium text-slate-700 mb-2">
-              To (Airport Code)
+              To (City or Airport Code)
             </label>
             <Input
               type="text"
-              placeholder="e.g., LAX"
+              placeholder="e.g., LAX or Los Angeles"
               value={searchParams.arrival}
-              onChange={(e) => setSearchParams({ ...searchParams, arrival: e.target.value.toUpperCase() })}
-              maxLength={3}
+              onChange={(e) => setSearchParams({ ...searchParams, arrival: e.target.value })}
+              list="arrival-suggestions"
               data-testid="arrival-input"
               className="font-mono"
             />
+            <datalist id="arrival-suggestions">
+              {arrivalSuggestions.map((s) => (
+                <option key={s.value} value={s.value}>{s.label}</option>
+              ))}
+            </datalist>
           </div>
         </div>
 
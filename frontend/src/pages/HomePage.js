@@ -56,7 +56,7 @@ export default function HomePage() {
       toast.success(`Found ${response.data.total_results} deals!`);
     } catch (error) {
       console.error("Search error:", error);
-      toast.error("Search failed");
+      toast.error(error.response?.status === 422 ? "Unknown airport - pick one from the suggestions" : "Search failed");
     } finally {
       setLoading(false);
     }
@@ -0,0 +1,52 @@
+"""Admission control helpers"""
+import asyncio
+
+import pytest
+
+from admission import AdmissionGate, ClientRateLimiter, Overloaded, client_address
+
+
+@pytest.mark.parametrize('peer, forwarded, hops, expected', [
+    ('10.0.0.2', [], 0, '10.0.0.2'),
+    # Without trusted proxies the header is ignored: anyone can send it
+    ('10.0.0.2', ['1.2.3.4'], 0, '10.0.0.2'),
+    # One ingress: it appended the real client, a spoofed entry sits to the left
+    ('10.0.0.2', ['6.6.6.6, 203.0.113.7'], 1, '203.0.113.7'),
+    ('10.0.0.2', ['6.6.6.6', '203.0.113.7, 10.0.0.9'], 2, '203.0.113.7'),
+    # Fewer entries than trusted proxies: not set by our proxies, fall back to the peer
+    ('10.0.0.2', ['203.0.113.7'], 2, '10.0.0.2'),
+    (None, [], 0, 'unknown'),
+])
+def test_client_address(peer, forwarded, hops, expected):
+    assert client_address(peer, forwarded, hops) == expected
+
+
+def test_rate_limiter_is_per_client():
+    limiter = ClientRateLimiter(rate=0.001, burst=2)
+    assert limiter.acquire('a') is None
+    assert limiter.acquire('a') is None
+    assert limiter.acquire('a') > 0
+    assert limiter.acquire('b') is None
+
+
+def test_gate_sheds_when_queue_is_full():
+    async def main():
+        gate = AdmissionGate('test', limit=1, queue_size=1, queue_timeout=1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with gate.admit():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            async with gate.admit():
+                pass
+        release.set()
+        await asyncio.gather(holder, waiter)
+        assert gate.stats()['rejected'] == 1 and gate.stats()['admitted'] == 2
+
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""Autocomplete prefix index and airport code resolution"""
+from collections import Counter
+
+import pytest
+
+from autocomplete import AutocompleteIndex, Entry, airport_code, build_index, normalize
+from models import SearchRequest
+
+
+@pytest.fixture(scope='module')
+def index():
+    return build_index({'airline': Counter({'Qantas': 3, 'Iberia': 1})})
+
+
+def values(suggestions):
+    return [s['value'] for s in suggestions]
+
+
+def test_normalize_strips_accents_and_punctuation():
+    assert normalize('  São-Paulo (GRU) ') == 'sao paulo gru'
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('lhr', 'LHR'),
+    ('lon', 'LHR'),
+    ('heath', 'LHR'),
+    ('sao', 'GRU'),
+    ('kennedy', 'JFK'),
+])
+def test_prefix_match(index, query, expected):
+    assert values(index.search(query, kinds=['airport']))[0] == expected
+
+
+def test_exact_code_outranks_name_prefixes(index):
+    entries = [Entry('MIA', 'Miami (MIA)', 'airport'), Entry('XMI', 'Miami Beach', 'airport', weight=50)]
+    assert values(AutocompleteIndex(entries).search('mia'))[0] == 'MIA'
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('lodon', 'LHR'),
+    ('sydeny', 'SYD'),
+    ('frnakfurt', 'FRA'),
+])
+def test_typo_match(index, query, expected):
+    assert expected in values(index.search(query, kinds=['airport']))
+
+
+def test_no_typo_matching_for_short_queries(index):
+    assert index.search('xq') == []
+
+
+def test_kind_filter(index):
+    assert {s['kind'] for s in index.search('s')} > {'airport'}
+    assert {s['kind'] for s in index.search('s', kinds=['port'])} == {'port'}
+    assert values(index.search('qan', kinds=['airline'])) == ['Qantas']
+    assert index.search('qan', kinds=['airport']) == []
+
+
+def test_limit(index):
+    assert len(index.search('s', limit=3)) == 3
+    assert len(index.search('s', limit=50)) > 3
+
+
+def test_observed_counts_rank_entries():
+    index = build_index({'port': Counter({'Seattle': 9})})
+    assert values(index.search('se', kinds=['port']))[0] == 'Seattle'
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('syd', 'SYD'),
+    ('Sydney', 'SYD'),
+    ('Sydney (SYD)', 'SYD'),
+    ('heathrow', 'LHR'),
+    ('zzz', 'ZZZ'),
+    ('Sydn', None),
+    ('Lond', None),
+    ('Miamii', None),
+    ('', None),
+])
+def test_airport_code(text, expected):
+    assert airport_code(text) == expected
+
+
+def test_search_request_resolves_or_rejects_airports():
+    request = SearchRequest(departure='miami', arrival=' lhr ')
+    assert (request.departure, request.arrival) == ('MIA', 'LHR')
+    assert SearchRequest(departure='').departure is None
+    with pytest.raises(ValueError):
+        SearchRequest(departure='Sydn')
@@ -0,0 +1,102 @@
+"""BrowserPool against a local HTTP server (skipped without playwright or Chromium)"""
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip('playwright')
+
+from browser_pool import BrowserPool
+
+PAGES = {
+    '/deals': b"""<!DOCTYPE html><html><head>
+<link rel="preload" href="/font.woff2" as="font" crossorigin>
+<script src="https://www.google-analytics.com/analytics.js"></script>
+</head><body>
+<img src="/banner.png">
+<div id="results"></div>
+<script>
+  setTimeout(() => {
+    document.getElementById('results').innerHTML = '<div data-fare-card>GRU-LIS $199</div>';
+  }, 200);
+</script>
+</body></html>""",
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requested.append(self.path)
+        body = PAGES.get(self.path, b'')
+        self.send_response(200 if self.path in PAGES else 404)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    httpd.requested = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def url(server, path: str) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+
+def with_pool(test, **options):
+    async def main():
+        pool = BrowserPool(navigation_timeout=10, **options)
+        try:
+            await pool.start()
+        except Exception as e:
+            pytest.skip(f"Chromium is not available: {str(e).splitlines()[0]}")
+        try:
+            await test(pool)
+        finally:
+            await pool.close()
+    asyncio.run(main())
+
+
+def test_render_waits_for_client_side_results(server):
+    async def test(pool):
+        html = await pool.render(url(server, '/deals'), wait_for='[data-fare-card]')
+        assert 'GRU-LIS $199' in html
+    with_pool(test)
+
+
+def test_images_fonts_and_trackers_are_blocked(server):
+    async def test(pool):
+        server.requested.clear()
+        await pool.render(url(server, '/deals'), wait_for='[data-fare-card]')
+        assert server.requested == ['/deals']
+    with_pool(test)
+
+
+def test_contexts_are_reused_then_recycled(server):
+    async def test(pool):
+        for _ in range(3):
+            await pool.render(url(server, '/deals'))
+        # Pages 1-2 share a context, which is retired after its second page
+        assert pool.recycled == 1
+        assert pool.stats()['idle_contexts'] == 1
+    with_pool(test, size=1, max_pages=2)
+
+
+def test_heavy_page_retires_its_context(server):
+    async def test(pool):
+        await pool.render(url(server, '/deals'))
+        assert pool.stats()['peak_page_heap_mb'] > 0
+        assert pool.recycled == 1
+        assert pool.stats()['idle_contexts'] == 0
+    with_pool(test, size=1, max_heap_mb=0)
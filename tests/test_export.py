@@ -0,0 +1,189 @@
+"""Partitioned Parquet export: incremental, full and failed runs"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pq = pytest.importorskip('pyarrow.parquet')
+
+from pymongo.errors import DuplicateKeyError
+
+import export
+from export import ExportBusy, export_kind, list_exports
+from models import FlightOffer
+
+
+class FakeCursor:
+    def __init__(self, docs, fail_after=None):
+        self.docs = docs
+        self.fail_after = fail_after
+
+    def sort(self, *args):
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    async def __aiter__(self):
+        for i, doc in enumerate(self.docs):
+            if self.fail_after is not None and i >= self.fail_after:
+                raise ConnectionError('cursor lost')
+            yield dict(doc)
+
+
+class FakeOffers:
+    def __init__(self, docs):
+        self.docs = docs
+        self.fail_after = None
+
+    def find(self, query, projection=None):
+        bounds = query.get('created_at', {})
+        docs = sorted((d for d in self.docs
+                       if d['created_at'] <= bounds['$lte'] and d['created_at'] > bounds.get('$gt', '')),
+                      key=lambda d: d['created_at'])
+        return FakeCursor(docs, self.fail_after)
+
+
+class FakeWatermarks:
+    def __init__(self):
+        self.docs = {}
+
+    async def find_one(self, query, projection=None):
+        return self.docs.get(query['kind'])
+
+    async def update_one(self, query, update, upsert=False):
+        self.docs[query['kind']] = update['$set']
+
+
+class FakeLocks:
+    def __init__(self):
+        self.docs = {}
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        now = query['$or'][0]['locked_until']['$lt']
+        doc = self.docs.get(query['_id'])
+        if doc is not None and doc['locked_until'] is not None and doc['locked_until'] >= now:
+            raise DuplicateKeyError('lock held')
+        self.docs[query['_id']] = dict(update['$set'])
+        return self.docs[query['_id']]
+
+    async def find_one(self, query, projection=None):
+        doc = self.docs.get(query['_id'])
+        return doc if doc is not None and doc['run_id'] == query['run_id'] else None
+
+    async def update_one(self, query, update):
+        if await self.find_one(query):
+            self.docs[query['_id']].update(update['$set'])
+
+
+class FakeDB:
+    def __init__(self):
+        self.flight_offers = FakeOffers([])
+        self.export_watermarks = FakeWatermarks()
+        self.export_locks = FakeLocks()
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+
+def add_offers(db, count: int, age: timedelta):
+    created = datetime.now(timezone.utc) - age
+    for i in range(count):
+        db.flight_offers.docs.append(FlightOffer(
+            source_api='test', search_id='s', departure_airport='GRU', arrival_airport='LIS',
+            departure_date='2026-12-01', airline='Test Air', flight_number=f"TA{i}",
+            original_price=1000.0, current_price=200.0, discount_percentage=80.0, stops=0,
+            duration_minutes=600, booking_link='https://example.com', is_authentic=True,
+            validation_timestamp=created.isoformat(),
+            created_at=(created + timedelta(seconds=i)).isoformat(),
+        ).model_dump())
+
+
+def rewind_watermark(db, age: timedelta):
+    """Pretend the previous run happened `age` ago"""
+    db.export_watermarks.docs['flight']['watermark'] = (datetime.now(timezone.utc) - age).isoformat()
+
+
+def exported_rows(root) -> int:
+    return sum(pq.read_metadata(root / f['path']).num_rows for f in list_exports(root))
+
+
+def leftovers(root):
+    return [p.name for p in root.iterdir() if p.name.startswith('_')]
+
+
+def test_incremental_then_full_export_has_no_duplicates(tmp_path):
+    db = FakeDB()
+    add_offers(db, 30, timedelta(hours=3))
+    first = asyncio.run(export_kind(db, 'flight', tmp_path, batch_rows=7))
+    rewind_watermark(db, timedelta(hours=2))
+    add_offers(db, 12, timedelta(hours=1))
+    second = asyncio.run(export_kind(db, 'flight', tmp_path, batch_rows=7))
+    assert (first['rows'], second['rows']) == (30, 12)
+    assert exported_rows(tmp_path) == 42
+
+    full = asyncio.run(export_kind(db, 'flight', tmp_path, full=True, batch_rows=7))
+    assert full['rows'] == 42
+    assert exported_rows(tmp_path) == 42
+    assert sorted(f['path'] for f in list_exports(tmp_path)) == sorted(full['files'])
+    assert leftovers(tmp_path) == []
+
+
+def test_failed_run_leaves_no_files_or_watermark(tmp_path):
+    db = FakeDB()
+    add_offers(db, 20, timedelta(hours=2))
+    asyncio.run(export_kind(db, 'flight', tmp_path, batch_rows=5))
+    rewind_watermark(db, timedelta(hours=1, minutes=30))
+    watermark = db.export_watermarks.docs['flight']['watermark']
+    add_offers(db, 20, timedelta(hours=1))
+
+    db.flight_offers.fail_after = 12
+    for full in (False, True):
+        with pytest.raises(ConnectionError):
+            asyncio.run(export_kind(db, 'flight', tmp_path, full=full, batch_rows=5))
+        assert exported_rows(tmp_path) == 20
+        assert leftovers(tmp_path) == []
+        assert db.export_watermarks.docs['flight']['watermark'] == watermark
+
+    db.flight_offers.fail_after = None
+    assert asyncio.run(export_kind(db, 'flight', tmp_path, batch_rows=5))['rows'] == 20
+    assert exported_rows(tmp_path) == 40
+
+
+def test_concurrent_runs_of_a_type_are_serialized(tmp_path, monkeypatch):
+    db = FakeDB()
+    add_offers(db, 25, timedelta(hours=2))
+    started, resume = asyncio.Event(), asyncio.Event()
+    write = export._PartitionWriter.write
+
+    def paused_write(self, date, rows):
+        # The first run holds the lock while it writes; let the second one try meanwhile
+        started_loop.call_soon_threadsafe(started.set)
+        asyncio.run_coroutine_threadsafe(resume.wait(), started_loop).result()
+        write(self, date, rows)
+
+    async def main():
+        nonlocal started_loop
+        started_loop = asyncio.get_running_loop()
+        first = asyncio.create_task(export_kind(db, 'flight', tmp_path, batch_rows=100))
+        await started.wait()
+        with pytest.raises(ExportBusy):
+            await export_kind(db, 'flight', tmp_path, batch_rows=100)
+        resume.set()
+        return await first
+
+    started_loop = None
+    monkeypatch.setattr(export._PartitionWriter, 'write', paused_write)
+    assert asyncio.run(main())['rows'] == 25
+    assert exported_rows(tmp_path) == 25
+    # Released: the next run goes through (and has nothing new to export)
+    assert asyncio.run(export_kind(db, 'flight', tmp_path))['rows'] == 0
+
+
+def test_expired_lock_is_taken_over(tmp_path):
+    db = FakeDB()
+    add_offers(db, 5, timedelta(hours=2))
+    expired = datetime.now(timezone.utc) - timedelta(seconds=1)
+    db.export_locks.docs['flight'] = {'run_id': 'crashed', 'locked_until': expired}
+    assert asyncio.run(export_kind(db, 'flight', tmp_path))['rows'] == 5
+    assert db.export_locks.docs['flight']['locked_until'] is None
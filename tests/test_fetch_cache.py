@@ -0,0 +1,52 @@
+"""Conditional fetches: validators are only stored once the caller commits them"""
+import asyncio
+
+import httpx
+
+from fetch_cache import FetchStats, ValidatorStore, content_hash, fetch_source_pages
+from sources import SourceSpec
+
+URL = 'https://example.com/deals'
+SPEC = SourceSpec(key='example', name='Example', kind='flight', base_url=URL,
+                  endpoints=[URL], method='html', rate_limit=0)
+
+
+def upstream(body: bytes, etag: str):
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.headers.get('if-none-match') == etag:
+            return httpx.Response(304)
+        return httpx.Response(200, content=body, headers={'etag': etag})
+    return httpx.MockTransport(handler)
+
+
+def fetch(store: ValidatorStore, transport: httpx.MockTransport):
+    async def main():
+        async with httpx.AsyncClient(transport=transport) as http:
+            stats = FetchStats()
+            return await fetch_source_pages(http, SPEC, store, stats), stats
+    return asyncio.run(main())
+
+
+def test_validators_wait_for_commit():
+    store = ValidatorStore()
+    pages, stats = fetch(store, upstream(b'v1', '"1"'))
+    assert pages == [(URL, 'v1')] and stats.changed
+    # Not committed (e.g. parsing failed): the next run fetches and parses again
+    assert asyncio.run(store.get(URL)) is None
+    pages, _ = fetch(store, upstream(b'v1', '"1"'))
+    assert pages == [(URL, 'v1')]
+
+    asyncio.run(store.commit(SPEC.key))
+    assert asyncio.run(store.get(URL))['content_hash'] == content_hash(b'v1')
+    pages, stats = fetch(store, upstream(b'v1', '"1"'))
+    assert pages is None and stats.not_modified == 1
+
+
+def test_discarded_validators_are_not_stored():
+    store = ValidatorStore()
+    fetch(store, upstream(b'v1', '"1"'))
+    asyncio.run(store.commit(SPEC.key))
+    fetch(store, upstream(b'v2', '"2"'))
+    store.discard(SPEC.key)
+    asyncio.run(store.commit(SPEC.key))
+    assert asyncio.run(store.get(URL))['etag'] == '"1"'
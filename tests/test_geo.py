@@ -0,0 +1,142 @@
+"""Geo index: the grid pre-filter must find exactly what a brute-force scan finds"""
+import asyncio
+import math
+import random
+
+import pytest
+
+import geo
+from geo import INDEX_FIELDS, GeoIndex, hydrate
+
+# Synthetic airports, denser near the poles and on both sides of the antimeridian
+rng = random.Random(3)
+POINTS = (
+    [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(300)]
+    + [(rng.uniform(84, 90), rng.uniform(-180, 180)) for _ in range(60)]
+    + [(rng.uniform(-90, -84), rng.uniform(-180, 180)) for _ in range(60)]
+    + [(rng.uniform(-60, 60), rng.choice((-1, 1)) * rng.uniform(175, 180)) for _ in range(80)]
+    + [(90.0, 0.0), (-90.0, 45.0), (0.0, 180.0), (10.0, -180.0)]
+)
+CODES = {f"X{i:03d}": point for i, point in enumerate(POINTS)}
+
+
+@pytest.fixture(autouse=True)
+def synthetic_airports(monkeypatch):
+    monkeypatch.setattr(geo, 'AIRPORT_COORDS', CODES)
+
+
+def make_index(cell_degrees=2.0):
+    offers = [{'id': f"f{i}", 'departure_airport': code, 'discount_percentage': round(rng.uniform(50, 95), 1)}
+              for i, code in enumerate(list(CODES) * 2)]
+    offers.append({'id': 'nowhere', 'departure_airport': 'ZZZ', 'discount_percentage': 90.0})
+    return GeoIndex({'flight': offers, 'cruise': []}, cell_degrees), offers
+
+
+def brute_force_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((p2 - p1) / 2) ** 2
+         + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * geo.EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+QUERIES = [
+    (89.9, 10.0, 300), (-89.5, -170.0, 800), (88.0, 179.0, 2500), (-85.0, 0.0, 50),
+    (0.0, 179.9, 400), (15.0, -179.8, 1200), (-40.0, 180.0, 3000), (60.0, -179.0, 700),
+    (45.0, 90.0, 4999), (0.0, 0.0, 1),
+] + [(rng.uniform(-90, 90), rng.uniform(-180, 180), rng.choice((100, 500, 2000))) for _ in range(60)]
+
+
+@pytest.mark.parametrize('cell_degrees', [2.0, 7.5])
+def test_grid_matches_brute_force(cell_degrees):
+    index, offers = make_index(cell_degrees)
+    assert len(index) == len(offers) - 1 and index.unlocated == 1
+    for lat, lon, radius in QUERIES:
+        expected = {
+            o['id'] for o in offers if o['departure_airport'] in CODES
+            and brute_force_km(lat, lon, *CODES[o['departure_airport']]) <= radius
+        }
+        hits, _ = index.nearby(lat, lon, radius, limit=len(offers))
+        full_scan, _ = index.nearby(lat, lon, radius, limit=len(offers), use_grid=False)
+        # Distances right at the radius may round either way; leave a metre of slack
+        assert {h['id'] for h in hits} ^ expected <= {
+            o['id'] for o in offers if o['departure_airport'] in CODES
+            and abs(brute_force_km(lat, lon, *CODES[o['departure_airport']]) - radius) < 1e-3
+        }, (lat, lon, radius)
+        assert hits == full_scan
+
+
+def test_ranking_blends_distance_and_discount():
+    index, _ = make_index()
+    hits, scanned = index.nearby(89.0, 0.0, 1500, limit=10, weight=0.5)
+    assert 0 < len(hits) <= 10 <= scanned
+    scores = [h['score'] for h in hits]
+    assert scores == sorted(scores, reverse=True)
+    assert all(h['distance_km'] <= 1500 and h['type'] == 'flight' for h in hits)
+    by_discount, _ = index.nearby(89.0, 0.0, 1500, limit=1, weight=1.0, min_discount=94)
+    assert all(h['score'] >= 0.94 for h in by_discount)
+
+
+def test_type_filter_and_empty_index():
+    index, _ = make_index()
+    assert index.nearby(0, 0, 5000, offer_type='cruise') == ([], 0)
+    assert GeoIndex({}).nearby(0, 0, 100) == ([], 0)
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = []
+
+    async def _iterate(self, docs):
+        for doc in docs:
+            yield dict(doc)
+
+    def find(self, query, projection=None):
+        self.queries.append((query, projection))
+        if query:
+            docs = [d for d in self.docs if d['id'] in query['id']['$in']]
+        else:
+            docs = [{k: d[k] for k in projection if k in d} for d in self.docs]
+        return FakeCursor(self._iterate(docs), docs)
+
+
+class FakeCursor:
+    def __init__(self, iterator, docs):
+        self._iterator = iterator
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iterator
+
+    async def to_list(self, length):
+        return list(self.docs)
+
+
+class FakeDB:
+    def __init__(self, flights, cruises):
+        self.collections = {'flight_offers': FakeCollection(flights), 'cruise_offers': FakeCollection(cruises)}
+
+    def __getitem__(self, name):
+        return self.collections[name]
+
+
+def test_index_loads_only_its_fields_and_hydrates_hits():
+    flights = [{'id': f"f{i}", 'departure_airport': code, 'discount_percentage': 80.0,
+                'airline': 'Test Air', 'booking_link': 'https://example.com'}
+               for i, code in enumerate(list(CODES)[:20])]
+    db = FakeDB(flights, [])
+
+    async def main():
+        loaded = await geo.load_index_fields(db)
+        assert set(loaded['flight'][0]) == set(INDEX_FIELDS['flight'])
+        index = GeoIndex(loaded)
+        hits, _ = index.nearby(*CODES['X000'], 3000, limit=5)
+        # An offer deleted after the rebuild is dropped, the rest keep their rank
+        db['flight_offers'].docs = [f for f in flights if f['id'] != hits[-1]['id']]
+        return hits, await hydrate(db, hits)
+
+    hits, offers = asyncio.run(main())
+    assert [o['id'] for o in offers] == [h['id'] for h in hits[:-1]]
+    assert all(o['airline'] == 'Test Air' and 'distance_km' in o and o['type'] == 'flight' for o in offers)
+    query, projection = db['flight_offers'].queries[0]
+    assert query == {} and projection == {'_id': 0, 'id': 1, 'departure_airport': 1, 'discount_percentage': 1}
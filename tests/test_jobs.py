@@ -0,0 +1,198 @@
+"""Lease coordination against a real MongoDB (skipped when MONGO_URL is unset)"""
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+pytest.importorskip('motor')
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from fetch_cache import FetchStats, ValidatorStore
+from jobs import LeaseManager, refresh_due_sources
+from models import FlightOffer
+from processing import pack
+from sources import SourceSpec
+
+pytestmark = pytest.mark.skipif(not os.environ.get('MONGO_URL'), reason="MONGO_URL not set")
+
+
+def run(test):
+    """Run `test(db)` against a throwaway database"""
+    async def main():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'], serverSelectionTimeoutMS=3000)
+        name = f"volo_test_{uuid.uuid4().hex[:8]}"
+        try:
+            await test(client[name])
+        finally:
+            await client.drop_database(name)
+            client.close()
+    asyncio.run(main())
+
+
+def make_spec(key='test_source', refresh_every=timedelta(hours=1)) -> SourceSpec:
+    return SourceSpec(key=key, name='Test Source', kind='flight', base_url='https://example.com',
+                      endpoints=['https://example.com'], refresh_every=refresh_every)
+
+
+def make_offer(spec: SourceSpec, search_id: str) -> dict:
+    return FlightOffer(
+        source_api=f"scraped_{spec.key}", search_id=search_id, departure_airport='GRU',
+        arrival_airport='LIS', departure_date='2026-12-01', airline='Test Air', flight_number='TA1',
+        original_price=1000.0, current_price=200.0, discount_percentage=80.0, stops=0,
+        duration_minutes=600, booking_link='https://example.com/book', is_authentic=True,
+        validation_timestamp=datetime.now(timezone.utc).isoformat(),
+    ).model_dump()
+
+
+class FakeScraper:
+    """Stands in for FlightScraper; `changed=None` simulates a source without conditional fetches"""
+
+    def __init__(self, spec: SourceSpec, on_scrape=None, changed=None, error=None):
+        self.sources = [spec]
+        self.fetch_stats = {}
+        self.validators = ValidatorStore()
+        self.on_scrape = on_scrape
+        self.changed = changed
+        self.error = error
+
+    async def scrape_flight_deals(self, search_id, sources=None, conditional=False, raise_errors=False):
+        spec = self.sources[0]
+        if self.on_scrape is not None:
+            await self.on_scrape()
+        if self.changed is not None:
+            self.fetch_stats[spec.key] = FetchStats(changed=self.changed)
+            self.validators.stage(spec.base_url, spec.key, httpx.Response(200, content=b'page'), search_id)
+        if self.error is not None:
+            raise self.error
+        if self.changed is False:
+            return []
+        return pack('flight', [make_offer(spec, search_id)])
+
+
+async def make_due(db, spec: SourceSpec):
+    # release() leaves lease_until at "now", which an acquire in the same millisecond still sees as held
+    past = datetime.now(timezone.utc) - timedelta(seconds=1)
+    await db.scrape_leases.update_one({'_id': spec.key}, {'$set': {'last_run': None, 'lease_until': past}})
+
+
+def test_acquire_is_exclusive_until_release():
+    async def test(db):
+        spec = make_spec()
+        first, second = LeaseManager(db, owner='first'), LeaseManager(db, owner='second')
+        assert await first.acquire(spec)
+        assert not await second.acquire(spec)
+        assert await first.release(spec, True, 3)
+        # Released, but the source isn't due again until its cadence elapses
+        assert not await second.acquire(spec)
+        [lease] = await first.status()
+        assert lease['last_status'] == 'ok' and lease['last_offers'] == 3
+    run(test)
+
+
+def test_failed_run_is_retried():
+    async def test(db):
+        spec = make_spec()
+        first, second = LeaseManager(db, owner='first'), LeaseManager(db, owner='second')
+        assert await first.acquire(spec)
+        assert await first.release(spec, False, error='boom')
+        # MongoDB keeps milliseconds; let the released lease_until fall behind the clock
+        await asyncio.sleep(0.01)
+        assert await second.acquire(spec)
+    run(test)
+
+
+def test_expired_lease_is_taken_over():
+    async def test(db):
+        spec = make_spec()
+        first = LeaseManager(db, owner='first', ttl=timedelta(seconds=-1))
+        second = LeaseManager(db, owner='second')
+        assert await first.acquire(spec)
+        assert await second.acquire(spec)
+        assert not await first.renew(spec)
+        assert not await first.release(spec, True, 1)
+        [lease] = await second.status()
+        assert lease['owner'] == 'second' and 'last_status' not in lease
+    run(test)
+
+
+def test_refresh_due_sources_stores_offers_once_per_cadence():
+    async def test(db):
+        spec = make_spec()
+        leases = LeaseManager(db, owner='worker')
+        scrapers = {'flight': FakeScraper(spec)}
+        inserted = await refresh_due_sources(db, leases, scrapers)
+        assert len(inserted['flight']) == 1
+        assert await db.flight_offers.count_documents({}) == 1
+        # Not due again yet: nothing scraped
+        inserted = await refresh_due_sources(db, leases, scrapers)
+        assert inserted['flight'] == []
+        assert await db.flight_offers.count_documents({}) == 1
+    run(test)
+
+
+def test_refresh_skips_writes_after_losing_the_lease():
+    async def test(db):
+        spec = make_spec()
+        leases = LeaseManager(db, owner='slow')
+        other = LeaseManager(db, owner='other')
+
+        async def lease_expires_mid_scrape():
+            expired = datetime.now(timezone.utc) - timedelta(seconds=1)
+            await db.scrape_leases.update_one({'_id': spec.key}, {'$set': {'lease_until': expired}})
+            assert await other.acquire(spec)
+
+        inserted = await refresh_due_sources(db, leases, {'flight': FakeScraper(spec, lease_expires_mid_scrape)})
+        assert inserted['flight'] == []
+        assert await db.flight_offers.count_documents({}) == 0
+        [lease] = await other.status()
+        assert lease['owner'] == 'other'
+    run(test)
+
+
+def test_changed_source_replaces_its_offers():
+    async def test(db):
+        spec = make_spec()
+        spec.method = 'html'
+        leases = LeaseManager(db, owner='worker')
+        scraper = FakeScraper(spec, changed=True)
+        await refresh_due_sources(db, leases, {'flight': scraper})
+        await make_due(db, spec)
+        [latest] = (await refresh_due_sources(db, leases, {'flight': scraper}))['flight']
+        stored = await db.flight_offers.find({}, {'_id': 0}).to_list(None)
+        assert [o['search_id'] for o in stored] == [latest['search_id']]
+        assert (await scraper.validators.get(spec.base_url))['content_hash'] == latest['search_id']
+    run(test)
+
+
+def test_unchanged_source_revalidates_its_offers():
+    async def test(db):
+        spec = make_spec()
+        spec.method = 'html'
+        leases = LeaseManager(db, owner='worker')
+        await refresh_due_sources(db, leases, {'flight': FakeScraper(spec, changed=True)})
+        await db.flight_offers.update_many({}, {'$set': {'validation_timestamp': '2000-01-01T00:00:00+00:00'}})
+        await make_due(db, spec)
+        inserted = await refresh_due_sources(db, leases, {'flight': FakeScraper(spec, changed=False)})
+        assert inserted['flight'] == []
+        [offer] = await db.flight_offers.find({}).to_list(None)
+        assert offer['validation_timestamp'] > '2000-01-01'
+    run(test)
+
+
+def test_failed_parse_is_recorded_and_retried_in_full():
+    async def test(db):
+        spec = make_spec()
+        spec.method = 'html'
+        leases = LeaseManager(db, owner='worker')
+        scraper = FakeScraper(spec, changed=True, error=ValueError('bad markup'))
+        inserted = await refresh_due_sources(db, leases, {'flight': scraper})
+        assert inserted['flight'] == []
+        [lease] = await leases.status()
+        assert lease['last_status'] == 'error' and 'bad markup' in lease['last_error']
+        # Validators of the failed run were dropped, so the next run re-parses the pages
+        assert await scraper.validators.get(spec.base_url) is None
+    run(test)
@@ -0,0 +1,45 @@
+"""Loop watchdog: blocking the event loop records a stall with the loop's stack"""
+import asyncio
+import time
+
+from loop_watchdog import LoopWatchdog
+
+
+def block_the_loop(seconds: float):
+    time.sleep(seconds)
+
+
+def test_blocked_loop_is_recorded_with_its_stack():
+    watchdog = LoopWatchdog(interval=0.01, threshold=0.05)
+
+    async def main():
+        watchdog.start()
+        try:
+            await asyncio.sleep(0.05)
+            block_the_loop(0.3)
+            await asyncio.sleep(0.05)
+        finally:
+            await watchdog.stop()
+
+    asyncio.run(main())
+    stats = watchdog.stats()
+    # One stall, reported once even though it outlasts several watch ticks
+    assert stats['slow_callbacks'] == 1
+    [event] = stats['recent_slow_callbacks']
+    assert event['blocked_ms'] >= 50
+    assert any('block_the_loop' in line for line in event['stack'])
+    assert stats['lag_ms']['max_since_start'] >= 250
+
+
+def test_idle_loop_records_no_stalls():
+    watchdog = LoopWatchdog(interval=0.01, threshold=0.1)
+
+    async def main():
+        watchdog.start()
+        await asyncio.sleep(0.2)
+        await watchdog.stop()
+
+    asyncio.run(main())
+    stats = watchdog.stats()
+    assert stats['slow_callbacks'] == 0
+    assert stats['samples'] > 5
@@ -0,0 +1,65 @@
+"""HTML parsing backends and the bs4 fallback"""
+import asyncio
+from dataclasses import replace
+
+import pytest
+
+import parsing
+from parsers import parse_fare_cards
+from sources import build_default_registry
+
+BACKENDS = parsing.available_backends()
+SOURCES = ('kayak', 'momondo', 'google_flights')
+
+
+@pytest.fixture(scope='module')
+def registry():
+    return build_default_registry()
+
+
+def fixture_pages(source: str):
+    pages = sorted((parsing.FIXTURES_DIR / source).glob('*.html'))
+    assert pages, f"no fixtures for {source}"
+    return [p.read_text(encoding='utf-8') for p in pages]
+
+
+@pytest.mark.parametrize('source', SOURCES)
+def test_backends_extract_the_same_records(registry, source):
+    if len(BACKENDS) < 2:
+        pytest.skip("needs at least two HTML backends")
+    spec = registry.get(source)
+    for html in fixture_pages(source):
+        results = [parsing.extract_records(html, spec.selectors, backend) for backend in BACKENDS]
+        assert len(results[0]) == 12
+        assert all(result == results[0] for result in results[1:])
+        assert set(results[0][0]) == set(spec.selectors) - {'card'}
+
+
+def test_failing_backend_falls_back_to_bs4(registry):
+    if 'bs4' not in BACKENDS or len(BACKENDS) < 2:
+        pytest.skip("needs bs4 and a faster backend")
+    spec = registry.get('kayak')
+    spec = replace(spec, extra={**spec.extra, 'html_backend': BACKENDS[0]})
+    [html] = fixture_pages('kayak')
+    used = []
+
+    def flaky(page, spec):
+        used.append(spec.extra['html_backend'])
+        if spec.extra['html_backend'] != 'bs4':
+            raise ValueError('parser crashed')
+        return parse_fare_cards(page, spec)
+
+    records = asyncio.run(parsing.parse_page(flaky, html, spec))
+    assert used == [BACKENDS[0], 'bs4']
+    assert len(records) == 12
+
+
+def test_bs4_failure_is_raised(registry):
+    spec = registry.get('kayak')
+    spec = replace(spec, extra={**spec.extra, 'html_backend': 'bs4'})
+
+    def broken(page, spec):
+        raise ValueError('parser crashed')
+
+    with pytest.raises(ValueError):
+        asyncio.run(parsing.parse_page(broken, '<html></html>', spec))
@@ -0,0 +1,139 @@
+"""Offer processing stages, inline and in the CPU pool"""
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+import processing
+from processing import FIELDS, filter_sort, normalize_records, pack, run_stage, unpack, validate_rows
+
+SOURCE = ('test_source', 'Test Air', 'https://example.com/flights/')
+
+
+def flight(i: int, **changes) -> dict:
+    record = {
+        'source_api': 'scraped_test', 'search_id': 's', 'departure_airport': 'JFK',
+        'arrival_airport': 'LAX', 'departure_date': '2026-12-01', 'airline': 'Test Air',
+        'flight_number': f"TA{i}", 'original_price': 1000.0, 'current_price': 100.0 + i,
+        'discount_percentage': 90.0 - i % 40, 'stops': i % 3, 'duration_minutes': 300,
+        'booking_link': f"https://example.com/{i}", 'is_authentic': True,
+        'validation_timestamp': datetime.now(timezone.utc).isoformat(),
+    }
+    record.update(changes)
+    return record
+
+
+def raw_card(i: int, **changes) -> dict:
+    card = {
+        'departure': 'gru', 'arrival': 'lis', 'departure_date': '2026-12-01',
+        'flight_number': f"TA{i}", 'original_price': '$1,200.00', 'current_price': f"${300 + i}",
+        'stops': f"{i % 2} stop", 'duration': '11h', 'link': f"/book?i={i}",
+    }
+    card.update(changes)
+    return card
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """Route every stage through a real two-worker pool"""
+    monkeypatch.setattr(processing, 'POOL_WORKERS', 2)
+    monkeypatch.setattr(processing, 'MIN_BATCH', 1)
+    yield
+    processing.shutdown_pool()
+
+
+def test_pack_round_trip():
+    records = [flight(i) for i in range(3)]
+    rows = pack('flight', records)
+    assert all(len(row) == len(FIELDS['flight']) for row in rows)
+    unpacked = unpack('flight', rows)
+    assert [{k: v for k, v in r.items() if k in records[0]} for r in unpacked] == records
+    # Missing fields become None
+    assert unpack('flight', pack('flight', [{'airline': 'X'}]))[0]['flight_number'] is None
+
+
+def test_validate_rows_drops_invalid_rows():
+    rows = pack('flight', [
+        flight(0),
+        flight(1, stops='two'),
+        flight(2, departure_airport=None),
+        flight(3, original_price='cheap'),
+        flight(4),
+    ])
+    valid = unpack('flight', validate_rows('flight', rows))
+    assert [r['flight_number'] for r in valid] == ['TA0', 'TA4']
+    assert all(r['id'] and r['created_at'] for r in valid)
+
+
+def test_normalize_records():
+    records = [
+        raw_card(0),
+        raw_card(1, airline='Other Air'),
+        raw_card(2, current_price='$1,500'),  # not a discount
+        raw_card(3, original_price=''),
+        raw_card(4, stops='nonstop'),
+    ]
+    rows = unpack('flight', normalize_records('flight', SOURCE, 'search-1', records))
+    assert [r['flight_number'] for r in rows] == ['TA0', 'TA1', 'TA4']
+    first = rows[0]
+    assert (first['departure_airport'], first['arrival_airport']) == ('GRU', 'LIS')
+    assert (first['original_price'], first['current_price'], first['discount_percentage']) == (1200.0, 300.0, 75.0)
+    assert first['airline'] == 'Test Air' and rows[1]['airline'] == 'Other Air'
+    assert first['booking_link'] == 'https://example.com/book?i=0'
+    assert first['source_api'] == 'scraped_test_source' and first['search_id'] == 'search-1'
+    assert (first['duration_minutes'], rows[2]['stops']) == (11, 0)
+
+
+def test_normalize_cruise_records():
+    records = [{'original_price': '4000', 'current_price': '900', 'departure_port': 'Miami',
+                'duration_nights': '7 nights', 'link': 'https://cruise.example/7'}]
+    [row] = unpack('cruise', normalize_records('cruise', ('c', 'Test Cruises', 'https://cruise.example'), 's', records))
+    assert (row['cruise_line'], row['duration_nights'], row['discount_percentage']) == ('Test Cruises', 7, 77.5)
+
+
+def test_filter_sort():
+    rows = pack('flight', [flight(i) for i in range(40)])
+    kept = unpack('flight', filter_sort('flight', rows, 70))
+    discounts = [r['discount_percentage'] for r in kept]
+    assert discounts == sorted(discounts, reverse=True)
+    assert min(discounts) >= 70 and len(kept) == 21
+
+
+def run_all_stages():
+    async def main():
+        records = [raw_card(i, current_price=f"${300 + i * 20}") for i in range(30)]
+        normalized = await run_stage(normalize_records, 'flight', SOURCE, 's', records, size=len(records))
+        rows = normalized + pack('flight', [flight(0, stops='bad')])
+        validated = await run_stage(validate_rows, 'flight', rows, size=len(rows))
+        ranked = await run_stage(filter_sort, 'flight', validated, 60, size=len(validated))
+        return normalized, validated, ranked
+    return asyncio.run(main())
+
+
+def strip_generated(rows):
+    """Drop the per-run fields (ids, timestamps) so two runs compare equal"""
+    skip = {'id', 'created_at', 'validation_timestamp'}
+    return [{k: v for k, v in r.items() if k not in skip} for r in unpack('flight', rows)]
+
+
+def test_pool_and_inline_give_the_same_results(monkeypatch, pool):
+    pooled = run_all_stages()
+    assert processing._pool is not None
+    monkeypatch.setattr(processing, 'POOL_WORKERS', 0)
+    inline = run_all_stages()
+    for pooled_rows, inline_rows in zip(pooled, inline):
+        assert strip_generated(pooled_rows) == strip_generated(inline_rows)
+    normalized, validated, ranked = pooled
+    # The bad row is rejected in the pool too
+    assert len(validated) == len(normalized) == 30
+    assert [r['discount_percentage'] for r in unpack('flight', ranked)] == \
+        sorted((r['discount_percentage'] for r in unpack('flight', validated) if r['discount_percentage'] >= 60),
+               reverse=True)
+
+
+def test_small_batches_stay_inline(monkeypatch):
+    monkeypatch.setattr(processing, 'POOL_WORKERS', 2)
+    monkeypatch.setattr(processing, 'MIN_BATCH', 100)
+    rows = pack('flight', [flight(i) for i in range(5)])
+    assert asyncio.run(run_stage(filter_sort, 'flight', rows, 0, size=len(rows)))
+    assert processing._pool is None
@@ -0,0 +1,45 @@
+"""Request profiling: pyinstrument is only imported once profiling is used"""
+import asyncio
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from profiling import RequestProfiler
+
+BACKEND = Path(__file__).resolve().parent.parent / 'backend'
+
+
+def test_pyinstrument_is_not_imported_at_startup():
+    # A fresh interpreter: this test process may already have pyinstrument loaded
+    script = (
+        "import sys; sys.path.insert(0, sys.argv[1])\n"
+        "from profiling import RequestProfiler\n"
+        "profiler = RequestProfiler(admin_token='secret', sample_rate=0.5)\n"
+        "assert 'pyinstrument' not in sys.modules\n"
+        "profiler.available\n"
+        "print('pyinstrument' in sys.modules)\n"
+    )
+    result = subprocess.run([sys.executable, '-c', script, str(BACKEND)], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    pytest.importorskip('pyinstrument')
+    assert result.stdout.strip() == 'True'
+
+
+def test_refresh_profile_is_recorded_once():
+    pytest.importorskip('pyinstrument')
+    profiler = RequestProfiler(admin_token='secret')
+
+    async def main():
+        async with profiler.refresh_profile():
+            await asyncio.sleep(0.01)
+        assert profiler.last_refresh is None
+        profiler.arm_refresh()
+        async with profiler.refresh_profile():
+            await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    assert not profiler.refresh_armed
+    assert profiler.last_refresh is not None and profiler.last_refresh.duration >= 0.01
+    assert [p['kind'] for p in profiler.profiles()] == ['refresh']
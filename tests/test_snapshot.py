@@ -0,0 +1,113 @@
+"""Hot-set snapshot: round trip and rejection of damaged files"""
+import random
+import struct
+
+import pytest
+
+from models import CruiseOffer, FlightOffer
+from snapshot import HEADER, SECTION, HotSet, SnapshotError, _checksum, build_meta, encode
+
+
+def make_offers(count: int = 50):
+    rng = random.Random(3)
+    flights = [FlightOffer(
+        source_api='test', search_id='s', departure_airport=rng.choice(['GRU', 'LIS', 'JFK']),
+        arrival_airport='CDG', departure_date='2026-12-01', airline='Test Air', flight_number=f"TA{i}",
+        original_price=1000.0, current_price=round(rng.uniform(50, 500), 2),
+        discount_percentage=round(rng.uniform(50, 95), 1), stops=i % 3, duration_minutes=600,
+        booking_link='https://example.com', is_authentic=True, validation_timestamp='2026-10-19T00:00:00+00:00',
+        return_date=None if i % 2 else '2026-12-10',
+    ).model_dump() for i in range(count)]
+    cruises = [CruiseOffer(
+        source_api='test', search_id='s', cruise_line='Línea Ñ', ship_name='Ship', departure_port='Miami',
+        departure_date='2027-01-05', duration_nights=7, original_price=2000.0, current_price=500.0,
+        discount_percentage=round(rng.uniform(50, 90), 1), cabin_type='Suite', booking_link='https://example.com',
+        is_authentic=True, validation_timestamp='2026-10-19T00:00:00+00:00',
+    ).model_dump() for _ in range(count // 2)]
+    return {'flight': flights, 'cruise': cruises}
+
+
+def encoded(offers=None) -> bytearray:
+    offers = offers or make_offers()
+    return bytearray(encode(offers, build_meta(offers)))
+
+
+def resign(buffer: bytearray) -> bytearray:
+    """Recompute the checksum, as if the damage had been written by a buggy encoder"""
+    digest = _checksum(bytes(buffer[:HEADER.size]), bytes(buffer[HEADER.size:]))
+    buffer[HEADER.size - len(digest):HEADER.size] = digest
+    return buffer
+
+
+def test_round_trip_matches_source_offers():
+    offers = make_offers()
+    hot_set = HotSet(encoded(offers))
+    assert len(hot_set) == 75
+    for kind, rows in offers.items():
+        expected = sorted(rows, key=lambda o: o['discount_percentage'], reverse=True)
+        assert hot_set.rows(kind) == expected
+    top = hot_set.top_offers('all', 80, 10)
+    assert [o['discount_percentage'] for o in top] == sorted(
+        (o['discount_percentage'] for rows in offers.values() for o in rows if o['discount_percentage'] >= 80),
+        reverse=True)[:10]
+
+
+def test_header_fields_are_covered_by_the_checksum():
+    buffer = encoded()
+    # created_at sits right after magic, version, count and schema hash
+    struct.pack_into('<d', buffer, 8 + 2 + 2 + 8, 0.0)
+    with pytest.raises(SnapshotError, match='checksum'):
+        HotSet(buffer)
+
+
+def test_section_table_is_covered_by_the_checksum():
+    buffer = encoded()
+    buffer[HEADER.size] ^= 0xFF
+    with pytest.raises(SnapshotError, match='checksum'):
+        HotSet(buffer)
+
+
+def test_invalid_section_name_is_rejected():
+    buffer = encoded()
+    buffer[HEADER.size:HEADER.size + 2] = b'\xff\xfe'
+    with pytest.raises(SnapshotError, match='invalid name'):
+        HotSet(resign(buffer))
+
+
+def test_section_outside_the_file_is_rejected():
+    buffer = encoded()
+    name, offset, length = SECTION.unpack_from(buffer, HEADER.size + SECTION.size)
+    SECTION.pack_into(buffer, HEADER.size + SECTION.size, name, offset, len(buffer))
+    with pytest.raises(SnapshotError, match='outside'):
+        HotSet(resign(buffer))
+
+
+def test_column_not_matching_row_count_is_rejected():
+    offers = make_offers()
+    buffer = bytearray(encode(offers, {**build_meta(offers), 'counts': {'flight': 60, 'cruise': 25}}))
+    with pytest.raises(SnapshotError, match='row count'):
+        HotSet(buffer)
+
+
+@pytest.mark.parametrize('damage', ['truncate', 'name', 'garbage', 'empty'])
+def test_load_falls_back_on_any_damage(tmp_path, damage):
+    buffer = encoded()
+    if damage == 'truncate':
+        buffer = buffer[:len(buffer) // 2]
+    elif damage == 'name':
+        buffer[HEADER.size:HEADER.size + 2] = b'\xff\xfe'
+        buffer = resign(buffer)
+    elif damage == 'garbage':
+        buffer = bytearray(b'VOLOSNAP' + bytes(200))
+    else:
+        buffer = bytearray()
+    path = tmp_path / 'offers.snap'
+    path.write_bytes(bytes(buffer))
+    assert HotSet.load(str(path), max_age=None) is None
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / 'offers.snap')
+    HotSet.from_offers(make_offers()).save(path)
+    loaded = HotSet.load(path)
+    assert loaded is not None and len(loaded) == 75